@@ -9,10 +9,13 @@ import logging
 from Logging.Logger import getLog
 from IANASteps.BCCCalculator.BCCCalculator import rateFilter
 from IANAUtil.Chart import plotChart
+from IANAUtil.Metrics import getMetrics
 from IANASettings.Settings import ExitCode
 
 log = getLog('BCCResultComputation')
 
+metrics = getMetrics()
+
 def bccResultComputation(sampledRGB, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, chartFile, parenttags=None, level=logging.ERROR):
     ''' This method gets invoked externally with the specified params and computes the BCVol,
         it also plots the chart.
@@ -24,7 +27,8 @@ def bccResultComputation(sampledRGB, filterRadius, exposedTime, airFlowRate, bcG
     airFlowRate  -- The flowrate of the pump
     bcGradient   -- The gradient values to be used in the interpolation to ind the BCVol
     gradient     -- The gradient/grayscale list that is used in the interpolation
-    chartFile    -- The name of the chartFile in which to store the plotted results
+    chartFile    -- The name of the chartFile in which to store the plotted results, None
+                    to leave the chart to be rendered later (refer IANAUtil.ChartWorker)
     parenttags   -- The tag string of the calling function
     level        -- The logging level
     
@@ -40,7 +44,8 @@ def bccResultComputation(sampledRGB, filterRadius, exposedTime, airFlowRate, bcG
     log.info('Running BCCResultComputation ', extra=tags)
     
     # Compute BCC
-    bccResult, exitcode = rateFilter(sampledRGB, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, tags, logging.DEBUG)
+    with metrics.timer('rate_filter'):
+        bccResult, exitcode = rateFilter(sampledRGB, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, tags, logging.DEBUG)
     
     if exitcode is not ExitCode.Success:
         log.error('Could not compute BCC result : ' + ExitCode.toString[exitcode], extra=tags)
@@ -48,6 +53,8 @@ def bccResultComputation(sampledRGB, filterRadius, exposedTime, airFlowRate, bcG
 
     log.info('Done Running BCCResultComputation', extra=tags)
     
-    plotChart(filterRadius, exposedTime, airFlowRate, bcGradient, gradient, bccResult, sampledRGB, chartFile)
+    if chartFile is not None:
+        with metrics.timer('plot_chart'):
+            plotChart(filterRadius, exposedTime, airFlowRate, bcGradient, gradient, bccResult, sampledRGB, chartFile)
     
     return bccResult, exitcode
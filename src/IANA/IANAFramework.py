@@ -18,9 +18,18 @@ from bson.objectid import ObjectId
 from ImageUtils import ImageResize
 from IANASettings.Settings import ExitCode
 from IANASettings.Settings import ResizeImageConstants
+from IANASettings.Settings import MetricsConstants
+from IANASettings.Settings import ChartConstants
 from mongoengine.connection import _get_db
 from DANA.DANAFramework import DANAFramework
 from FeatureExtractor import featureExtractor
+from IANAUtil.Metrics import getMetrics
+from IANAUtil.Profile import getProfile, stopProfile
+from IANAUtil.DebugImage import DebugImage
+from IANAUtil.LoadingMap import computeLoadingMap
+from IANAUtil.ChartWorker import ChartInputs, getChartWorker
+from IANAUtil.ImageContext import ImageContext
+from IANAUtil.ResizePolicy import getResizePolicy
 from Collections.SuryaProcessResult import *
 from Collections.SuryaProcessingList import *
 from Collections.SuryaDeploymentData import *
@@ -32,20 +41,25 @@ from DANAExceptions.PprocCalibrationError import PprocCalibrationError
 from DANAExceptions.CompuCalibrationError import CompuCalibrationError
 from DANAExceptions.ResultComputationError import ResultComputationError
 
+metrics = getMetrics()
+
 class PreProcessingResult:
     """ Results after the Image has been preprocessed.
     """
     
-    def __init__(self, features, result):
+    def __init__(self, features, result, filterPixels=None):
         """ Constructor
         
             Keyword Arguments:
-            features -- The features extracted from the Image
-            result   -- The SuryaImagePreProcessingResult 
-                        Embedded Document
+            features     -- The features extracted from the Image
+            result       -- The SuryaImagePreProcessingResult 
+                            Embedded Document
+            filterPixels -- The IANAUtil.LoadingMap.FilterPixels of the filter, if
+                            LoadingMapConstants.Enabled
         """
         self.features = features
         self.result = result
+        self.filterPixels = filterPixels
     
 class DanaResult:
     """ Results after the computation of Black Carbon Concentration (BCVol)
@@ -82,6 +96,14 @@ class IANAFramework(DANAFramework):
         self.log.setLevel(level)
         self.ianatags = self.danatags + " IANA "
         self.fs = GridFS(_get_db())
+        
+        # The profile would silently not be persisted, refer MetricsConstants.StoreProfile
+        if MetricsConstants.StoreProfile:
+            for document in (SuryaIANAResult, SuryaIANAFailedResult):
+                if 'profile' not in document._fields:
+                    raise AttributeError(document.__name__ + " has no profile field, declare 'profile = DictField()' " +
+                                         "or set MetricsConstants.StoreProfile to False")
+        self.files = _get_db().fs.files
     
     def getDataItems(self):
         """ Refer DANAFramework.getDataItems() for documentation
@@ -99,6 +121,242 @@ class IANAFramework(DANAFramework):
         """
         return dataItem.processEntity.validFlag
     
+    def debugImageName(self, itemname, dataItem):
+        """ Returns the GridFS file name of the debug image of the dataItem (or of
+            its result), without the extension
+        """
+        return itemname + ".debug." + str(dataItem.preProcessingConfiguration.calibrationId)
+    
+    def chartName(self, itemname, dataItem):
+        """ Returns the GridFS file name of the chart of the dataItem (or of
+            its result), without the extension
+        """
+        return itemname + ".chart." + str(dataItem.computationConfiguration.calibrationId)
+    
+    def deleteFile(self, filename):
+        """ Deletes the last version of filename from GridFS, if it exists
+        """
+        with metrics.timer('gridfs_delete'):
+            if self.fs.exists(filename=filename):
+                existing = self.fs.get_last_version(filename)
+                self.fs.delete(existing.__getattr__("_id"))
+    
+    def itemProfile(self, itemname):
+        """ Ends the profile of the item, refer IANAUtil.Profile
+        
+            Returns:
+            The profile as a dict, stored with the SuryaIANAResult/SuryaIANAFailedResult
+        """
+        profile = getProfile(itemname).toDict()
+        stopProfile()
+        return profile
+    
+    def storeProfile(self, itemname, result):
+        """ Ends the profile of the item and stores it as the profile of the
+            SuryaIANAResult/SuryaIANAFailedResult, if MetricsConstants.StoreProfile
+        """
+        profile = self.itemProfile(itemname)
+        if MetricsConstants.StoreProfile:
+            result.profile = profile
+    
+    def dumpMetrics(self, tags):
+        """ Dumps the metrics to MetricsConstants.DumpFile, refer IANAUtil.Metrics
+        """
+        if MetricsConstants.DumpFile is None:
+            return
+        
+        try:
+            metrics.dump(MetricsConstants.DumpFile)
+        except (IOError, OSError), err:
+            self.log.error("Could not dump the metrics: " + str(err), extra=tags)
+    
+    def resizeImage(self, dataItem, tags):
+        """ Resizes the uploaded image of the dataItem to ResizeImageConstants.LargestSide
+            and replaces the processed file with it
+        
+            Returns:
+            The IANAUtil.ImageContext of the resized image
+        """
+        shrunkimage = ImageResize.imageResize(dataItem.processEntity.origFile, ResizeImageConstants.LargestSide)
+        replimg = StringIO.StringIO()
+        shrunkimage.save(replimg, format="JPEG")
+        replimg.seek(0)
+        self.log.info("Resizing image %d" % (replimg.len), extra=tags)
+        with metrics.timer('gridfs_write'):
+            dataItem.processEntity.file.replace(replimg, content_type='image/jpeg')
+        # reuse the uploaded bytes rather than reading the replaced file back
+        return ImageContext(replimg.getvalue())
+    
+    def saveLoadingMap(self, itemname, dataItem, bccResult, filterPixels, tags):
+        """ Stores the map of the loading of every pixel of the filter in GridFS, as
+            json next to the chart, refer IANAUtil.LoadingMap. A map that cannot be
+            computed is logged, it does not fail the item.
+        """
+        try:
+            with metrics.timer('loading_map'):
+                loadingMap = computeLoadingMap(bccResult, filterPixels)
+            
+            loadingMapName = itemname + ".loading." + str(dataItem.computationConfiguration.calibrationId) + ".json"
+            self.deleteFile(loadingMapName)
+            with metrics.timer('gridfs_write'):
+                self.fs.put(loadingMap.toJSON(), filename=loadingMapName, content_type='application/json')
+            
+            self.log.info("Loading mean:%s, median:%s, nonUniformity:%s" % (loadingMap.mean, loadingMap.median, loadingMap.nonUniformity), extra=tags)
+        except Exception, err:
+            self.log.error("Could not save the loading map: " + str(err), extra=tags)
+    
+    def renderDebugImage(self, result):
+        """ Renders the deferred debug image of an analyzed item on request, from the
+            overlays recorded by the featureExtractor (refer IANAUtil.DebugImage and
+            IANAMain/RenderDebugImage.py), and attaches it to the debugImage of the
+            preProcessingResult of its result
+        
+            Keyword Arguments:
+            result -- The SuryaIANAResult or SuryaIANAFailedResult of the item, once
+                      it was preprocessed
+            
+            Returns:
+            The GridFS file name of the debug image, None if no overlays were recorded
+        """
+        itemname = result.item.file.name
+        tags = self.ianatags + itemname + " DEBUG"
+        
+        debugImagename = self.debugImageName(itemname, result) + ".png"
+        overlayname = self.debugImageName(itemname, result) + ".json"
+        
+        if self.fs.exists(filename=debugImagename):
+            return debugImagename
+        
+        if not self.fs.exists(filename=overlayname):
+            self.log.error("No debug overlays recorded for " + itemname, extra=tags)
+            return None
+        
+        debugImage = DebugImage.fromJSON(self.fs.get_last_version(overlayname).read())
+        with metrics.timer('debug_image'):
+            image = debugImage.render(ImageContext.open(result.item.file).image(), tags)
+            png = StringIO.StringIO()
+            image.save(png, 'png')
+        
+        with metrics.timer('gridfs_write'):
+            if result.preProcessingResult is not None:
+                result.preProcessingResult.debugImage.replace(png.getvalue(), filename=debugImagename, content_type='image/png')
+                result.save()
+            else:
+                self.fs.put(png.getvalue(), filename=debugImagename, content_type='image/png')
+        
+        self.log.info("Rendered debug image " + debugImagename, extra=tags)
+        return debugImagename
+    
+    def attachChart(self, inputsfile, png, tags):
+        """ Attaches the rendered chart of the stored chart inputs to the
+            chartImage of the SuryaIANAResult they were stored for, and marks
+            the chart rendered
+        
+            Keyword Arguments:
+            inputsfile -- The GridFS file document of the chart inputs
+            png        -- The rendered chart
+            tags       -- The logging tags
+            
+            Returns:
+            The GridFS file name of the chart, None if the result does not exist
+        """
+        result = SuryaIANAResult.objects(id=inputsfile['result']).first()
+        if result is None:
+            self.log.error("No result stored for the chart of " + inputsfile['filename'], extra=tags)
+            return None
+        
+        chartname = inputsfile['filename'][:-len(".json")] + ".png"
+        
+        with metrics.timer('gridfs_write'):
+            result.computationResult.chartImage.replace(png, filename=chartname, content_type='image/png')
+        with metrics.timer('mongo_write'):
+            result.save()
+            self.files.update({'_id': inputsfile['_id']}, {'$set': {'chartPending': False}})
+        
+        return chartname
+    
+    def renderChart(self, result):
+        """ Renders the deferred chart of a SuryaIANAResult from the inputs stored
+            with it, refer IANAUtil.ChartWorker, on the first request of the chart
+        
+            Keyword Arguments:
+            result -- The SuryaIANAResult
+            
+            Returns:
+            The GridFS file name of the chart, None if no inputs are pending
+        """
+        tags = self.ianatags + str(result.id) + " CHART"
+        
+        inputsname = self.chartName(result.item.file.name, result) + ".json"
+        
+        inputsfile = self.files.find_one({'filename': inputsname, 'result': result.id, 'chartPending': True})
+        if inputsfile is None:
+            self.log.error("No chart inputs pending for " + inputsname, extra=tags)
+            return None
+        
+        with metrics.timer('render_chart'):
+            png = ChartInputs.fromJSON(self.fs.get(inputsfile['_id']).read()).render()
+        chartname = self.attachChart(inputsfile, png, tags)
+        
+        self.log.info("Rendered chart " + str(chartname), extra=tags)
+        return chartname
+    
+    def renderChartBatch(self, inputsfiles, tags):
+        """ Renders the deferred charts of a batch of chart inputs on the low
+            priority processes of the IANAUtil.ChartWorker
+        
+            Returns:
+            The GridFS file names of the rendered charts
+        """
+        inputs = [self.fs.get(inputsfile['_id']).read() for inputsfile in inputsfiles]
+        with metrics.timer('render_charts'):
+            rendered = getChartWorker().render(inputs)
+        
+        chartnames = []
+        for inputsfile, (png, error) in zip(inputsfiles, rendered):
+            if png is None:
+                self.log.error("Could not render the chart of " + inputsfile['filename'] + ": " + error, extra=tags)
+                # keep the failed inputs out of the next batches
+                self.files.update({'_id': inputsfile['_id']}, {'$set': {'chartPending': False, 'chartError': error}})
+                continue
+            
+            chartname = self.attachChart(inputsfile, png, tags)
+            if chartname is not None:
+                chartnames.append(chartname)
+        
+        return chartnames
+    
+    def renderDeferredCharts(self, limit=None):
+        """ Renders the deferred charts of the saved results not rendered yet,
+            ChartConstants.BatchSize at a time, refer IANAMain/RenderCharts.py
+        
+            Keyword Arguments:
+            limit -- The largest number of charts rendered, all of them if None
+            
+            Returns:
+            The GridFS file names of the rendered charts
+        """
+        tags = self.ianatags + "CHART"
+        
+        # only the names of the pending inputs are queried, the inputs are read a batch at a time
+        pending = self.files.find({'chartPending': True}, ['filename', 'result'])
+        if limit is not None:
+            pending = pending.limit(limit)
+        
+        chartnames = []
+        batch = []
+        for inputsfile in pending:
+            batch.append(inputsfile)
+            if len(batch) == ChartConstants.BatchSize:
+                chartnames.extend(self.renderChartBatch(batch, tags))
+                batch = []
+        if batch:
+            chartnames.extend(self.renderChartBatch(batch, tags))
+        
+        self.log.info("Rendered %d deferred charts" % (len(chartnames)), extra=tags)
+        return chartnames
+    
+    @metrics.timed('PPROCCALIB')
     def getPreProcessingConfiguration(self, itemname, dataItem):
         """ Refer DANAFramework.getPreProcessingConfiguration for documentation
         """
@@ -106,12 +364,16 @@ class IANAFramework(DANAFramework):
             # Set the logging tags
             tags = self.ianatags + itemname + " PPROCCALIB"
             
+            # Start profiling the item, refer IANAUtil.Profile
+            getProfile(itemname)
+            
             self.log.info("Done Running PPROCCALIB", extra=tags)
 
             # here we actually fetch and store the updated preProcessing config
         except Exception, err:
             raise PprocCalibrationError(err)
     
+    @metrics.timed('PPROC')
     def preProcessDataItem(self, itemname, dataItem):
         """ Refer DANAFramework.preProcessDataItem() for documentation
         """
@@ -119,47 +381,76 @@ class IANAFramework(DANAFramework):
             # Set the logging tags
             tags = self.ianatags + itemname + " PPROC"
             
+            profile = getProfile(itemname)
+            
             self.log.info("Running PPROC", extra=tags)
             
             # Create a new pre-processin result object
             result = SuryaImagePreProcessingResult()
 
-            # Fetch the image
-            imagefile = dataItem.processEntity.file
+            # Fetch the image, read once and shared by every step of the featureExtractor
+            with metrics.timer('gridfs_read'):
+                imagefile = ImageContext.open(dataItem.processEntity.file)
+            profile.set('imageSize', list(imagefile.size()))
+            profile.set('imageBytes', len(imagefile.data))
+            profile.set('resized', False)
             
             # Fetch the debugImage
-            debugImagename = (itemname + ".debug." + str(dataItem.preProcessingConfiguration.calibrationId) + ".png")
+            debugImagename = self.debugImageName(itemname, dataItem) + ".png"
+            overlayname = self.debugImageName(itemname, dataItem) + ".json"
             
-            # Check if the image already exists, delete it
-            if self.fs.exists(filename=debugImagename):
-                debugImage = self.fs.get_last_version(debugImagename)
-                self.fs.delete(debugImage.__getattr__("_id"))
-             
-            result.debugImage.new_file(filename=debugImagename, content_type='image/png')
+            # Check if the image or its overlays already exist, delete them
+            self.deleteFile(debugImagename)
+            self.deleteFile(overlayname)
+            
+            # The debug image is only created if it is rendered, refer DebugImageConstants.Policy
+            def newDebugImage():
+                result.debugImage.new_file(filename=debugImagename, content_type='image/png')
+                return result.debugImage
+            
+            debugImage = DebugImage()
+            
+            # Pick the resolution to analyze the image at from its header, refer IANAUtil.ResizePolicy
+            policy = getResizePolicy()
+            resized = policy.shouldResize(imagefile.size())
+            if resized:
+                self.log.info("Resizing image before analysis", extra=tags)
+                metrics.increment('resize_up_front')
+                imagefile = self.resizeImage(dataItem, tags)
+                profile.set('resized', True)
+                profile.set('resizedSize', list(imagefile.size()))
         
-            # Get the Features from the image
-            features, exitcode = featureExtractor(imagefile, 1, result.debugImage, dataItem.preProcessingConfiguration, tags, logging.DEBUG)
+            # Get the Features from the image, a failure is retried on the resized image
+            # unless it is already resized, and only the debug image of the retry is rendered
+            state = {}
+            features, exitcode = featureExtractor(imagefile, 1, newDebugImage, dataItem.preProcessingConfiguration, tags, logging.DEBUG, debugImage, state, not resized)
+            policy.record(imagefile.size(), exitcode is ExitCode.Success)
 
             # If failed, maybe we need to shrink/grow image down
-            if exitcode is not ExitCode.Success:
+            if exitcode is not ExitCode.Success and not resized:
                 self.log.info("Resizing image", extra=tags)
-                shrunkimage = ImageResize.imageResize(dataItem.processEntity.origFile, ResizeImageConstants.LargestSide)
-                replimg = StringIO.StringIO()
-                shrunkimage.save(replimg, format="JPEG")
-                replimg.seek(0)
-                self.log.info("Resizing image %d" % (replimg.len), extra=tags)
-                dataItem.processEntity.file.replace(replimg, content_type='image/jpeg')
-                imagefile = dataItem.processEntity.file
+                metrics.increment('resize_retries')
+                size = imagefile.size()
+                imagefile = self.resizeImage(dataItem, tags)
+                profile.set('resized', True)
+                profile.set('resizedSize', list(imagefile.size()))
                 # redo the debug image
-                if self.fs.exists(filename=debugImagename):
-                    debugImage = self.fs.get_last_version(debugImagename)
-                    self.fs.delete(debugImage.__getattr__("_id"))
+                debugImage = DebugImage()
                 
-                result.debugImage.new_file(filename=debugImagename, content_type='image/png')
+                # keep the QR code found in the uploaded image rather than detecting it again
+                qr = state.get('qr')
+                state = {}
+                if qr is not None:
+                    state['qr'] = qr.scaled(imagefile.size()[0] / float(size[0]))
                 
-                # run QR detection again
                 self.log.info("Rerunning featureExtractor with resized image", extra=tags)
-                features, exitcode = featureExtractor(imagefile, 1, result.debugImage, dataItem.preProcessingConfiguration, tags, logging.DEBUG)
+                features, exitcode = featureExtractor(imagefile, 1, newDebugImage, dataItem.preProcessingConfiguration, tags, logging.DEBUG, debugImage, state)
+                policy.record(imagefile.size(), exitcode is ExitCode.Success)
+            
+            # Keep the overlays of a deferred debug image, refer renderDebugImage
+            if not debugImage.rendered:
+                with metrics.timer('gridfs_write'):
+                    self.fs.put(debugImage.toJSON(), filename=overlayname, content_type='application/json')
     
             # Set the result status
             result.status = ExitCode.toString[exitcode]
@@ -172,7 +463,7 @@ class IANAFramework(DANAFramework):
             result.sampled = features[0]
             
             self.log.info("Done Running PPROC", extra=tags)
-            return PreProcessingResult(features, result)
+            return PreProcessingResult(features, result, state.get('filterPixels'))
         except Exception as err:
             if isinstance(err, PreProcessingError):
                 raise err
@@ -184,6 +475,7 @@ class IANAFramework(DANAFramework):
             raise PreProcessingError(result.status, result, err)
              
             
+    @metrics.timed('COMPUCALIB')
     def getComputationConfiguration(self, itemname, dataItem, preProcessingResult):
         """ Refer DANAFramework.getComputationConfiguration for documentation
         """
@@ -278,6 +570,7 @@ class IANAFramework(DANAFramework):
                 raise err
             raise CompuCalibrationError(err, preProcessingResult)
         
+    @metrics.timed('COMPU')
     def computeDANAResult(self, itemname, dataItem, preProcessingResult):
         """ Refer DANAFramework.computeDANAResult for documentation
         """
@@ -289,16 +582,17 @@ class IANAFramework(DANAFramework):
             self.log.info("Running COMPU", extra=tags)
             
             result = SuryaImageAnalysisResult()
-            chartFileName = (itemname + ".chart." + str(dataItem.computationConfiguration.calibrationId) + ".png")
+            chartFileName = self.chartName(itemname, dataItem) + ".png"
              
-            # Check if the image already exists if not create a new file
-            if self.fs.exists(filename=chartFileName):
-                chartImg = self.fs.get_last_version(chartFileName)
-                self.fs.delete(chartImg.__getattr__("_id"))
-                
-            result.chartImage.new_file(filename=chartFileName, content_type='image/png')
-                
-            chartImage = result.chartImage
+            # Check if the image already exists if not create a new file, a
+            # deferred chart is rendered again from the new inputs on request
+            self.deleteFile(chartFileName)
+            
+            chartImage = None
+            if not ChartConstants.Deferred:
+                result.chartImage.new_file(filename=chartFileName, content_type='image/png')
+                chartImage = result.chartImage
+            
             sampledRGB, aux, gradient = preProcessingResult.features
             
             filterRadius = dataItem.computationConfiguration.filterRadius
@@ -309,7 +603,9 @@ class IANAFramework(DANAFramework):
             
             # Compute the BCCResult
             bccResult, exitcode = bccResultComputation(sampledRGB, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, chartImage, tags, logging.DEBUG)
-            chartImage.close()
+            if chartImage is not None:
+                with metrics.timer('gridfs_write'):
+                    chartImage.close()
             if exitcode is not ExitCode.Success:
                 result.status    = ExitCode.toString[exitcode] 
                 result.validFlag = False
@@ -328,6 +624,17 @@ class IANAFramework(DANAFramework):
                                    BCVolGreen     = bccResult.BCVolGreen,
                                    BCVolBlue      = bccResult.BCVolBlue)
             result.result = bccResult_
+            
+            # The chart is rendered once the result is saved, refer saveDANAResult and renderDeferredCharts
+            if ChartConstants.Deferred:
+                chartInputs = ChartInputs(filterRadius, exposedTime, airFlowRate, bcGradient, gradient, bccResult, sampledRGB)
+                self.deleteFile(self.chartName(itemname, dataItem) + ".json")
+                with metrics.timer('gridfs_write'):
+                    self.fs.put(chartInputs.toJSON(), filename=self.chartName(itemname, dataItem) + ".json", content_type='application/json')
+            
+            if preProcessingResult.filterPixels is not None:
+                self.saveLoadingMap(itemname, dataItem, bccResult, preProcessingResult.filterPixels, tags)
+            
             result.status = ExitCode.toString[exitcode]
             result.validFlag = True
         
@@ -341,6 +648,7 @@ class IANAFramework(DANAFramework):
             result.status                   = str(err)
             raise ResultComputationError(err, preProcessingResult, result)
     
+    @metrics.timed('SAVIN')
     def saveDANAResult(self, itemname, dataItem, preProcessingResult, computationResult):
         """ Result DANAFramework.saveDANAResult fro documentation
         """
@@ -364,7 +672,18 @@ class IANAFramework(DANAFramework):
             result.status                     = "COMPLETE"
             result.isEmailed                  = False
             result.date                       = datetime.datetime.now()
-            result.save()
+            self.storeProfile(itemname, result)
+            with metrics.timer('mongo_write'):
+                result.save()
+            
+            # The chart inputs stored by computeDANAResult are rendered by the chart worker, refer renderDeferredCharts
+            if ChartConstants.Deferred:
+                with metrics.timer('mongo_write'):
+                    self.files.update({'filename': self.chartName(itemname, dataItem) + ".json"},
+                                      {'$set': {'chartPending': True, 'result': result.id}})
+            
+            metrics.increment('items_completed')
+            self.dumpMetrics(tags)
             
             self.log.info("Done Running SAVIN", extra=tags)
         except Exception, err:
@@ -382,12 +701,15 @@ class IANAFramework(DANAFramework):
         
         self.log.error(phase + " Failed, cause: "+ str(err), extra=tags)
         
+        metrics.increment(phase + '_failures')
+        
         failedResult = SuryaIANAFailedResult()
         
         failedResult.item      = dataItem.processEntity
         failedResult.isEmailed = False
         failedResult.status    = phase 
         failedResult.date      = datetime.datetime.now()
+        self.storeProfile(itemname, failedResult)
         
         if phase == "PPROCCALIB" or phase == "SAVIN":
             failedResult.save()
@@ -405,6 +727,8 @@ class IANAFramework(DANAFramework):
             failedResult.computationResult          = err.computationResult
             failedResult.save()        
         
+        self.dumpMetrics(tags)
+        
 if __name__ == "__main__":
     connect("SuryaDB")
     iana = IANAFramework(logging.DEBUG)
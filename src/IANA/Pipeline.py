@@ -0,0 +1,483 @@
+'''
+The Pipeline Module runs the steps of the image analysis (QR -> stage ->
+calibrator -> graybars -> transform -> Hough -> sample -> BCC) as a graph of
+steps that declare the values they need and the values they produce.
+
+A run is asked for the values it needs (eg. the features, the BCCResult,
+the chart or the debug overlays) and only the steps producing them, and the
+steps those depend on, are run; in the order they are declared in. Values
+that are already known (eg. the image, or a QR code detected before) can be
+seeded through the state of the run.
+
+Both IANAMain.Main (the CLI) and IANA.FeatureExtractor (the IANAFramework)
+run the same pipeline.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import logging
+import psyco
+import PIL.ImageDraw as ImageDraw
+
+from Logging.Logger import getLog
+from IANAUtil.Chart import plotChart
+from IANAUtil.Metrics import getMetrics
+from IANAUtil.LoadingMap import FilterPixels
+from IANAUtil.MaskSampler import maskedPixels
+from IANAUtil.RegionStatistics import RegionStatistics, boundingBox
+from IANASteps.Geometry.Point import Point
+from IANASteps.QRDetector.QRDetector import detectQR
+from IANASteps.Calibrator.GrayBar import GrayBar
+from IANASteps.Calibrator.Calibrator import getGrayBars
+from IANASteps.CardLayout.CardLayout import getCardLayout
+from IANASteps.StageDetector.Stage import Stage
+from IANASteps.StageDetector.Calibrator import Calibrator
+from IANASteps.StageDetector.FilterDock import FilterDock
+from IANASteps.StageDetector.StageDetector import detectStage, detectCalibrator, detectFilterDock
+from IANASteps.ImageTransformer.ImageTransformer import transform
+from IANASteps.BCCCalculator.BCCCalculator import rateFilter
+from IANASteps.BCFilterDetector.HoughPool import getHoughPool
+from IANASteps.BCFilterDetector.BCFilterDetector import splitToBands, splitBand, detectBCFilter, select, PsycoInit, BandPriority,\
+    predictWindow
+from IANASettings.Settings import ExitCode, MainConstants, CalibratorConstants, ImageTransformerConstants,\
+    BCFilterDetectorConstants, FilterLayoutConstants, CardLayoutConstants, LoadingMapConstants
+
+log = getLog("Pipeline")
+log.setLevel(logging.ERROR)
+
+metrics = getMetrics()
+
+class PipelineStep:
+    '''
+    A step of the pipeline.
+
+    The function of a step is called with the values of its inputs followed by
+    the parenttags and the logging level, like every step in IANASteps, and
+    returns (value, exitcode); value is a tuple if the step has several outputs.
+    '''
+
+    def __init__(self, name, function, inputs, outputs):
+        ''' Constructor
+
+        Keyword Arguments:
+        name     -- the name the step is logged and timed (refer IANAUtil.Metrics) as
+        function -- the function running the step
+        inputs   -- the names of the values the step needs
+        outputs  -- the names of the values the step produces
+        '''
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.outputs = outputs
+
+class Pipeline:
+    '''
+    Runs the steps needed to produce the requested values
+    '''
+
+    def __init__(self, steps):
+        ''' Constructor
+
+        Keyword Arguments:
+        steps -- list of PipelineStep, in the order they run in
+        '''
+        self.steps = steps
+
+    def plan(self, outputs, state):
+        ''' Resolves the steps needed to produce outputs, walking the steps
+            backwards from the requested values.
+
+        Keyword Arguments:
+        outputs -- the names of the requested values
+        state   -- dict of the values already known
+
+        Returns:
+        the needed steps in the order they are declared in
+        '''
+        needed = set([name for name in outputs if name not in state])
+        plan = []
+
+        for step in reversed(self.steps):
+            if not needed.intersection(step.outputs):
+                continue
+            plan.append(step)
+            needed.difference_update(step.outputs)
+            needed.update([name for name in step.inputs if name not in state])
+
+        if needed:
+            raise KeyError('No step produces ' + ', '.join(sorted(needed)))
+
+        plan.reverse()
+        return plan
+
+    def run(self, outputs, state, parenttags=None, level=logging.ERROR):
+        ''' Runs the steps needed to produce outputs, stopping at the first
+            step that fails.
+
+        Keyword Arguments:
+        outputs    -- the names of the requested values
+        state      -- dict of the values already known, it is updated with the
+                      values produced by the steps; on failure state['failedStep']
+                      is the name of the failed step
+        parenttags -- tag string of the calling function
+        level      -- the logging level
+
+        Returns:
+        state, exitcode
+        '''
+        log.setLevel(level)
+        tags = parenttags + " PIPELINE"
+
+        for step in self.plan(outputs, state):
+            log.info('Running ' + step.name, extra=tags)
+
+            with metrics.timer(step.name):
+                value, exitcode = step.function(*([state[name] for name in step.inputs] + [tags, level]))
+
+            if exitcode is not ExitCode.Success:
+                log.error('Step ' + step.name + ' failed: ' + ExitCode.toString[exitcode], extra=tags)
+                state['failedStep'] = step.name
+                return state, exitcode
+
+            if len(step.outputs) == 1:
+                value = (value,)
+            for name, value_ in zip(step.outputs, value):
+                state[name] = value_
+
+        return state, ExitCode.Success
+
+########################################################################
+#                              Steps                                   #
+########################################################################
+
+def decode(context, parenttags=None, level=logging.ERROR):
+    ''' Returns the decoded image of the IANAUtil.ImageContext
+    '''
+    return context.image(), ExitCode.Success
+
+def mapLayout(qr, parenttags=None, level=logging.ERROR):
+    ''' Maps the compiled card layout into the image with the homography of the QR code,
+        if CardLayoutConstants.UseHomography
+
+    Returns:
+    CardLayout.MappedLayout, or None to locate the parts of the card from the QR code one by one
+    '''
+    if not CardLayoutConstants.UseHomography:
+        return None, ExitCode.Success
+
+    return getCardLayout().map(qr, parenttags, level)
+
+def locateStage(qr, layout, parenttags=None, level=logging.ERROR):
+    ''' Returns the Stage, from the layout if it is mapped
+    '''
+    if layout is None:
+        return detectStage(qr, parenttags, level)
+
+    return Stage(*layout['stage']), ExitCode.Success
+
+def locateCalibrator(qr, layout, parenttags=None, level=logging.ERROR):
+    ''' Returns the Calibrator, from the layout if it is mapped
+    '''
+    if layout is None:
+        return detectCalibrator(qr, parenttags, level)
+
+    return Calibrator(*layout['calibrator']), ExitCode.Success
+
+def locateGrayBars(qr, image, layout, parenttags=None, level=logging.ERROR):
+    ''' Returns the GrayBars, from the layout if it is mapped
+    '''
+    if layout is None:
+        return getGrayBars(qr, image, parenttags, level)
+
+    grayBars = [GrayBar(point) for point in layout['grayBars']]
+    grayBars.reverse()
+    return grayBars, ExitCode.Success
+
+def sampleGrayBars(grayBars, image, parenttags=None, level=logging.ERROR):
+    ''' Returns the gradient sampled from the grayBars, in one query of the
+        IANAUtil.RegionStatistics of the part of the image holding them
+    '''
+    if not grayBars:
+        return [], ExitCode.Success
+
+    boxes = [grayBar.box.coordinates for grayBar in grayBars]
+    return RegionStatistics(image, boundingBox(boxes)).means(boxes), ExitCode.Success
+
+def selectRegion(qr, stage, layout, parenttags=None, level=logging.ERROR):
+    ''' Returns the region of the image to correct the skew of, the filter dock
+        if ImageTransformerConstants.RegionOfInterest, else the whole stage
+    '''
+    if ImageTransformerConstants.RegionOfInterest:
+        if layout is not None:
+            return FilterDock(*layout['filterDock']), ExitCode.Success
+        return detectFilterDock(qr, parenttags, level)
+
+    return stage, ExitCode.Success
+
+def patchCalibrator(image, calibrator, region, parenttags=None, level=logging.ERROR):
+    ''' Blacks out the calibrator so that it is not detected as a filter, unless
+        only the filter dock (which does not hold the calibrator) is corrected
+    '''
+    if isinstance(region, FilterDock):
+        return image, ExitCode.Success
+
+    # on a copy as the decoded image is shared through the ImageContext
+    image = image.copy()
+    draw = ImageDraw.Draw(image)
+    draw.polygon((calibrator.topLeft, calibrator.bottomLeft, calibrator.bottomRight, calibrator.topRight), fill='black')
+    del draw
+
+    return image, ExitCode.Success
+
+def reduceImage(image, region, transformed, parenttags=None, level=logging.ERROR):
+    ''' Returns the skew corrected image the bcFilters are detected in, reduced
+        by ImageTransformerConstants.HoughScale
+    '''
+    if ImageTransformerConstants.HoughScale == 1.0:
+        return transformed, ExitCode.Success
+
+    # warp the region at the reduced size rather than resizing the corrected image
+    return transform(image, region, parenttags, level, ImageTransformerConstants.HoughScale)
+
+def splitImage(image, parenttags=None, level=logging.ERROR):
+    ''' Splits the transformed image into bands
+    '''
+    bands = splitToBands(image)
+    if bands is None:
+        log.error('Could not find the bcfilter in the image', extra=parenttags)
+        return None, ExitCode.UnknownError
+
+    return bands, ExitCode.Success
+
+def predictHoughWindow(region, image, parenttags=None, level=logging.ERROR):
+    ''' Predicts the window and radii of the bcFilter in the image the bcFilters are
+        detected in from the card layout, if FilterLayoutConstants.UseLayout
+
+    Returns:
+    BCFilterDetector.HoughWindow or None to search the whole image
+    '''
+    if not FilterLayoutConstants.UseLayout:
+        return None, ExitCode.Success
+
+    return predictWindow(region, image.size), ExitCode.Success
+
+def detectBand(band, configuration, window, parenttags=None, level=logging.ERROR):
+    ''' Detects the bcFilters in a band
+    '''
+    with metrics.timer('hough'):
+        return detectBCFilter(band, configuration, parenttags, level, ImageTransformerConstants.HoughScale, window)
+
+def detectBCFilters(bands, configuration, window, parenttags=None, level=logging.ERROR):
+    ''' Detects the bcFilters in every band, concurrently if there is a HoughPool
+
+    Returns:
+    list of the bcFilters detected per band, in the order of the bands
+    '''
+    # before any HoughPool thread runs houghTransform
+    PsycoInit(psyco)
+
+    pool = getHoughPool()
+    if pool is None:
+        results = []
+        for band in bands:
+            results.append(detectBand(band, configuration, window, parenttags, level))
+            if results[-1][1] is not ExitCode.Success:
+                break
+    else:
+        results = pool.map(detectBand, [(band, configuration, window, parenttags, level) for band in bands])
+
+    bcFiltersPerBand = []
+    for bcFilters, exitcode in results:
+        if exitcode is not ExitCode.Success:
+            return None, exitcode
+
+        bcFiltersPerBand.append(bcFilters)
+
+    return bcFiltersPerBand, ExitCode.Success
+
+def selectBCFilter(bcFiltersPerBand, parenttags=None, level=logging.ERROR):
+    ''' Selects the best bcFilter, refer BCFilterDetector.select
+    '''
+    bestBand = select(bcFiltersPerBand)
+    if not bestBand:
+        log.error('Could not detect any filters in the image', extra=parenttags)
+        return None, ExitCode.UnknownError
+
+    return bestBand[0], ExitCode.Success
+
+def detectImageBand(image, index, configuration, window, parenttags=None, level=logging.ERROR):
+    ''' Splits the band index out of the image and detects its bcFilters
+    '''
+    with metrics.timer('split_bands'):
+        band = splitBand(image, index)
+
+    return detectBand(band, configuration, window, parenttags, level)
+
+def selectBand(image, configuration, window, parenttags=None, level=logging.ERROR):
+    ''' Detects the bcFilters band by band in the order select prefers them and
+        stops at the first band holding any, if BCFilterDetectorConstants.LazyBands,
+        instead of splitting and detecting every band first. With a HoughPool every
+        band is detected speculatively at once, and the bands after the one kept
+        are left to finish unobserved.
+
+    Returns:
+    (the bcFilter selectBCFilter would select, the bcFilters detected per band),
+    the bands that were not evaluated have none
+    '''
+    if not BCFilterDetectorConstants.LazyBands or image.mode == 'L':
+        with metrics.timer('split_bands'):
+            bands, exitcode = splitImage(image, parenttags, level)
+        if exitcode is not ExitCode.Success:
+            return None, exitcode
+
+        bcFiltersPerBand, exitcode = detectBCFilters(bands, configuration, window, parenttags, level)
+        if exitcode is not ExitCode.Success:
+            return None, exitcode
+
+        bcFilter, exitcode = selectBCFilter(bcFiltersPerBand, parenttags, level)
+        return (bcFilter, bcFiltersPerBand), exitcode
+
+    # before any HoughPool thread runs houghTransform
+    PsycoInit(psyco)
+
+    argumentsList = [(image, index, configuration, window, parenttags, level) for index in BandPriority]
+
+    pool = getHoughPool()
+    if pool is None:
+        tasks = None
+    else:
+        # the bands are split in the worker threads, from the loaded image
+        image.load()
+        tasks = pool.submit(detectImageBand, argumentsList)
+
+    bcFiltersPerBand = [[] for index in BandPriority]
+    try:
+        for position, index in enumerate(BandPriority):
+            if tasks is None:
+                bcFilters, exitcode = detectImageBand(*argumentsList[position])
+            else:
+                bcFilters, exitcode = tasks.result(position)
+            if exitcode is not ExitCode.Success:
+                return None, exitcode
+
+            bcFiltersPerBand[index] = bcFilters
+            if len(bcFilters) > 0:
+                return (bcFilters[0], bcFiltersPerBand), ExitCode.Success
+    finally:
+        if tasks is not None:
+            tasks.cancel()
+
+    log.error('Could not detect any filters in the image', extra=parenttags)
+    return None, ExitCode.UnknownError
+
+def sampleBCFilter(bcFilter, image, configuration, parenttags=None, level=logging.ERROR):
+    ''' Samples the bcFilter with the samplingFactor of the configuration, if any
+    '''
+    if configuration is None or configuration.samplingFactor is None or configuration.samplingFactor is 0:
+        samplingfactor = MainConstants.samplingfactor
+    else:
+        samplingfactor = configuration.samplingFactor
+
+    radius = bcFilter.radius/samplingfactor
+    if MainConstants.circularsampling:
+        sample = bcFilter.sampleMask(image, radius, radius * MainConstants.annulusfraction)
+        return sample.trimmedMean(MainConstants.trimfraction), ExitCode.Success
+
+    return bcFilter.sample(image, radius, MainConstants.trimfraction), ExitCode.Success
+
+def extractFilterPixels(bcFilter, image, parenttags=None, level=logging.ERROR):
+    ''' Returns the IANAUtil.LoadingMap.FilterPixels of the bcFilter, for its loading map
+    '''
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    pixels, mask = maskedPixels(image, bcFilter.center, bcFilter.radius * LoadingMapConstants.RadiusFraction)
+    return FilterPixels(pixels, mask), ExitCode.Success
+
+def chart(bccResult, sampledRGB, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, chartFile, parenttags=None, level=logging.ERROR):
+    ''' Plots the chart of the BCCResult to chartFile
+    '''
+    plotChart(filterRadius, exposedTime, airFlowRate, bcGradient, gradient, bccResult, sampledRGB, chartFile)
+    return chartFile, ExitCode.Success
+
+def drawQR(debugImage, qr, parenttags=None, level=logging.ERROR):
+    ''' Records the QR code on the IANAUtil.DebugImage
+    '''
+    qr.draw(debugImage.source, 'red')
+    return True, ExitCode.Success
+
+def drawGrayBars(debugImage, grayBars, parenttags=None, level=logging.ERROR):
+    ''' Records the grayBars on the IANAUtil.DebugImage
+    '''
+    drawing = debugImage.source
+
+    # draw boxes on each graybar
+    for grayBar in grayBars:
+        grayBar.draw(drawing, 'magenta')
+
+    #lines across the graybars columns
+    boxsize = Point(CalibratorConstants.BoxSize, CalibratorConstants.BoxSize)
+    for i in range(0,2):
+        top = Point(grayBars[0 + i*6].box.coordinates[0:2])
+        bottom = Point(grayBars[5 + i*6].box.coordinates[0:2])
+
+        drawing.line(tuple(top + boxsize) + tuple(bottom+boxsize) , 'yellow')
+
+    return True, ExitCode.Success
+
+def drawStage(debugImage, region, transformed, parenttags=None, level=logging.ERROR):
+    ''' Records the transformation of the IANAUtil.DebugImage, once the image
+        itself could be transformed
+    '''
+    debugImage.transform(region)
+    return True, ExitCode.Success
+
+def drawBCFilters(debugImage, bcFiltersPerBand, drawnStage, parenttags=None, level=logging.ERROR):
+    ''' Records the bcFilters detected in every band on the IANAUtil.DebugImage,
+        only those of the bands evaluated if the bands were detected lazily
+    '''
+    drawing = debugImage.transformed
+
+    for bandIndex, bcFilters in enumerate(bcFiltersPerBand):
+        index = 1
+        for bcFilter in bcFilters:
+            drawing.text(bcFilter.center, str(index), MainConstants.bandnames[bandIndex])
+            bcFilter.draw(drawing, MainConstants.bandnames[bandIndex], MainConstants.samplingfactor)
+            index += 1
+
+    return True, ExitCode.Success
+
+##
+# The values recording the debug overlays on state['debugImage']
+DebugOutputs = ['drawnQR', 'drawnGrayBars', 'drawnStage', 'drawnBCFilters']
+
+##
+# The image analysis, the values it is seeded with are
+#   context       -- the IANAUtil.ImageContext of the image
+#   configuration -- the preProcessingConfiguration, or None
+#   debugImage    -- the IANAUtil.DebugImage, for the DebugOutputs
+#   filterRadius, exposedTime, airFlowRate, bcGradient -- for the bccResult
+#   chartFile     -- for the chart
+pipeline = Pipeline([PipelineStep('decode',          decode,           ['context'],                            ['image']),
+                     PipelineStep('qr',              detectQR,         ['context'],                            ['qr']),
+                     PipelineStep('draw_qr',         drawQR,           ['debugImage', 'qr'],                   ['drawnQR']),
+                     PipelineStep('layout',          mapLayout,        ['qr'],                                 ['layout']),
+                     PipelineStep('stage',           locateStage,      ['qr', 'layout'],                       ['stage']),
+                     PipelineStep('calibrator',      locateCalibrator, ['qr', 'layout'],                       ['calibrator']),
+                     PipelineStep('graybars',        locateGrayBars,   ['qr', 'image', 'layout'],              ['grayBars']),
+                     PipelineStep('graybars_sample', sampleGrayBars,   ['grayBars', 'image'],                  ['gradient']),
+                     PipelineStep('draw_graybars',   drawGrayBars,     ['debugImage', 'grayBars'],             ['drawnGrayBars']),
+                     PipelineStep('region',          selectRegion,     ['qr', 'stage', 'layout'],              ['region']),
+                     PipelineStep('patch',           patchCalibrator,  ['image', 'calibrator', 'region'],      ['patched']),
+                     PipelineStep('transform',       transform,        ['patched', 'region'],                  ['transformed']),
+                     PipelineStep('draw_stage',      drawStage,        ['debugImage', 'region', 'transformed'], ['drawnStage']),
+                     PipelineStep('hough_image',     reduceImage,      ['patched', 'region', 'transformed'],   ['houghImage']),
+                     PipelineStep('hough_window',    predictHoughWindow, ['region', 'houghImage'],             ['houghWindow']),
+                     PipelineStep('select_band',     selectBand,       ['houghImage', 'configuration', 'houghWindow'], ['bcFilter', 'bcFiltersPerBand']),
+                     PipelineStep('draw_bcfilters',  drawBCFilters,    ['debugImage', 'bcFiltersPerBand', 'drawnStage'], ['drawnBCFilters']),
+                     PipelineStep('sample',          sampleBCFilter,   ['bcFilter', 'transformed', 'configuration'], ['sampledRGB']),
+                     PipelineStep('filter_pixels',   extractFilterPixels, ['bcFilter', 'transformed'],         ['filterPixels']),
+                     PipelineStep('rate_filter',     rateFilter,       ['sampledRGB', 'filterRadius', 'exposedTime', 'airFlowRate', 'bcGradient', 'gradient'], ['bccResult']),
+                     PipelineStep('plot_chart',      chart,            ['bccResult', 'sampledRGB', 'filterRadius', 'exposedTime', 'airFlowRate', 'bcGradient', 'gradient', 'chartFile'], ['chart'])])
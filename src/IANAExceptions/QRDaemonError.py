@@ -0,0 +1,11 @@
+'''
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+class QRDaemonError(Exception):
+    ''' Raised when the QRServer JVM crashes, hangs or answers with
+        a malformed frame.
+    '''
+    pass
@@ -0,0 +1,103 @@
+'''
+Compares the solvers fitting the gradients in BCCCalculator.rateFilter (refer
+BCCCalculatorConstants.Solver): Scientific's leastSquaresFit and the
+Levenberg-Marquardt solver of BCCCalculator.ExpmodFit, in fit time and in the
+fitted parameters, on gradients synthesized from known expmod curves.
+
+    python BenchmarkFit.py -n 100 -s 2.0
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import time
+import numpy
+from optparse import OptionParser
+
+from IANAUtil.Rating import Rating
+from IANASettings.Settings import BCCCalculatorConstants
+from IANASteps.BCCCalculator.ExpmodFit import fitExpmod
+from Scientific.Functions.LeastSquares import leastSquaresFit
+
+##
+# The bcgradient of IANAMain.Main
+BCGradient = numpy.array([0.53805296,   0.77764056,   1.10252548,   1.54307503,
+                          2.14046781,   2.9505427 ,   4.04901822,   5.53856995,
+                          7.55842775,  10.29738974])
+
+def synthesize(random, noise):
+    ''' Returns the R, G, B gradients of a card whose bands follow random expmod
+        curves, with gaussian noise of the given standard deviation (in gray levels)
+    '''
+    gradients = []
+    for band in range(3):
+        a = random.uniform(-1.0, 0.0)
+        c = random.uniform(-0.03, -0.01)
+        # the lightest gray bar at about 220
+        b = (BCGradient[0] - a) / numpy.exp(c * 220)
+        x = numpy.log((BCGradient - a) / b) / c
+        gradients.append(x + random.normal(0, noise, x.shape))
+
+    return gradients
+
+def scientific(gradients):
+    fits = []
+    chis = []
+    for gradient in gradients:
+        fit, chi = leastSquaresFit(Rating.expmod, BCCCalculatorConstants.FittingParameters, zip(gradient, BCGradient),
+                                   stopping_limit=BCCCalculatorConstants.StoppingLimit)
+        fits.append(list(fit))
+        chis.append(chi)
+    return fits, chis
+
+def lm(gradients):
+    return fitExpmod(gradients, BCGradient)
+
+def benchmark(count, noise, seed):
+    ''' Fits count synthesized cards with both solvers and prints the times
+        and the differences of the fits
+    '''
+    random = numpy.random.RandomState(seed)
+    cards = [synthesize(random, noise) for i in range(count)]
+
+    results = {}
+    for name, solver in (('scientific', scientific), ('lm', lm)):
+        start = time.time()
+        fits = []
+        failures = 0
+        for gradients in cards:
+            try:
+                fits.append(solver(gradients))
+            except Exception:
+                fits.append(None)
+                failures += 1
+        seconds = time.time() - start
+        results[name] = fits
+        print '{0:>10}: {1:.3f} ms per card, {2} failures'.format(name, 1000 * seconds / count, failures)
+
+    chiDifferences = []
+    valueDifferences = []
+    for card, reference, fitted in zip(cards, results['scientific'], results['lm']):
+        if reference is None or fitted is None:
+            continue
+        for gradient, referenceFit, referenceChi, fit, chi in zip(card, reference[0], reference[1], fitted[0], fitted[1]):
+            chiDifferences.append(chi - referenceChi)
+            # the difference of the BC loadings the fits give over the gradient
+            valueDifferences.append(numpy.abs(Rating.expmod(fit, gradient) - Rating.expmod(referenceFit, gradient)).max())
+
+    if chiDifferences:
+        print 'chi^2 lm - scientific: mean {0:.3g}, max {1:.3g}'.format(numpy.mean(chiDifferences), numpy.max(chiDifferences))
+        print 'largest difference of the fitted loadings: {0:.3g} ug/cm^2'.format(numpy.max(valueDifferences))
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--count", dest="count",
+                      type="int", default=100, help="Number of cards")
+    parser.add_option("-s", "--noise", dest="noise",
+                      type="float", default=1.0, help="Noise of the gray bar samples")
+    parser.add_option("--seed", dest="seed",
+                      type="int", default=0, help="Random seed")
+    (options, args) = parser.parse_args()
+
+    benchmark(options.count, options.noise, options.seed)
@@ -11,23 +11,13 @@ Created on Oct 20, 2010
 import os.path
 import logging
 import pylab
-import psyco
-import PIL.Image as Image
-import PIL.ImageDraw as ImageDraw
-import PIL.ImageFont as ImageFont
 from optparse import OptionParser
  
 from Logging.Logger import getLog
-from IANASteps.Geometry.Point import Point
-from IANASettings.Settings import ExitCode, MainConstants, CalibratorConstants
-from IANASteps.QRDetector.QRDetector import detectQR
-from IANASteps.StageDetector.StageDetector import detectStage, detectCalibrator
-from IANASteps.ImageTransformer.ImageTransformer import transform
-from IANASteps.Calibrator.Calibrator import getGrayBars
-from IANASteps.BCFilterDetector.BCFilterDetector import splitToBands, detectBCFilter, select, PsycoInit
-from IANASteps.BCCCalculator.BCCCalculator import rateFilter
-from IANAUtil.Chart import plotChart
-from optparse import OptionParser
+from IANA.Pipeline import pipeline, DebugOutputs
+from IANAUtil.DebugImage import DebugImage
+from IANAUtil.ImageContext import ImageContext
+from IANASettings.Settings import ExitCode
 
 log = getLog("Main")
 log.setLevel(logging.ERROR)
@@ -58,157 +48,53 @@ def Main(imagefile, filterRadius, bcGradient, exposedTime, airFlowRate, imageLog
     
     log.info('Running SuryaImageAnalyzer', extra=tags)
     
-    # Open the image file using PIL.Image
+    # Read the image file once, every step shares the ImageContext
     if isinstance(imagefile, str):
         if not os.path.isfile(imagefile):
             log.error('imagefile ' + imagefile + ' does not exist')
             return None, ExitCode.FileNotExists
-        
-        image = Image.open(imagefile)
-    elif isinstance(imagefile, file):
-        try:
-            image = Image.open(imagefile)
-        except Exception, err:
-            log.error('Error %s' % str(err))
-        
-            return None, ExitCode.UnknownError
-    else:
+    elif not isinstance(imagefile, file):
         log.error('Error unknown filetype for input imagefile')
         return None, ExitCode.UnknownError
         
+    try:
+        context = ImageContext.open(imagefile)
+    except Exception, err:
+        log.error('Error %s' % str(err))
     
-    if imageLogLevel:
-        debugImage = image.copy()
-        drawing = ImageDraw.Draw(debugImage)
-        # For all the text that goes into the debug image
-        font = ImageFont.truetype(MainConstants.fontfile, 45)
-    
-    # QR Detection Step
-    qr, exitcode = detectQR(imagefile, tags, logging.DEBUG)
-
-    if exitcode is not ExitCode.Success:
-        log.error('Could not process for QR: ' + str(exitcode), extra=tags)
-        return None, exitcode
-    
-    if imageLogLevel:
-        qr.draw(drawing, 'red')
-        
-    # Stage detection Step
-    stage, exitcode = detectStage(qr, tags, logging.DEBUG)
-    
-    if exitcode is not ExitCode.Success:
-        log.error('Could not process for Stage: ' + str(exitcode), extra=tags)
-        return None, exitcode
-    
-    # Calibrator detection Step
-    calibrator, exitcode = detectCalibrator(qr, tags, logging.DEBUG)
-    
-    if exitcode is not ExitCode.Success:
-        log.error('Could not process for Calibrator: ' + str(exitcode), extra=tags)
-        return None, exitcode
-    
-    # Extract Data from the Calibrator
-    grayBars, exitcode = getGrayBars(qr, image, tags, logging.DEBUG)
-    
-    if exitcode is not ExitCode.Success:
-        log.error('Could not get grayBars from Calibrator ' + str(exitcode), extra=tags)
-        return None, exitcode
-    
-    gradient = []
-    for grayBar in grayBars:
-        gradient.append(grayBar.sample(image))
-            
-    if imageLogLevel:
-        # draw boxes on each graybar
-        for grayBar in grayBars:
-            grayBar.draw(drawing, 'magenta')
-            
-        #lines across the graybars columns
-        boxsize = Point(CalibratorConstants.BoxSize, CalibratorConstants.BoxSize)
-        for i in range(0,2):
-            top = Point(grayBars[0 + i*6].box.coordinates[0:2])
-            bottom = Point(grayBars[5 + i*6].box.coordinates[0:2])
-        
-            drawing.line(tuple(top + boxsize) + tuple(bottom+boxsize) , 'yellow')
-            
-    # Patch
-    draw = ImageDraw.Draw(image)
-    draw.polygon((calibrator.topLeft, calibrator.bottomLeft, calibrator.bottomRight, calibrator.topRight), fill='black')
-    del draw
-    
-    # Image Transformation Step
-    image, exitcode = transform(image, stage, tags, logging.DEBUG)
-
-    if exitcode is not ExitCode.Success:
-        log.error('Could not transform using Stage Coordinates: ' + str(exitcode), extra=tags)
-        return None, exitcode
-    
-    if imageLogLevel:
-        # Image Transformation Step
-        debugImage, exitcode = transform(debugImage, stage, tags, logging.DEBUG)
-
-        if exitcode is not ExitCode.Success:
-            log.error('Could not transform debugImage using Stage Coordinates: ' + str(exitcode), extra=tags)
-            return None, exitcode
-    
-        drawing = ImageDraw.Draw(debugImage)
-        
-    # Detect bcFilters
-    PsycoInit(psyco)
-    bands = splitToBands(image)
-    if bands is None:
-        log.error('Could not find the bcfilter in the image', extra=tags)
         return None, ExitCode.UnknownError
-
-    bcFiltersPerBand = []
-    
-    if imageLogLevel:
-        bandIndex = 0
     
+    # QR -> Stage -> Calibrator -> GrayBars -> Transform -> BCFilters -> Sample -> BCC, refer IANA.Pipeline
+    state = {'context': context,
+             'configuration': None,
+             'filterRadius': filterRadius,
+             'exposedTime': exposedTime,
+             'airFlowRate': airFlowRate,
+             'bcGradient': bcGradient}
+    outputs = ['bccResult']
     
-    for band in bands:
-        bcFilters, exitcode = detectBCFilter(band, None, tags, logging.DEBUG)
-        
-        if exitcode is not ExitCode.Success:
-            log.error('Could not detect filters in the Image ' + str(exitcode), extra=tags)
-            return None, exitcode
-        
-        if imageLogLevel:
-            index = 1
-            for bcFilter in bcFilters:
-                drawing.text(bcFilter.center, str(index), MainConstants.bandnames[bandIndex], font)
-                bcFilter.draw(drawing, MainConstants.bandnames[bandIndex], MainConstants.samplingfactor)
-                index += 1
-            bandIndex += 1
-
-        bcFiltersPerBand.append(bcFilters)
-        
-    bestBand = select(bcFiltersPerBand)
-    
-    if not bestBand:
-        return None, ExitCode.UnknownError
-    
-    bestBcFilter = bestBand[0]
+    if imageLogLevel:
+        debugImage = DebugImage()
+        state['debugImage'] = debugImage
+        state['chartFile'] = chartFile
+        outputs += ['chart'] + DebugOutputs
     
-    sampledRGB = bestBcFilter.sample(image, bestBcFilter.radius/MainConstants.samplingfactor)
-         
-    # Compute BCC
-    bccResult, exitcode = rateFilter(sampledRGB, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, tags, logging.DEBUG)
+    state, exitcode = pipeline.run(outputs, state, tags, logging.DEBUG)
     
     if exitcode is not ExitCode.Success:
-        log.error('Could not compute BCC result for : ' + str(exitcode), extra=tags)
+        log.error('Could not compute BCC result at ' + state['failedStep'] + ': ' + str(exitcode), extra=tags)
         return None, exitcode
 
     log.info('Done Running SuryaImageAnalyzer', extra=tags)
     
     if imageLogLevel:
-        plotChart(filterRadius, exposedTime, airFlowRate, bcGradient, gradient, bccResult, sampledRGB, chartFile)
+        debugImage = debugImage.render(context.image(), tags)
         debugImage.save(debugImageFile)
         
     if imageLogLevel > 1:
         debugImage.show()
      
-    return bccResult, exitcode
+    return state['bccResult'], exitcode
 
 if __name__ == '__main__':
 # (imagefile, filterRadius, bcGradient, exposedTime, airFlowRate, imageLogLevel, debugImageFile, chartFile, level=logging.ERROR,):
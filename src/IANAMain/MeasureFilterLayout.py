@@ -0,0 +1,66 @@
+'''
+Measures where the bcFilter lies on real cards, in the QR units of
+FilterLayoutConstants: every image is analyzed up to the bcFilter with the
+whole transformed image searched (FilterLayoutConstants.UseLayout off), and
+the detected filter is mapped back to QR units (refer
+BCFilterDetector.measureLayout). The mean and spread over the images are what
+CenterU, CenterV, Radius and their tolerances should be set to.
+
+    python MeasureFilterLayout.py card1.jpg card2.jpg ...
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import sys
+import numpy
+import logging
+from optparse import OptionParser
+
+from IANA.Pipeline import pipeline
+from IANAUtil.ImageContext import ImageContext
+from IANASteps.BCFilterDetector.BCFilterDetector import measureLayout
+from IANASettings.Settings import ExitCode, FilterLayoutConstants
+
+def measure(imagefile):
+    ''' Returns the CenterU, CenterV, Radius of the bcFilter of the card in
+        imagefile, or None if it could not be detected
+    '''
+    state = {'context': ImageContext.open(imagefile),
+             'configuration': None}
+    state, exitcode = pipeline.run(['bcFilter', 'region', 'transformed'], state, 'MEASURE', logging.ERROR)
+    if exitcode is not ExitCode.Success:
+        return None
+
+    bcFilter = state['bcFilter']
+    return measureLayout(state['region'], state['transformed'].size, bcFilter.center, bcFilter.radius)
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="usage: %prog imagefile ...")
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error("no image given")
+
+    FilterLayoutConstants.UseLayout = False
+
+    layouts = []
+    for imagefile in args:
+        layout = measure(imagefile)
+        if layout is None:
+            print '{0}: no bcFilter detected'.format(imagefile)
+            continue
+        print '{0}: CenterU {1:.3f}, CenterV {2:.3f}, Radius {3:.3f}'.format(imagefile, *layout)
+        layouts.append(layout)
+
+    if not layouts:
+        sys.exit(1)
+
+    layouts = numpy.array(layouts)
+    mean = layouts.mean(axis=0)
+    spread = layouts.std(axis=0)
+    print 'mean   CenterU {0:.3f}, CenterV {1:.3f}, Radius {2:.3f}'.format(*mean)
+    print 'spread CenterU {0:.3f}, CenterV {1:.3f}, Radius {2:.3f}'.format(*spread)
+    print 'largest center offset {0:.3f} QR units, largest radius offset {1:.1%}'.format(
+        numpy.sqrt(((layouts[:, :2] - mean[:2]) ** 2).sum(axis=1)).max(),
+        numpy.abs(layouts[:, 2] / mean[2] - 1).max())
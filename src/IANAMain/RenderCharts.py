@@ -0,0 +1,58 @@
+'''
+The low priority chart worker of ChartConstants.Deferred: renders the charts of
+the saved SuryaIANAResults in batches on the processes of IANAUtil.ChartWorker
+and attaches them to the chartImage of the results, refer
+IANAFramework.renderDeferredCharts. A single chart is rendered on demand with
+the id of its result.
+
+    python RenderCharts.py -w 60
+    python RenderCharts.py -r <SuryaIANAResult id>
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import time
+import logging
+from optparse import OptionParser
+
+from mongoengine import connect
+from bson.objectid import ObjectId
+from IANA.IANAFramework import IANAFramework
+from IANAUtil.ChartWorker import getChartWorker
+from Collections.SuryaProcessResult import *
+
+def renderCharts(iana, limit, wait):
+    ''' Renders the pending charts, limit at a time, and waits wait seconds for
+        new ones once none are pending; renders them once if wait is 0
+    '''
+    try:
+        while True:
+            chartnames = iana.renderDeferredCharts(limit)
+            if not wait:
+                break
+            if not chartnames:
+                time.sleep(wait)
+    finally:
+        getChartWorker().close()
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-d", "--database", dest="database",
+                      default="SuryaDB", help="Name of the database")
+    parser.add_option("-n", "--limit", dest="limit",
+                      type="int", default=None, help="Largest number of charts rendered per pass")
+    parser.add_option("-w", "--wait", dest="wait",
+                      type="int", default=0, help="Seconds to wait for new charts, render once if 0")
+    parser.add_option("-r", "--result", dest="result",
+                      default=None, help="Id of a SuryaIANAResult whose chart is rendered")
+    (options, args) = parser.parse_args()
+
+    connect(options.database)
+    iana = IANAFramework(logging.INFO)
+
+    if options.result is not None:
+        iana.renderChart(SuryaIANAResult.objects.get(id=ObjectId(options.result)))
+    else:
+        renderCharts(iana, options.limit, options.wait)
@@ -0,0 +1,55 @@
+'''
+Renders the deferred debug image of an analyzed item on request, from the
+overlays recorded while it was analyzed (refer DebugImageConstants.Policy),
+and attaches it to its SuryaIANAResult or SuryaIANAFailedResult, refer
+IANAFramework.renderDebugImage.
+
+    python RenderDebugImage.py <SuryaIANAResult or SuryaIANAFailedResult id> ...
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import sys
+import logging
+from optparse import OptionParser
+
+from mongoengine import connect
+from bson.objectid import ObjectId
+from IANA.IANAFramework import IANAFramework
+from Collections.SuryaProcessResult import *
+
+def findResult(resultId):
+    ''' Returns the SuryaIANAResult or SuryaIANAFailedResult with the id resultId, or None
+    '''
+    for document in (SuryaIANAResult, SuryaIANAFailedResult):
+        result = document.objects(id=ObjectId(resultId)).first()
+        if result is not None:
+            return result
+
+    return None
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="usage: %prog [options] resultId ...")
+    parser.add_option("-d", "--database", dest="database",
+                      default="SuryaDB", help="Name of the database")
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error("no result id given")
+
+    connect(options.database)
+    iana = IANAFramework(logging.INFO)
+
+    failures = 0
+    for resultId in args:
+        result = findResult(resultId)
+        if result is None:
+            print 'No result ' + resultId
+            failures += 1
+        elif iana.renderDebugImage(result) is None:
+            failures += 1
+        else:
+            print result.item.file.name + ': ' + iana.debugImageName(result.item.file.name, result) + '.png'
+
+    sys.exit(failures and 1)
@@ -6,6 +6,8 @@ Created on Oct 8, 2010
 @author: surya
 '''
 # TODO : Must be able to configure the constants through an admin interface
+import os
+import tempfile
 import IANASteps.Geometry
 
 ########################################################################
@@ -21,6 +23,29 @@ class BCCCalculatorConstants:
     # Stopping limit for leastSquaresFit
     StoppingLimit = 0.00005
     
+    ##
+    # The solver fitting the gradients: 'scientific' for Scientific's leastSquaresFit,
+    # 'lm' for the Levenberg-Marquardt solver of BCCCalculator.ExpmodFit
+    Solver = 'scientific'
+    
+    ##
+    # Maximum number of iterations of the 'lm' solver
+    MaximumIterations = 1000
+    
+    ##
+    # Fits of the 'lm' solver whose normalized J^T J has a smaller determinant at the
+    # solution do not determine their parameters (eg. flat gradients) and are rejected
+    SingularityLimit = 1e-6
+    
+    ##
+    # Number of fits kept by the BCCCalculator.FitCache, 0 to fit every gradient
+    FitCacheSize = 256
+    
+    ##
+    # The gradients are quantized to multiples of this before they are looked up
+    # in the FitCache, 0 to only reuse the fits of identical gradients
+    FitCacheTolerance = 0.0
+    
     ##
     # PI
     Pi = 3.1415926535897931
@@ -32,9 +57,16 @@ class BCCCalculatorConstants:
         Returns:
         str - String representation of BCCCalculatorConstants
         '''
-        return 'BCCCalculatorConstants: FittingParameters:{0}, StoppingLimit:{1}, Pi:{2}'.format(cls.FittingParameters,
-                                                                                                 cls.StoppingLimit,
-                                                                                                 cls.Pi)
+        return 'BCCCalculatorConstants: FittingParameters:{0}, StoppingLimit:{1}, Solver:{2}, '\
+                                       'MaximumIterations:{3}, SingularityLimit:{4}, FitCacheSize:{5}, '\
+                                       'FitCacheTolerance:{6}, Pi:{7}'.format(cls.FittingParameters,
+                                                                              cls.StoppingLimit,
+                                                                              cls.Solver,
+                                                                              cls.MaximumIterations,
+                                                                              cls.SingularityLimit,
+                                                                              cls.FitCacheSize,
+                                                                              cls.FitCacheTolerance,
+                                                                              cls.Pi)
 
 ########################################################################
 #                        Image Resize Constants                        #
@@ -44,6 +76,67 @@ class ResizeImageConstants:
     ##
     # Resize the largest side to this new resolution
     LargestSide = 1024
+    
+    ##
+    # Images whose largest side exceeds this are resized to LargestSide before
+    # they are analyzed rather than after a failed analysis, 0 to never
+    MaximumSide = 0
+    
+    ##
+    # Also resize the images up front if the images analyzed so far succeeded
+    # more often at LargestSide than at their own resolution (refer IANAUtil.ResizePolicy)
+    UseHistory = False
+    
+    ##
+    # Width (in pixels of the largest side) of the resolutions the success rates are kept for
+    HistoryBucket = 512
+    
+    ##
+    # Number of images a success rate needs before it is used
+    HistorySamples = 20
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of ResizeImageConstants
+        '''
+        return 'ResizeImageConstants: LargestSide:{0}, '\
+                                     'MaximumSide:{1}, '\
+                                     'UseHistory:{2}, '\
+                                     'HistoryBucket:{3}, '\
+                                     'HistorySamples:{4}'.format(cls.LargestSide,
+                                                                 cls.MaximumSide,
+                                                                 cls.UseHistory,
+                                                                 cls.HistoryBucket,
+                                                                 cls.HistorySamples)
+
+
+########################################################################
+#                     ImageTransformer Constants                       #
+########################################################################
+class ImageTransformerConstants:
+    
+    ##
+    # Only correct the skew of the filter dock (the stage below the calibrator),
+    # instead of blacking out the calibrator and correcting the whole stage
+    RegionOfInterest = False
+    
+    ##
+    # Scale of the skew corrected image the bcFilters are detected in, the
+    # bcFilters are sampled in the unscaled image
+    HoughScale = 1.0
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of ImageTransformerConstants
+        '''
+        return 'ImageTransformerConstants: RegionOfInterest:{0}, HoughScale:{1}'.format(cls.RegionOfInterest,
+                                                                                         cls.HoughScale)
 
 
 ########################################################################
@@ -100,6 +193,92 @@ class BCFilterConstants:
                                                       cls.maximumRadius,
                                                       cls.masksize)
 
+########################################################################
+#                      BCFilterDetector Constants                      #
+########################################################################
+class BCFilterDetectorConstants:
+    
+    ##
+    # Number of threads detecting the bcFilters of the bands concurrently
+    # (refer HoughPool.py), 1 to detect them one after the other
+    Threads = 3
+    
+    ##
+    # Detect the bcFilters band by band in the order select prefers them, and stop
+    # at the first band holding any (debug images only show the bands evaluated).
+    # With Threads > 1 every band is detected speculatively on the HoughPool and the
+    # first band holding any is kept: the latency of about one band, for the cpu of
+    # all of them. With Threads = 1 the bands after it are not detected at all.
+    LazyBands = True
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of BCFilterDetectorConstants
+        '''
+        return 'BCFilterDetectorConstants: Threads:{0}, LazyBands:{1}'.format(cls.Threads,
+                                                                              cls.LazyBands)
+
+########################################################################
+#                      HoughPyramid Constants                          #
+########################################################################
+class HoughPyramidConstants:
+    
+    ##
+    # Find candidate circles in a reduced copy of the image, then confirm and refine
+    # each of them in a small window of the image (refer pyramidHoughTransform)
+    Enabled = False
+    
+    ##
+    # Scale of the reduced copy, 0.25 or 0.5
+    Scale = 0.5
+    
+    ##
+    # Fraction a candidate radius may be off the refined radius
+    RadiusTolerance = 0.2
+    
+    ##
+    # Margin (as a fraction of the candidate radius) around a candidate circle
+    # that the refinement window extends
+    Margin = 0.5
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of HoughPyramidConstants
+        '''
+        return 'HoughPyramidConstants: Enabled:{0}, '\
+                                      'Scale:{1}, '\
+                                      'RadiusTolerance:{2}, '\
+                                      'Margin:{3}'.format(cls.Enabled,
+                                                          cls.Scale,
+                                                          cls.RadiusTolerance,
+                                                          cls.Margin)
+
+########################################################################
+#                      CardLayout Constants                            #
+########################################################################
+class CardLayoutConstants:
+    
+    ##
+    # Locate the stage, calibrator, filter dock and gray bars by mapping the compiled
+    # card layout (refer IANASteps.CardLayout) with the homography of the QR code,
+    # rather than extending the QR code bilinearly part by part
+    UseHomography = False
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of CardLayoutConstants
+        '''
+        return 'CardLayoutConstants: UseHomography:{0}'.format(cls.UseHomography)
+
 ########################################################################
 #                      Calibrator Constants                            #
 ########################################################################
@@ -166,6 +345,135 @@ class CalibratorConstants:
                                                           cls.LastGrayBarOffset,
                                                           cls.BoxSize)
 
+########################################################################
+#                      QRDetector Constants                            #
+########################################################################
+class QRDetectorConstants:
+
+    ##
+    # The message every Surya QR code starts with
+    Message = 'http://www.projectsurya.org/'
+
+    ##
+    # Use a single long-lived QRServer JVM instead of spawning FindQRCode.jar per image,
+    # QRServer.class has to be built first (refer QRDetector/QRServer.java)
+    UseDaemon = False
+
+    ##
+    # Seconds to wait for the QRServer to answer before it is considered hung
+    DaemonTimeout = 30
+
+    ##
+    # Consecutive failed (re)starts after which the QRServer is given up on
+    # and every image falls back to spawning FindQRCode.jar
+    DaemonMaxRestarts = 3
+
+    ##
+    # Seconds after which the QRServer is tried again once it has been given up on
+    DaemonRetryInterval = 300
+
+    ##
+    # Locate the QR code in-process (refer QRLocator.py) and only hand a tight
+    # crop of it to FindQRCode.jar to decode the aux_id
+    UseLocator = False
+
+    ##
+    # Largest side of the thumbnail the locator scans
+    LocatorThumbnailSide = 1024
+
+    ##
+    # A pixel is dark if it is below this fraction of its local mean
+    LocatorThreshold = 0.85
+
+    ##
+    # Number of verified finder pattern candidates considered when picking the QR corners
+    LocatorCandidates = 8
+
+    ##
+    # Highest acceptable deviation of the finder patterns from a right isosceles triangle
+    LocatorTolerance = 0.3
+
+    ##
+    # Margin (as a fraction of the QR size) kept around the QR code when cropping for FindQRCode.jar
+    LocatorCropMargin = 0.5
+
+    ##
+    # Remember QR detection results of identical images (refer QRCache.py)
+    UseCache = True
+
+    ##
+    # Directory holding the cached QR detection results
+    CacheDirectory = os.path.join(tempfile.gettempdir(), 'IANAQRCache')
+
+    ##
+    # Size the cached QR detection results may take on disk
+    CacheMaxBytes = 16 * 1024 * 1024
+
+    ##
+    # Decode large images on a thumbnail first and refine the QR points at full resolution
+    CoarseToFine = False
+
+    ##
+    # Largest side of the thumbnail decoded in coarse-to-fine mode
+    CoarseSide = 1024
+
+    ##
+    # Half the side of the window (as a fraction of the QR size) searched around each coarse point
+    CoarseRefineWindow = 0.3
+
+    ##
+    # Degrees the refined QR rotation may differ from the thumbnail's
+    CoarseRotationTolerance = 2.0
+
+    ##
+    # Fraction the refined QR width and height may differ from the thumbnail's
+    CoarseSizeTolerance = 0.05
+
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+
+        Returns:
+        str - String representation of QRDetectorConstants
+        '''
+        return 'QRDetectorConstants: Message:{0}, '\
+                                    'UseDaemon:{1}, '\
+                                    'DaemonTimeout:{2}, '\
+                                    'DaemonMaxRestarts:{3}, '\
+                                    'DaemonRetryInterval:{4}, '\
+                                    'UseLocator:{5}, '\
+                                    'LocatorThumbnailSide:{6}, '\
+                                    'LocatorThreshold:{7}, '\
+                                    'LocatorCandidates:{8}, '\
+                                    'LocatorTolerance:{9}, '\
+                                    'LocatorCropMargin:{10}, '\
+                                    'UseCache:{11}, '\
+                                    'CacheDirectory:{12}, '\
+                                    'CacheMaxBytes:{13}, '\
+                                    'CoarseToFine:{14}, '\
+                                    'CoarseSide:{15}, '\
+                                    'CoarseRefineWindow:{16}, '\
+                                    'CoarseRotationTolerance:{17}, '\
+                                    'CoarseSizeTolerance:{18}'.format(cls.Message,
+                                                                   cls.UseDaemon,
+                                                                   cls.DaemonTimeout,
+                                                                   cls.DaemonMaxRestarts,
+                                                                   cls.DaemonRetryInterval,
+                                                                   cls.UseLocator,
+                                                                   cls.LocatorThumbnailSide,
+                                                                   cls.LocatorThreshold,
+                                                                   cls.LocatorCandidates,
+                                                                   cls.LocatorTolerance,
+                                                                   cls.LocatorCropMargin,
+                                                                   cls.UseCache,
+                                                                   cls.CacheDirectory,
+                                                                   cls.CacheMaxBytes,
+                                                                   cls.CoarseToFine,
+                                                                   cls.CoarseSide,
+                                                                   cls.CoarseRefineWindow,
+                                                                   cls.CoarseRotationTolerance,
+                                                                   cls.CoarseSizeTolerance)
+
 ########################################################################
 #                   StageDetector Constants                            #
 ########################################################################
@@ -207,6 +515,196 @@ class StageDetectorConstants:
                                                               cls.ctop,
                                                               cls.cbottom)
                              
+########################################################################
+#                      FilterLayout Constants                          #
+########################################################################
+class FilterLayoutConstants:
+    
+    ##
+    # Search for the bcFilter only around where the card layout puts it, with the radii
+    # it is expected to have, before falling back to searching the whole image
+    UseLayout = False
+    
+    ##
+    # Expected center of the filter in QR units from the top left of the QR code, 
+    # U along the top of the QR code, V along its left side: the center of the
+    # filter dock, the part of the stage below the calibrator (refer StageDetectorConstants)
+    CenterU = (StageDetectorConstants.sleft + StageDetectorConstants.sright) / 2.0
+    CenterV = 1 + (StageDetectorConstants.cbottom + StageDetectorConstants.sbottom) / 2.0
+    
+    ##
+    # Expected radius of the filter in QR units. NOTE: an estimate (the filter fills most
+    # of the 2.4 QR units height of the filter dock), not a measurement: measure it and
+    # the tolerances on real cards with IANAMain/MeasureFilterLayout.py before UseLayout
+    Radius = 0.75
+    
+    ##
+    # Distance (in QR units) the filter center may be off its expected position
+    CenterTolerance = 0.5
+    
+    ##
+    # Fraction the filter radius may be off its expected radius
+    RadiusTolerance = 0.25
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of FilterLayoutConstants
+        '''
+        return 'FilterLayoutConstants: UseLayout:{0}, '\
+                                      'CenterU:{1}, '\
+                                      'CenterV:{2}, '\
+                                      'Radius:{3}, '\
+                                      'CenterTolerance:{4}, '\
+                                      'RadiusTolerance:{5}'.format(cls.UseLayout,
+                                                                   cls.CenterU,
+                                                                   cls.CenterV,
+                                                                   cls.Radius,
+                                                                   cls.CenterTolerance,
+                                                                   cls.RadiusTolerance)
+
+########################################################################
+#                      LoadingMap Constants                            #
+########################################################################
+class LoadingMapConstants:
+    
+    ##
+    # Keep the pixels of the filter from the preprocessing and store the map of
+    # their loading with the result of each item (refer IANAUtil.LoadingMap)
+    Enabled = False
+    
+    ##
+    # Fraction of the radius of the detected filter the pixels are taken in
+    RadiusFraction = 1.0
+    
+    ##
+    # Percentiles of the loading reported
+    Percentiles = [5, 25, 75, 95]
+    
+    ##
+    # Number of cells along each side of the stored heatmap
+    HeatmapSide = 32
+    
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+        
+        Returns:
+        str - String representation of LoadingMapConstants
+        '''
+        return 'LoadingMapConstants: Enabled:{0}, '\
+                                    'RadiusFraction:{1}, '\
+                                    'Percentiles:{2}, '\
+                                    'HeatmapSide:{3}'.format(cls.Enabled,
+                                                             cls.RadiusFraction,
+                                                             cls.Percentiles,
+                                                             cls.HeatmapSide)
+
+########################################################################
+#                      DebugImage Constants                            #
+########################################################################
+class DebugImageConstants:
+
+    ##
+    # When the recorded debug overlays are rendered into a debug image (refer IANAUtil/DebugImage.py)
+    # 'always', 'failures' (only for images that could not be analyzed), 'sampled' (failures
+    # and SampleRate of the other images) or 'never' (only on request). The debug images of
+    # the other items are rendered on request by IANAMain/RenderDebugImage.py.
+    # NOTE: the images analyzed successfully used to always get a debug image, set 'always'
+    #       to keep writing them
+    Policy = 'failures'
+
+    ##
+    # Fraction of the successfully analyzed images rendered with the 'sampled' Policy
+    SampleRate = 0.05
+
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+
+        Returns:
+        str - String representation of DebugImageConstants
+        '''
+        return 'DebugImageConstants: Policy:{0}, SampleRate:{1}'.format(cls.Policy,
+                                                                       cls.SampleRate)
+
+########################################################################
+#                         Chart Constants                              #
+########################################################################
+class ChartConstants:
+
+    ##
+    # Store the inputs of the chart with the result (as json) rather than rendering
+    # the chart while computing the result, refer IANAUtil/ChartWorker.py
+    Deferred = False
+
+    ##
+    # Number of processes rendering the deferred charts
+    Workers = 2
+
+    ##
+    # Number of charts rendered per batch by the processes
+    BatchSize = 16
+
+    ##
+    # Niceness added to the processes rendering the charts
+    Niceness = 10
+
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+
+        Returns:
+        str - String representation of ChartConstants
+        '''
+        return 'ChartConstants: Deferred:{0}, '\
+                               'Workers:{1}, '\
+                               'BatchSize:{2}, '\
+                               'Niceness:{3}'.format(cls.Deferred,
+                                                     cls.Workers,
+                                                     cls.BatchSize,
+                                                     cls.Niceness)
+
+########################################################################
+#                         Metrics Constants                            #
+########################################################################
+class MetricsConstants:
+
+    ##
+    # Prefix of the metric names in the Prometheus dump
+    Prefix = 'iana'
+
+    ##
+    # Upper bounds (seconds) of the stage latency histogram buckets
+    Buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    ##
+    # File the IANAFramework dumps the metrics to after every item, None to disable
+    DumpFile = os.path.join(tempfile.gettempdir(), 'IANAMetrics.prom')
+
+    ##
+    # Store the stage profile of every item (refer IANAUtil/Profile.py) as the profile
+    # field of its SuryaIANAResult/SuryaIANAFailedResult. The Collections documents must
+    # declare 'profile = DictField()', the IANAFramework does not start otherwise
+    StoreProfile = True
+
+    @classmethod
+    def str(cls):
+        ''' Returns a String Representation of this class
+
+        Returns:
+        str - String representation of MetricsConstants
+        '''
+        return 'MetricsConstants: Prefix:{0}, '\
+                                 'Buckets:{1}, '\
+                                 'DumpFile:{2}, '\
+                                 'StoreProfile:{3}'.format(cls.Prefix,
+                                                           cls.Buckets,
+                                                           cls.DumpFile,
+                                                           cls.StoreProfile)
+
 ########################################################################
 #                              EXITCODES                               #
 ########################################################################
@@ -247,4 +745,13 @@ class MainConstants:
     bandnames = ['red', 'green', 'blue']
     # samplingfactor = 10 # MLL: changed to 5 on 2010-11-27 so we have a larger sample area
     samplingfactor = 5
+    # fraction of the darkest and of the brightest pixels (glare) dropped when sampling the bcFilter, 0 to keep them all,
+    # in the square or in the circle (annulus) of circularsampling
+    trimfraction = 0.0
+    # sample the bcFilter inside the circle of the sampling radius rather than inside the square bounding it
+    circularsampling = False
+    # the inner radius (as a fraction of the sampling radius) of the annulus the bcFilter is sampled in, 0 for the whole circle
+    annulusfraction = 0.0
+    # number of circular masks kept, refer IANAUtil.MaskSampler
+    maskcachesize = 16
     
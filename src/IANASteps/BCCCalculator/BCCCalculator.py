@@ -4,10 +4,13 @@ Created on Oct 12, 2010
 @author: surya
 '''
 
+import numpy
 import pylab
 import logging
 
 from BCCResult import BCCResult
+from FitCache import getFitCache
+from ExpmodFit import fitExpmod, fitExpmodRows
 from Logging.Logger import getLog
 from IANAUtil.Rating import Rating
 from Scientific.Functions.LeastSquares import leastSquaresFit
@@ -61,7 +64,6 @@ def rateFilter(sampledRGB, filterRadius, exposedTime, flowRate, bcgradient, grad
         fitParam = BCCCalculatorConstants.FittingParameters
         stop     = BCCCalculatorConstants.StoppingLimit
         expmod   = Rating.expmod
-        rsquared = Rating.rsquared
     
         # The results of this computation
         bccResult = BCCResult()
@@ -69,33 +71,114 @@ def rateFilter(sampledRGB, filterRadius, exposedTime, flowRate, bcgradient, grad
         # separate by color leaving off the black and white
         gradientRed, gradientGreen, gradientBlue = zip(*gradient[1:-1])
     
-        # fit the gradient
-        bccResult.fitRed, chi = leastSquaresFit(expmod, fitParam, zip(gradientRed, bcgradient), stopping_limit=stop)
-        bccResult.fitGreen, chi = leastSquaresFit(expmod, fitParam, zip(gradientGreen, bcgradient), stopping_limit=stop)
-        bccResult.fitBlue, chi = leastSquaresFit(expmod, fitParam, zip(gradientBlue, bcgradient), stopping_limit=stop)
-    
-        # compute the rsquared value
-        bccResult.rSquaredRed = rsquared(expmod, bccResult.fitRed, pylab.array(gradientRed), bcgradient)
-        bccResult.rSquaredGreen = rsquared(expmod, bccResult.fitGreen, pylab.array(gradientRed), bcgradient)
-        bccResult.rSquaredBlue = rsquared(expmod, bccResult.fitBlue, pylab.array(gradientRed), bcgradient)
-    
-        red, green, blue = sampledRGB
+        # fit the gradient, unless the fits of the same gradient are cached
+        fitCache = getFitCache()
+        fits = fitCache.get(bcgradient, (gradientRed, gradientGreen, gradientBlue))
+        if fits is not None:
+            bccResult.fitRed, bccResult.fitGreen, bccResult.fitBlue = [list(fit) for fit in fits]
+        elif BCCCalculatorConstants.Solver == 'lm':
+            fitted, chi = fitExpmod([gradientRed, gradientGreen, gradientBlue], bcgradient, stoppingLimit=stop)
+            bccResult.fitRed, bccResult.fitGreen, bccResult.fitBlue = fitted
+        else:
+            bccResult.fitRed, chi = leastSquaresFit(expmod, fitParam, zip(gradientRed, bcgradient), stopping_limit=stop)
+            bccResult.fitGreen, chi = leastSquaresFit(expmod, fitParam, zip(gradientGreen, bcgradient), stopping_limit=stop)
+            bccResult.fitBlue, chi = leastSquaresFit(expmod, fitParam, zip(gradientBlue, bcgradient), stopping_limit=stop)
         
-        bccResult.BCAreaRed = expmod(bccResult.fitRed, red)
-        bccResult.BCAreaGreen = expmod(bccResult.fitGreen, green)
-        bccResult.BCAreaBlue = expmod(bccResult.fitBlue, blue)
+        if fits is None:
+            fitCache.put(bcgradient, (gradientRed, gradientGreen, gradientBlue),
+                         (bccResult.fitRed, bccResult.fitGreen, bccResult.fitBlue))
     
-        log.info('Computing Black Carbon Concentration: ', extra=tags)
-        bccResult.BCVolRed   = computeBCC(filterRadius, bccResult.BCAreaRed, exposedTime ,flowRate)
-        bccResult.BCVolGreen = computeBCC(filterRadius, bccResult.BCAreaGreen, exposedTime, flowRate)
-        bccResult.BCVolBlue = computeBCC(filterRadius, bccResult.BCAreaBlue, exposedTime, flowRate)
-    
-        log.info('Black carbon per cm^2: %s', ([bccResult.BCAreaRed, bccResult.BCAreaGreen, bccResult.BCAreaBlue],), extra=tags)
-        log.info('Black carbon per cm^3: %s', ([bccResult.BCVolRed, bccResult.BCVolGreen, bccResult.BCVolBlue],), extra=tags)
+        completeResult(bccResult, sampledRGB, filterRadius, exposedTime, flowRate, bcgradient, gradientRed, tags)
         
         log.info('Done Computing Black Carbon Concentration: ', extra=tags)
         return bccResult, ExitCode.Success
     
     except Exception, err:
         log.error('Error %s' % str(err), extra=tags)
-        return None, ExitCode.BCCComputationError
\ No newline at end of file
+        return None, ExitCode.BCCComputationError
+
+def completeResult(bccResult, sampledRGB, filterRadius, exposedTime, flowRate, bcgradient, gradientRed, tags):
+    ''' Computes the rsquared values, BCArea and BCVolume of a bccResult whose
+        fitRed, fitGreen and fitBlue are set
+    '''
+    expmod   = Rating.expmod
+    rsquared = Rating.rsquared
+    
+    # compute the rsquared value
+    bccResult.rSquaredRed = rsquared(expmod, bccResult.fitRed, pylab.array(gradientRed), bcgradient)
+    bccResult.rSquaredGreen = rsquared(expmod, bccResult.fitGreen, pylab.array(gradientRed), bcgradient)
+    bccResult.rSquaredBlue = rsquared(expmod, bccResult.fitBlue, pylab.array(gradientRed), bcgradient)
+
+    red, green, blue = sampledRGB
+    
+    bccResult.BCAreaRed = expmod(bccResult.fitRed, red)
+    bccResult.BCAreaGreen = expmod(bccResult.fitGreen, green)
+    bccResult.BCAreaBlue = expmod(bccResult.fitBlue, blue)
+
+    log.info('Computing Black Carbon Concentration: ', extra=tags)
+    bccResult.BCVolRed   = computeBCC(filterRadius, bccResult.BCAreaRed, exposedTime ,flowRate)
+    bccResult.BCVolGreen = computeBCC(filterRadius, bccResult.BCAreaGreen, exposedTime, flowRate)
+    bccResult.BCVolBlue = computeBCC(filterRadius, bccResult.BCAreaBlue, exposedTime, flowRate)
+
+    log.info('Black carbon per cm^2: %s', ([bccResult.BCAreaRed, bccResult.BCAreaGreen, bccResult.BCAreaBlue],), extra=tags)
+    log.info('Black carbon per cm^3: %s', ([bccResult.BCVolRed, bccResult.BCVolGreen, bccResult.BCVolBlue],), extra=tags)
+
+def rateFilterBatch(sampledRGBs, filterRadii, exposedTimes, flowRates, bcgradients, gradients, parenttags=None, level=logging.ERROR):
+    ''' Computes the BCArea and BCVolume of many items at once, eg. when a deployment
+        is reanalyzed: the 3 * N gradients are fitted in one array computation by
+        the Levenberg-Marquardt solver of ExpmodFit, whatever BCCCalculatorConstants.Solver.
+    
+    Keyword arguments (lists of N values, refer rateFilter):
+    sampledRGBs  -- The sampled RGB values of the BCFilters
+    filterRadii  -- The radii of the filters
+    exposedTimes -- The durations for which the filters were exposed
+    flowRates    -- The flow rates of the pumps
+    bcgradients  -- The calibration values, of the same length
+    gradients    -- The GrayBar values of the items
+    parenttags   -- The tag string of the calling function
+    level        -- The logging level
+    
+    Returns:
+    list of N (BCCResult, exitcode), (None, ExitCode.BCCComputationError) for the
+    items whose fits did not converge or do not determine their parameters
+    (refer ExpmodFit.identifiable)
+    '''
+    
+    # Set the logging level
+    log.setLevel(level)
+    tags = parenttags + " BCCCOMPUTATION"
+    
+    count = len(gradients)
+    if count == 0:
+        return []
+    
+    try:
+        # separate by color leaving off the black and white, rows R0, G0, B0, R1, G1, B1, ...
+        rows = []
+        for gradient in gradients:
+            rows.extend(zip(*gradient[1:-1]))
+        
+        y = numpy.repeat(numpy.array(bcgradients, dtype=numpy.float64), 3, axis=0)
+        fitted, chi, converged = fitExpmodRows(rows, y, stoppingLimit=BCCCalculatorConstants.StoppingLimit)
+    except Exception, err:
+        log.error('Error %s' % str(err), extra=tags)
+        return [(None, ExitCode.BCCComputationError)] * count
+    
+    log.info('Fitted %d items, %d failed', count, count - converged.reshape(count, 3).all(axis=1).sum(), extra=tags)
+    
+    results = []
+    for i in range(count):
+        try:
+            if not converged[3 * i:3 * i + 3].all():
+                raise ValueError('The fit did not converge or is degenerate')
+            
+            bccResult = BCCResult()
+            bccResult.fitRed, bccResult.fitGreen, bccResult.fitBlue = fitted[3 * i:3 * i + 3].tolist()
+            completeResult(bccResult, sampledRGBs[i], filterRadii[i], exposedTimes[i], flowRates[i],
+                           bcgradients[i], rows[3 * i], tags)
+            results.append((bccResult, ExitCode.Success))
+        except Exception, err:
+            log.error('Error %s' % str(err), extra=tags)
+            results.append((None, ExitCode.BCCComputationError))
+    
+    return results
\ No newline at end of file
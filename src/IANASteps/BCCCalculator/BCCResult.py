@@ -4,6 +4,10 @@ Created on Oct 12, 2010
 @author: surya
 '''
 
+import numpy
+
+from IANAUtil.Rating import Rating
+
 class BCCResult:
     ''' This class holds the reults of a BCC Computation
     '''
@@ -31,6 +35,44 @@ class BCCResult:
         self.BCVolGreen     = None
         self.BCVolBlue      = None
         
+        # the lookup tables of the fits, refer lookupTables
+        self.tables         = None
+    
+    def lookupTables(self):
+        ''' Returns the black carbon loading (ug/cm^2) of every intensity of each
+            band, computed once from fitRed, fitGreen and fitBlue
+        
+        Returns:
+        3 x 256 numpy array, indexed by band and intensity
+        '''
+        
+        if self.tables is None:
+            intensities = numpy.arange(256, dtype=numpy.float64)
+            self.tables = numpy.array([Rating.expmod(fit, intensities)
+                                       for fit in (self.fitRed, self.fitGreen, self.fitBlue)])
+        
+        return self.tables
+    
+    def loading(self, pixels):
+        ''' Converts the pixels to black carbon loading (ug/cm^2) by looking their
+            intensities up in the lookupTables
+        
+        Keyword Arguments:
+        pixels -- ... x 3 array of 8 bit RGB intensities, or an RGB PIL.Image
+        
+        Returns:
+        ... x 3 numpy array of the loading of each band of each pixel
+        '''
+        
+        pixels = numpy.asarray(pixels, dtype=numpy.uint8)
+        tables = self.lookupTables()
+        
+        loading = numpy.empty(pixels.shape)
+        for band in range(3):
+            loading[..., band] = tables[band][pixels[..., band]]
+        
+        return loading
+        
     def __str__(self):
         ''' Human readable representation
         
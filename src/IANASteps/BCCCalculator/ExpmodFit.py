@@ -0,0 +1,232 @@
+'''
+The ExpmodFit Module fits Rating.expmod (y = a + b * e ^ (c * x)) to many
+gradients at once (eg. the R, G and B bands of an image, or of all the images
+of a deployment), with a Levenberg-Marquardt solver using the analytic
+Jacobian of expmod.
+
+The iteration is the one of Scientific.Functions.LeastSquares.leastSquaresFit
+(the damping of the diagonal, the factor 10 updates of lambda and the stopping
+test on the decrease of chi^2), with the fits stacked into one array problem
+instead of derivative objects evaluated point by point.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+
+from IANASettings.Settings import BCCCalculatorConstants
+
+def logLinearGuess(x, y):
+    ''' Returns a closed form guess of (a, b, c) of y = a + b * e ^ (c * x) for
+        every row: the asymptote a is put just outside the range of y, and
+        log |y - a| is fitted linearly to x; of the two sides of the range the
+        better fit is kept.
+
+    Keyword Arguments:
+    x -- k x n numpy array
+    y -- k x n numpy array
+
+    Returns:
+    k x 3 array of the guesses, rows without a guess are not finite
+    '''
+    low, high = y.min(axis=1), y.max(axis=1)
+    margin = 0.05 * (high - low)
+    margin[margin == 0] = 1.0
+
+    xMean = x.mean(axis=1)
+    xCentered = x - xMean[:, None]
+    xVariance = (xCentered * xCentered).sum(axis=1)
+
+    guesses = []
+    chis = []
+    for sign, asymptote in ((1, low - margin), (-1, high + margin)):
+        z = numpy.log(sign * (y - asymptote[:, None]))
+        c = (xCentered * (z - z.mean(axis=1)[:, None])).sum(axis=1) / xVariance
+        b = sign * numpy.exp(z.mean(axis=1) - c * xMean)
+
+        guess = numpy.column_stack((asymptote, b, c))
+        r, jacobian = residuals(guess, x, y)
+        chi = (r * r).sum(axis=1)
+        chi[~numpy.isfinite(chi)] = numpy.inf
+
+        guesses.append(guess)
+        chis.append(chi)
+
+    return numpy.where((chis[0] <= chis[1])[:, None], guesses[0], guesses[1])
+
+def residuals(parameters, x, y):
+    ''' Returns the residuals of expmod and its Jacobian, for every fit
+
+    Keyword Arguments:
+    parameters -- k x 3 array of (a, b, c)
+    x          -- k x n array
+    y          -- k x n array
+
+    Returns:
+    k x n residuals, k x n x 3 Jacobian
+    '''
+    a, b, c = parameters[:, 0:1], parameters[:, 1:2], parameters[:, 2:3]
+    exponential = numpy.exp(c * x)
+
+    jacobian = numpy.empty(x.shape + (3,))
+    jacobian[:, :, 0] = 1
+    jacobian[:, :, 1] = exponential
+    jacobian[:, :, 2] = b * x * exponential
+
+    return a + b * exponential - y, jacobian
+
+def normalEquations(r, jacobian):
+    ''' Returns J^T J and -J^T r of every fit
+    '''
+    alpha = (jacobian[:, :, :, None] * jacobian[:, :, None, :]).sum(axis=1)
+    beta = -(jacobian * r[:, :, None]).sum(axis=1)
+    return alpha, beta
+
+def determinant(m):
+    ''' Returns the determinants of the k 3 x 3 matrices m
+    '''
+    return (m[:, 0, 0] * (m[:, 1, 1] * m[:, 2, 2] - m[:, 1, 2] * m[:, 2, 1]) -
+            m[:, 0, 1] * (m[:, 1, 0] * m[:, 2, 2] - m[:, 1, 2] * m[:, 2, 0]) +
+            m[:, 0, 2] * (m[:, 1, 0] * m[:, 2, 1] - m[:, 1, 1] * m[:, 2, 0]))
+
+def solve3(matrices, vectors):
+    ''' Solves the k 3 x 3 linear systems matrices * x = vectors by Cramer's rule
+
+    Returns:
+    k x 3 solutions, k booleans False for the singular systems
+    '''
+    denominator = determinant(matrices)
+    solvable = numpy.isfinite(denominator) & (denominator != 0)
+    denominator = numpy.where(solvable, denominator, 1.0)
+
+    solutions = numpy.empty(vectors.shape)
+    for column in range(3):
+        replaced = matrices.copy()
+        replaced[:, :, column] = vectors
+        solutions[:, column] = determinant(replaced) / denominator
+
+    solvable &= numpy.isfinite(solutions).all(axis=1)
+    return solutions, solvable
+
+def identifiable(parameters, x, singularityLimit=None):
+    ''' Returns which fits determine their (a, b, c): the parameters are finite,
+        c is negative (y decays with x, as every rating curve does) and the
+        Jacobian is not near-singular at the solution, eg. for a flat gradient
+        or with b or c near 0, where the exponential is lost in a.
+
+    Keyword Arguments:
+    parameters       -- k x 3 array of the fitted (a, b, c)
+    x                -- k x n array
+    singularityLimit -- BCCCalculatorConstants.SingularityLimit if None, the smallest
+                        determinant of the normalized J^T J (1 for orthogonal columns)
+
+    Returns:
+    k booleans
+    '''
+    if singularityLimit is None:
+        singularityLimit = BCCCalculatorConstants.SingularityLimit
+
+    finite = numpy.isfinite(parameters).all(axis=1)
+    parameters = numpy.where(finite[:, None], parameters, 0)
+
+    r, jacobian = residuals(parameters, x, numpy.zeros(x.shape))
+    alpha, beta = normalEquations(r, jacobian)
+
+    # J^T J scaled to a unit diagonal, its determinant is 0 for dependent columns
+    scale = numpy.sqrt(alpha[:, [0, 1, 2], [0, 1, 2]])
+    scale[scale == 0] = numpy.nan
+    normalized = alpha / (scale[:, :, None] * scale[:, None, :])
+
+    return finite & (parameters[:, 2] < 0) & (numpy.nan_to_num(determinant(normalized)) > singularityLimit)
+
+def fitExpmodRows(x, y, initial=None, stoppingLimit=None, maximumIterations=None):
+    ''' Fits y = a + b * e ^ (c * x) to every row of x and y
+
+    Keyword Arguments:
+    x                 -- k x n array
+    y                 -- k x n array, or n values shared by every row
+    initial           -- the initial (a, b, c), a log-linear guess of each fit if None
+                         (BCCCalculatorConstants.FittingParameters if there is none)
+    stoppingLimit     -- stop once chi^2 decreases by less, BCCCalculatorConstants.StoppingLimit if None
+    maximumIterations -- BCCCalculatorConstants.MaximumIterations if None
+
+    Returns:
+    k x 3 fitted (a, b, c), k chi^2, k booleans False for the fits that did not converge
+    or do not determine their parameters (refer identifiable)
+    '''
+    if stoppingLimit is None:
+        stoppingLimit = BCCCalculatorConstants.StoppingLimit
+    if maximumIterations is None:
+        maximumIterations = BCCCalculatorConstants.MaximumIterations
+
+    x = numpy.array(x, dtype=numpy.float64)
+    y = numpy.array(numpy.broadcast_arrays(y, x)[0], dtype=numpy.float64)
+    k = x.shape[0]
+
+    if initial is not None:
+        parameters = numpy.tile(numpy.array(initial, dtype=numpy.float64), (k, 1))
+    else:
+        parameters = logLinearGuess(x, y)
+        unknown = ~numpy.isfinite(parameters).all(axis=1)
+        parameters[unknown] = BCCCalculatorConstants.FittingParameters
+
+    r, jacobian = residuals(parameters, x, y)
+    chi = (r * r).sum(axis=1)
+    alpha, beta = normalEquations(r, jacobian)
+
+    damping = numpy.ones(k) * 0.001
+    identity = numpy.identity(3)
+    # the parameters of the last accepted step
+    fitted = parameters.copy()
+    fittedChi = chi.copy()
+    converged = numpy.zeros(k, dtype=bool)
+    failed = ~numpy.isfinite(chi)
+
+    for iteration in range(maximumIterations):
+        active = ~converged & ~failed
+        if not active.any():
+            break
+
+        diagonal = alpha * identity * damping[:, None, None]
+        steps, solvable = solve3(alpha + diagonal, beta)
+        failed |= active & ~solvable
+        active &= solvable
+
+        nextParameters = parameters + numpy.where(active[:, None], steps, 0)
+        nextR, nextJacobian = residuals(nextParameters, x, y)
+        nextChi = (nextR * nextR).sum(axis=1)
+
+        accepted = active & (nextChi <= chi)
+        damping[active & ~accepted] *= 10.0
+        damping[accepted] *= 0.1
+
+        fitted[accepted] = nextParameters[accepted]
+        fittedChi[accepted] = nextChi[accepted]
+
+        done = accepted & (chi - nextChi < stoppingLimit)
+        converged |= done
+
+        moving = accepted & ~done
+        parameters[moving] = nextParameters[moving]
+        chi[moving] = nextChi[moving]
+        alpha[moving], beta[moving] = normalEquations(nextR[moving], nextJacobian[moving])
+
+    return fitted, fittedChi, converged & identifiable(fitted, x)
+
+def fitExpmod(xs, y, initial=None, stoppingLimit=None, maximumIterations=None):
+    ''' Fits y = a + b * e ^ (c * x) to each x of xs, refer fitExpmodRows
+
+    Keyword Arguments:
+    xs -- a list of k sequences of n values, eg. the R, G and B gradients
+    y  -- the n values fitted, eg. the bcgradient
+
+    Returns:
+    a list of the k fitted [a, b, c], a list of their chi^2
+    '''
+    fitted, chi, converged = fitExpmodRows(xs, y, initial, stoppingLimit, maximumIterations)
+    if not converged.all():
+        raise ValueError('The fit did not converge or is degenerate')
+
+    return fitted.tolist(), chi.tolist()
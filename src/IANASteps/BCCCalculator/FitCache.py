@@ -0,0 +1,97 @@
+'''
+The FitCache Module keeps the expmod fits of recent gradients, so that cards
+of the same print batch photographed under similar light, whose gray bars give
+(nearly) the same gradient, are not fitted again.
+
+A fit is keyed by the solver, the bcStrips (bcgradient) and the gray bar
+gradient quantized to BCCCalculatorConstants.FitCacheTolerance.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import threading
+
+from IANAUtil.LRUCache import LRUCache
+from IANAUtil.Metrics import getMetrics
+from IANASettings.Settings import BCCCalculatorConstants
+
+metrics = getMetrics()
+
+class FitCache:
+    '''
+    An LRU cache of (fitRed, fitGreen, fitBlue) by gradient
+    '''
+
+    def __init__(self, capacity, tolerance):
+        ''' Constructor
+
+        Keyword Arguments:
+        capacity  -- the number of fits kept, 0 to keep none
+        tolerance -- the gradients are quantized to multiples of tolerance, 0 to match them exactly
+        '''
+        self.cache = LRUCache(max(capacity, 1))
+        self.capacity = capacity
+        self.tolerance = tolerance
+
+    def key(self, bcgradient, gradients):
+        ''' Returns the key of the fits of the gradients (R, G, B) against the bcgradient
+        '''
+        if self.tolerance:
+            quantized = tuple([tuple([int(round(value / self.tolerance)) for value in gradient])
+                               for gradient in gradients])
+        else:
+            quantized = tuple([tuple([float(value) for value in gradient]) for gradient in gradients])
+
+        return (BCCCalculatorConstants.Solver, tuple([float(value) for value in bcgradient]), quantized)
+
+    def get(self, bcgradient, gradients):
+        ''' Returns the cached (fitRed, fitGreen, fitBlue) of the gradients, or None
+        '''
+        if not self.capacity:
+            return None
+
+        fits = self.cache.get(self.key(bcgradient, gradients))
+        if fits is None:
+            metrics.increment('fit_cache_misses')
+        else:
+            metrics.increment('fit_cache_hits')
+        return fits
+
+    def put(self, bcgradient, gradients, fits):
+        ''' Caches the (fitRed, fitGreen, fitBlue) of the gradients
+        '''
+        if not self.capacity:
+            return
+
+        self.cache.put(self.key(bcgradient, gradients), tuple([list(fit) for fit in fits]))
+
+    def stats(self):
+        ''' Returns (hits, misses, size) of the cache
+        '''
+        return self.cache.hits, self.cache.misses, len(self.cache)
+
+##
+# The FitCache shared by every rateFilter of this process
+_fitCache = None
+_lock = threading.Lock()
+
+def getFitCache():
+    ''' Returns the process wide FitCache, created with the BCCCalculatorConstants
+        of the first call and created again (empty) if FitCacheSize or
+        FitCacheTolerance have changed since
+    '''
+    global _fitCache
+
+    capacity = BCCCalculatorConstants.FitCacheSize
+    tolerance = BCCCalculatorConstants.FitCacheTolerance
+
+    _lock.acquire()
+    try:
+        if _fitCache is None or _fitCache.capacity != capacity or _fitCache.tolerance != tolerance:
+            _fitCache = FitCache(capacity, tolerance)
+    finally:
+        _lock.release()
+
+    return _fitCache
@@ -7,6 +7,8 @@ Created on Oct 8, 2010
 import PIL.ImageStat as ImageStat
 
 from IANASteps.Geometry.Circle import Circle
+from IANAUtil.MaskSampler import sampleCircle
+from IANAUtil.RegionStatistics import trimmedMean
 
 class BCFilter(Circle):
     """
@@ -37,12 +39,14 @@ class BCFilter(Circle):
         return 'BCFilter: {0}'.format(Circle.__str__(self))
     
     # TODO: all default values for params to be documented
-    def sample(self, image, radius):
+    def sample(self, image, radius, trim=0.0):
         """ Returns a sampling of the Circle
         
         Keyword arguments:
         image  -- Image instance
         radius -- Radius of the Area in which to sample
+        trim   -- Fraction of the darkest and of the brightest pixels to leave out, 
+                  refer IANAUtil.RegionStatistics.trimmedMean
         
         Returns:
         mean value of pixels in the circle
@@ -52,9 +56,26 @@ class BCFilter(Circle):
         topLeft = self.center - offset
         bottomRight = self.center + offset
 
-        filterSpot = image.crop((int(topLeft[0]), int(topLeft[1]),
-                                        int(bottomRight[0]), int(bottomRight[1])))
+        box = (int(topLeft[0]), int(topLeft[1]), int(bottomRight[0]), int(bottomRight[1]))
+        if trim:
+            return trimmedMean(image, box, trim)
+
+        filterSpot = image.crop(box)
         imageStats = ImageStat.Stat(filterSpot)
 
         return imageStats.mean
 
+    def sampleMask(self, image, radius, innerRadius=0):
+        """ Returns a sampling of the pixels inside the Circle of the given radius,
+            or inside the annulus between innerRadius and radius
+        
+        Keyword arguments:
+        image       -- Image instance
+        radius      -- Radius of the Area in which to sample
+        innerRadius -- Inner radius of the annulus, 0 to sample the whole circle
+        
+        Returns:
+        IANAUtil.MaskSampler.MaskSample of the pixels
+        """
+        return sampleCircle(image, self.center, radius, innerRadius)
+
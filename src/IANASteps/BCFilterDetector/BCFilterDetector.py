@@ -6,17 +6,25 @@ Created on Oct 5, 2010
 @author: surya
 '''
 
+import math
 import opencv
 import logging
+import PIL.Image as Image
 
 from BCFilter import BCFilter
 from Logging.Logger import getLog
-from IANASettings.Settings import BCFilterConstants
+from IANASteps.StageDetector.FilterDock import FilterDock
+from IANASettings.Settings import BCFilterConstants, StageDetectorConstants, FilterLayoutConstants,\
+    HoughPyramidConstants
 from IANASettings.Settings import ExitCode
 
 log = getLog("BCFilterDetector")
 log.setLevel(logging.ERROR)
 
+##
+# The order select prefers the bands in: blue, green, red
+BandPriority = (2, 1, 0)
+
 def splitToBands(image):
     ''' Split the given image into separate bands
     
@@ -38,7 +46,180 @@ def splitToBands(image):
         
     return bands
 
-def detectBCFilter(image, bcFilterConstants, parenttags=None, level=logging.ERROR):
+class ScaledBCFilterConstants:
+    '''
+    The configuration under which to run bcFilter detection in an image
+    reduced by scale: the distances, radii and accumulator threshold (the
+    votes for a circle grow with its circumference) are scaled with it.
+    '''
+    
+    def __init__(self, bcFilterConstants, scale, minimumRadius=None, maximumRadius=None):
+        ''' Constructor
+        
+        Keyword Arguments:
+        bcFilterConstants -- The configuration for the unscaled image, BCFilterConstants if None
+        scale             -- The scale of the image
+        minimumRadius     -- Overrides the minimum radius (in the scaled image)
+        maximumRadius     -- Overrides the maximum radius (in the scaled image)
+        '''
+        if bcFilterConstants is None:
+            bcFilterConstants = BCFilterConstants
+        
+        self.dp = bcFilterConstants.dp
+        self.highThreshold = bcFilterConstants.highThreshold
+        self.accumulatorThreshold = max(int(bcFilterConstants.accumulatorThreshold * scale), 1)
+        self.minimumDistance = bcFilterConstants.minimumDistance * scale
+        self.minimumRadius = int(bcFilterConstants.minimumRadius * scale)
+        self.maximumRadius = int(math.ceil(bcFilterConstants.maximumRadius * scale))
+        
+        if minimumRadius is not None:
+            self.minimumRadius = minimumRadius
+        if maximumRadius is not None:
+            self.maximumRadius = maximumRadius
+
+class HoughWindow:
+    '''
+    The part of an image a bcFilter is expected in, and the radii it is expected to have
+    '''
+    
+    def __init__(self, box, minimumRadius, maximumRadius):
+        ''' Constructor
+        
+        Keyword Arguments:
+        box           -- (left, top, right, bottom) of the window in the image
+        minimumRadius -- The smallest expected radius
+        maximumRadius -- The largest expected radius
+        '''
+        self.box = box
+        self.minimumRadius = minimumRadius
+        self.maximumRadius = maximumRadius
+
+def regionUnits(region, size):
+    ''' Returns where the region a skew corrected image was corrected with lies
+        in QR units (refer StageDetectorConstants), and the pixels per QR unit
+    
+    Keyword Arguments:
+    region -- The StageDetector.Stage or FilterDock the image was corrected with
+    size   -- (width, height) of the corrected image
+    
+    Returns:
+    left, top of the region in QR units from the top left of the QR code, pixels per
+    QR unit along the width and along the height of the image
+    '''
+    
+    width, height = size
+    
+    left, right = StageDetectorConstants.sleft, StageDetectorConstants.sright
+    bottom = 1 + StageDetectorConstants.sbottom
+    if isinstance(region, FilterDock):
+        top = 1 + StageDetectorConstants.cbottom
+    else:
+        top = StageDetectorConstants.stop
+    
+    return left, top, width / float(right - left), height / float(bottom - top)
+
+def predictWindow(region, size):
+    ''' Predicts where the bcFilter is in a skew corrected image from the card
+        layout: the region the image was corrected with spans a known box in
+        QR units (refer StageDetectorConstants), and FilterLayoutConstants gives
+        the filter's position and radius in the same QR units.
+    
+    Keyword Arguments:
+    region -- The StageDetector.Stage or FilterDock the image was corrected with
+    size   -- (width, height) of the corrected image
+    
+    Returns:
+    HoughWindow, None if the window falls outside the image
+    '''
+    
+    width, height = size
+    left, top, unitX, unitY = regionUnits(region, size)
+    
+    centerX = (FilterLayoutConstants.CenterU - left) * unitX
+    centerY = (FilterLayoutConstants.CenterV - top) * unitY
+    radius = FilterLayoutConstants.Radius * (unitX + unitY) / 2.0
+    
+    halfSide = FilterLayoutConstants.CenterTolerance + FilterLayoutConstants.Radius * (1 + FilterLayoutConstants.RadiusTolerance)
+    box = (max(int(centerX - halfSide * unitX), 0),
+           max(int(centerY - halfSide * unitY), 0),
+           min(int(math.ceil(centerX + halfSide * unitX)), width),
+           min(int(math.ceil(centerY + halfSide * unitY)), height))
+    
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    
+    return HoughWindow(box,
+                       int(radius * (1 - FilterLayoutConstants.RadiusTolerance)),
+                       int(math.ceil(radius * (1 + FilterLayoutConstants.RadiusTolerance))))
+
+def measureLayout(region, size, center, radius):
+    ''' The inverse of predictWindow: returns where a bcFilter detected in a skew
+        corrected image lies in the QR units of FilterLayoutConstants, refer
+        IANAMain/MeasureFilterLayout.py
+    
+    Keyword Arguments:
+    region -- The StageDetector.Stage or FilterDock the image was corrected with
+    size   -- (width, height) of the corrected image
+    center -- The center of the bcFilter in the corrected image
+    radius -- The radius of the bcFilter in the corrected image
+    
+    Returns:
+    CenterU, CenterV, Radius of the bcFilter
+    '''
+    
+    left, top, unitX, unitY = regionUnits(region, size)
+    
+    return (left + center[0] / unitX,
+            top + center[1] / unitY,
+            radius * 2.0 / (unitX + unitY))
+
+def splitBand(image, index):
+    ''' Returns a single band of the given image, without splitting the others
+    
+    Keyword Arguments:
+    image -- a PIL.Image object
+    index -- the index of the band, 0, 1, 2 for R, G, B
+    
+    Returns:
+    the band as a grayscale PIL.Image, the image itself if it is GrayScale
+    '''
+    
+    if image.mode == 'L':
+        return image
+    
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    matrix = [0, 0, 0, 0]
+    matrix[index] = 1
+    
+    return image.convert('L', tuple(matrix))
+
+def detectInWindow(image, bcFilterConstants, window, parenttags=None):
+    ''' Runs the hough circle detection only inside the window, for the radii of the window
+    
+    Keyword Arguments:
+    image -- Image instance
+    bcFilterConstants -- The configuration under which to run bcFilter detection
+    window -- a HoughWindow
+    parenttags -- tag string of the calling function
+    
+    Returns:
+    a list of (x, y, radius) circles in the coordinates of the image
+    '''
+    
+    left, top, right, bottom = window.box
+    crop = image.crop(window.box)
+    crop.load()
+    
+    constants = ScaledBCFilterConstants(bcFilterConstants, 1.0, window.minimumRadius, window.maximumRadius)
+    circles = houghTransform(crop, constants, parenttags)
+    
+    width, height = crop.size
+    return [(x + left, y + top, radius) for x, y, radius in circles
+                if 0 <= x <= width and 0 <= y <= height]
+
+def detectBCFilter(image, bcFilterConstants, parenttags=None, level=logging.ERROR, scale=1.0, window=None):
     ''' Detects circles in an image
     
     Keyword Arguments:
@@ -46,6 +227,10 @@ def detectBCFilter(image, bcFilterConstants, parenttags=None, level=logging.ERRO
     bcFilterConstants -- The configuration under which to run bcFilter detection
     parenttags -- tag string of the calling function
     level -- The logging level
+    scale -- The scale the image was reduced by, the bcFilters are returned in
+             the coordinates of the unreduced image
+    window -- a HoughWindow (in the coordinates of the image) the bcFilter is
+              expected in, the whole image is searched if none is found there
     
     Returns:
     list of CirclesFilter_.BCFilter objects
@@ -57,15 +242,30 @@ def detectBCFilter(image, bcFilterConstants, parenttags=None, level=logging.ERRO
         
     try:
         log.info('Running BCFilter Detection', extra=tags)
-        circles = houghTransform(image, bcFilterConstants, tags)
+        if scale != 1.0:
+            bcFilterConstants = ScaledBCFilterConstants(bcFilterConstants, scale)
+        
+        circles = []
+        if window is not None:
+            circles = detectInWindow(image, bcFilterConstants, window, tags)
+            if not circles:
+                log.info('No bcFilter in the predicted window, searching the whole image', extra=tags)
+        
+        if not circles:
+            if HoughPyramidConstants.Enabled:
+                circles = pyramidHoughTransform(image, bcFilterConstants, tags)
+            else:
+                circles = houghTransform(image, bcFilterConstants, tags)
 
-        width, height = image.size
+            width, height = image.size
 
-        # if more than about half the filter spot would
-        # be cut off reject the match
-        bcFilters = [BCFilter(*cir) for cir in circles
+            # if more than about half the filter spot would
+            # be cut off reject the match
+            circles = [cir for cir in circles
                             if 0 <= cir[0] <= width and 0 <= cir[1] <= height]
 
+        bcFilters = [BCFilter(cir[0] / scale, cir[1] / scale, cir[2] / scale) for cir in circles]
+
         log.info('Done Running BCFilter Detection', extra=tags)
         return bcFilters, ExitCode.Success
     
@@ -136,6 +336,59 @@ def houghTransform(image, bcFilterConstants, parenttags=None):
 
     return circles
 
+def pyramidHoughTransform(image, bcFilterConstants, parenttags=None):
+    ''' Runs the hough circle detection against a copy of the image reduced by
+        HoughPyramidConstants.Scale, then confirms and refines every candidate
+        circle in a small window of the image around it, for radii close to the
+        candidate's. The cost of the transform grows with the pixels searched, 
+        so this is much cheaper than searching the whole image.
+    
+    Keyword Arguments:
+    image -- Image instance
+    bcFilterConstants -- The configuration under which to run bcFilter detection
+    parenttags -- tag string of the calling function
+    
+    Returns:
+    a list of (x, y, radius) circles in the coordinates of the image, the 
+    candidates that could not be confirmed are dropped
+    '''
+    
+    if bcFilterConstants is None:
+        bcFilterConstants = BCFilterConstants
+    
+    scale = HoughPyramidConstants.Scale
+    width, height = image.size
+    reduced = image.resize((max(int(width * scale), 1), max(int(height * scale), 1)), Image.ANTIALIAS)
+    
+    candidates = houghTransform(reduced, ScaledBCFilterConstants(bcFilterConstants, scale), parenttags)
+    log.debug('Found candidate circles: %s', candidates, extra=parenttags)
+    
+    circles = []
+    for x, y, radius in candidates:
+        x, y, radius = x / scale, y / scale, radius / scale
+        
+        maximumRadius = radius * (1 + HoughPyramidConstants.RadiusTolerance)
+        side = maximumRadius + radius * HoughPyramidConstants.Margin
+        box = (max(int(x - side), 0),
+               max(int(y - side), 0),
+               min(int(math.ceil(x + side)), width),
+               min(int(math.ceil(y + side)), height))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            continue
+        
+        window = HoughWindow(box,
+                             int(radius * (1 - HoughPyramidConstants.RadiusTolerance)),
+                             int(math.ceil(maximumRadius)))
+        refined = detectInWindow(image, bcFilterConstants, window, parenttags)
+        if not refined:
+            continue
+        
+        # the refined circle closest to the candidate
+        best = min(refined, key=lambda circle: (circle[0] - x) ** 2 + (circle[1] - y) ** 2)
+        if best not in circles:
+            circles.append(best)
+    
+    return circles
 
 def select(bands):
     """ Select the best circles based on the color bands
@@ -147,15 +400,12 @@ def select(bands):
     the selected CirclesFilter_.Circle object
     """
 
-    # Check the circles detected in the red band. 
-    if len(bands[2]) > 0:
-        return bands[2]
-    elif len(bands[1]) > 0:
-        return bands[1]
-    elif len(bands[0]) > 0:
-        return bands[0]
-    else: 
-        return None
+    # Check the circles detected in the blue band first. 
+    for index in BandPriority:
+        if len(bands[index]) > 0:
+            return bands[index]
+    
+    return None
 
 ##
 # Initializes Psyco
@@ -0,0 +1,155 @@
+'''
+The HoughPool Module runs the bcFilter detection of the bands of an image
+concurrently. opencv.cvHoughCircles releases the GIL, so the bands are
+transformed in parallel on multi-core workers.
+
+The stages the workers time are recorded in the IANAUtil.Profile of the
+thread calling map or submit.
+
+NOTE: PsycoInit must have been called before the first map, psyco must never
+      compile houghTransform, including in the worker threads.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import Queue
+import logging
+import threading
+import traceback
+
+from Logging.Logger import getLog
+from IANAUtil.Profile import getProfile, setProfile
+from IANASettings.Settings import ExitCode, BCFilterDetectorConstants
+
+log = getLog("HoughPool")
+log.setLevel(logging.ERROR)
+
+class HoughTasks:
+    '''
+    The calls handed to HoughPool.submit, whose results are waited for one by one
+    '''
+
+    def __init__(self, count):
+        ''' Constructor
+
+        Keyword Arguments:
+        count -- The number of calls
+        '''
+        self.results = [None] * count
+        self.finished = [threading.Event() for i in range(count)]
+        self.cancelled = False
+
+    def result(self, index):
+        ''' Waits for the call index
+
+        Returns:
+        the (result, exitcode) of the call, (None, ExitCode.FilterDetectionError)
+        if it was cancelled before it started
+        '''
+        self.finished[index].wait()
+        return self.results[index]
+
+    def cancel(self):
+        ''' Skips the calls that did not start yet, the running ones finish
+            unobserved
+        '''
+        self.cancelled = True
+
+class HoughPool:
+    '''
+    A fixed set of daemon worker threads running the functions handed to map
+    and submit
+    '''
+
+    def __init__(self, size):
+        ''' Constructor
+
+        Keyword Arguments:
+        size -- The number of worker threads
+        '''
+        self.tasks = Queue.Queue()
+        self.threads = []
+
+        for i in range(size):
+            thread = threading.Thread(target=self.work, name='HoughPool-' + str(i))
+            thread.setDaemon(True)
+            thread.start()
+            self.threads.append(thread)
+
+    def work(self):
+        ''' Runs the tasks of the queue, forever
+        '''
+        while True:
+            function, arguments, index, tasks, profile = self.tasks.get()
+            if tasks.cancelled:
+                tasks.results[index] = (None, ExitCode.FilterDetectionError)
+                tasks.finished[index].set()
+                continue
+
+            setProfile(profile)
+            try:
+                tasks.results[index] = function(*arguments)
+            except Exception, err:
+                log.error('Error %s' % traceback.format_exc())
+                tasks.results[index] = (None, ExitCode.FilterDetectionError)
+            setProfile(None)
+            tasks.finished[index].set()
+
+    def submit(self, function, argumentsList):
+        ''' Queues a call of function with each of the arguments in argumentsList
+            on the worker threads, without waiting for them.
+
+        Keyword Arguments:
+        function      -- a function returning (result, exitcode)
+        argumentsList -- list of argument tuples
+
+        Returns:
+        the HoughTasks of the calls, in the order of argumentsList
+        '''
+        tasks = HoughTasks(len(argumentsList))
+        profile = getProfile()
+
+        for index, arguments in enumerate(argumentsList):
+            self.tasks.put((function, arguments, index, tasks, profile))
+
+        return tasks
+
+    def map(self, function, argumentsList):
+        ''' Calls function with each of the arguments in argumentsList on the
+            worker threads and waits for all of them.
+
+        Keyword Arguments:
+        function      -- a function returning (result, exitcode)
+        argumentsList -- list of argument tuples
+
+        Returns:
+        the (result, exitcode) of every call, in the order of argumentsList
+        '''
+        tasks = self.submit(function, argumentsList)
+
+        return [tasks.result(index) for index in range(len(argumentsList))]
+
+##
+# The HoughPool shared by every image analyzed by this process
+_pool = None
+_lock = threading.Lock()
+
+def getHoughPool():
+    ''' Returns the process wide HoughPool, or None when the bands are to be
+        detected serially (BCFilterDetectorConstants.Threads <= 1)
+    '''
+    global _pool
+
+    if BCFilterDetectorConstants.Threads <= 1:
+        return None
+
+    _lock.acquire()
+    try:
+        if _pool is None:
+            _pool = HoughPool(BCFilterDetectorConstants.Threads)
+    finally:
+        _lock.release()
+
+    return _pool
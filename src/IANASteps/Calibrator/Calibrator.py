@@ -17,6 +17,7 @@ import logging
 from GrayBar import GrayBar
 from ColorBar import ColorBar
 from Logging.Logger import getLog
+from IANASteps.Geometry.PointArray import PointArray
 from IANASettings.Settings import ExitCode, CalibratorConstants
 
 log = getLog("Calibrator")
@@ -81,30 +82,24 @@ def getGrayBars(qr, image, parenttags=None, level=logging.ERROR):
     
     log.info('Running GrayBar Detection', extra=tags)
     
-    leftT = qr.topLeft - qr.topRight
-    leftB = qr.bottomLeft - qr.bottomRight
-        
-    grayBars = []
-    # For each coloumn of the GrayBars (there are two GrayBar columns to the left of the QR Code)
+    # The centers of the GrayBars, in QR widths to the left of the QR code and
+    # QR heights down from its top, for each coloumn of the GrayBars (there are 
+    # two GrayBar columns to the left of the QR Code) and each GrayBar in the column
+    coordinates = []
     for grayBarColumnOffset in CalibratorConstants.GrayBarColumnOffsets[:2]:
-            top = grayBarColumnOffset * leftT + qr.topLeft
-            bottom = grayBarColumnOffset * leftB + qr.bottomLeft
-            down = (bottom - top) * CalibratorConstants.LastGrayBarOffset
-            bottom = top + down
-
-            blockOffset = (bottom - top) / 5
-            block = top
-
-            # For each GrayBar in the given GrayBarColumn
-            for i in range(6):
-                
-                try:
-                    grayBars.append(GrayBar(block))
-                except Exception, err:
-                    log.error('Error %s' % str(err), extra=tags)
-                    return None, ExitCode.GrayBarDetectionError
-
-                block += blockOffset
+        for i in range(6):
+            coordinates.append((-grayBarColumnOffset, CalibratorConstants.LastGrayBarOffset * i / 5.0))
+    
+    qrCorners = PointArray([qr.topLeft, qr.topRight, qr.bottomLeft, qr.bottomRight])
+    
+    grayBars = []
+    for block in qrCorners.bilinear(coordinates):
+        try:
+            grayBars.append(GrayBar(block))
+        except Exception, err:
+            log.error('Error %s' % str(err), extra=tags)
+            return None, ExitCode.GrayBarDetectionError
+        
     log.info('grayBars: ', extra=tags)
     for grayBar in grayBars:
         log.info(grayBar.__str__(), extra=tags)
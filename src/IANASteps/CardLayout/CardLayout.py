@@ -0,0 +1,167 @@
+'''
+The CardLayout Module compiles the layout of the parts of the card the analysis
+locates in the image (refer StageDetectorConstants and CalibratorConstants) once
+into a matrix of template coordinates in QR units, and maps all of them into an
+image at once with the homography taking the QR code's unit square onto its
+corners in the image.
+
+Template coordinates are (u, v) from the top left of the QR code, u along its
+top in QR widths and v along its left side in QR heights: the QR code spans
+(0, 0) to (1, 1).
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+import logging
+
+from Logging.Logger import getLog
+from IANASteps.Geometry.PointArray import PointArray
+from IANASettings.Settings import ExitCode, StageDetectorConstants, CalibratorConstants
+
+log = getLog("CardLayout")
+log.setLevel(logging.ERROR)
+
+def normalization(points):
+    ''' Returns the similarity moving the centroid of the points to the origin
+        and their mean distance to it to sqrt(2), refer computeHomography
+    '''
+    centroid = points.mean(axis=0)
+    distance = numpy.sqrt(((points - centroid) ** 2).sum(axis=1)).mean()
+    scale = numpy.sqrt(2) / max(distance, 1e-12)
+
+    return numpy.array([[scale, 0, -scale * centroid[0]],
+                        [0, scale, -scale * centroid[1]],
+                        [0, 0, 1]])
+
+def computeHomography(source, destination):
+    ''' Computes the homography mapping the source points onto the destination
+        points with the normalized direct linear transform
+
+    Keyword Arguments:
+    source      -- n x 2 array of points, n >= 4
+    destination -- n x 2 array of points
+
+    Returns:
+    3 x 3 numpy array
+    '''
+    source = numpy.asarray(source, dtype=numpy.float64)
+    destination = numpy.asarray(destination, dtype=numpy.float64)
+
+    sourceNormalization = normalization(source)
+    destinationNormalization = normalization(destination)
+
+    ones = numpy.ones((source.shape[0], 1))
+    x = numpy.hstack((source, ones)).dot(sourceNormalization.T)
+    y = numpy.hstack((destination, ones)).dot(destinationNormalization.T)
+
+    zeros = numpy.zeros((source.shape[0], 3))
+    rows = numpy.vstack((numpy.hstack((x, zeros, -x * y[:, 0:1])),
+                         numpy.hstack((zeros, x, -x * y[:, 1:2]))))
+
+    # the right singular vector of the smallest singular value
+    homography = numpy.linalg.svd(rows)[2][-1].reshape(3, 3)
+    homography = numpy.linalg.inv(destinationNormalization).dot(homography).dot(sourceNormalization)
+
+    return homography / homography[2, 2]
+
+class CardLayout:
+    '''
+    The template coordinates of the parts of the card, compiled into one matrix
+    '''
+
+    def __init__(self):
+        ''' Constructor
+
+        Compiles the layout from IANASettings.Settings
+        '''
+        self.names = {}
+        coordinates = []
+
+        def add(name, points):
+            self.names[name] = (len(coordinates), len(coordinates) + len(points))
+            coordinates.extend(points)
+
+        def box(left, right, top, bottom):
+            # (topLeft, bottomLeft, bottomRight, topRight), as a Quadrilateral
+            return [(left, top), (left, bottom), (right, bottom), (right, top)]
+
+        add('stage', box(StageDetectorConstants.sleft, StageDetectorConstants.sright,
+                         StageDetectorConstants.stop, 1 + StageDetectorConstants.sbottom))
+        add('calibrator', box(StageDetectorConstants.cleft, StageDetectorConstants.cright,
+                              StageDetectorConstants.ctop, 1 + StageDetectorConstants.cbottom))
+        add('filterDock', box(StageDetectorConstants.sleft, StageDetectorConstants.sright,
+                              1 + StageDetectorConstants.cbottom, 1 + StageDetectorConstants.sbottom))
+
+        # the two GrayBar columns to the left of the QR code, top to bottom
+        grayBars = []
+        for grayBarColumnOffset in CalibratorConstants.GrayBarColumnOffsets[:2]:
+            for i in range(6):
+                grayBars.append((-grayBarColumnOffset, CalibratorConstants.LastGrayBarOffset * i / 5.0))
+        add('grayBars', grayBars)
+
+        self.template = numpy.array(coordinates, dtype=numpy.float64)
+
+    def map(self, qr, parenttags=None, level=logging.ERROR):
+        ''' Maps the layout into the image of the qr code
+
+        Keyword Arguments:
+        qr         -- QRDetector.QR object
+        parenttags -- tag string of the calling function
+        level      -- the logging level
+
+        Returns:
+        MappedLayout, exitcode
+        '''
+        log.setLevel(level)
+        tags = parenttags + " CARDLAYOUT"
+
+        try:
+            corners = [qr.topLeft, qr.topRight, qr.bottomLeft, qr.bottomRight]
+            homography = computeHomography([(0, 0), (1, 0), (0, 1), (1, 1)], [tuple(corner) for corner in corners])
+            points = PointArray(self.template).project(homography)
+        except Exception, err:
+            log.error('Error %s' % str(err), extra=tags)
+            return None, ExitCode.StageDetectionError
+
+        log.debug('Homography: %s', homography.tolist(), extra=tags)
+        return MappedLayout(self, homography, points), ExitCode.Success
+
+class MappedLayout:
+    '''
+    The CardLayout mapped into an image
+    '''
+
+    def __init__(self, layout, homography, points):
+        ''' Constructor
+
+        Keyword Arguments:
+        layout     -- the CardLayout
+        homography -- the 3 x 3 homography from QR units to the image
+        points     -- PointArray of the template coordinates in the image
+        '''
+        self.layout = layout
+        self.homography = homography
+        self.points = points
+
+    def __getitem__(self, name):
+        ''' Returns the PointArray of the part name of the card: stage, calibrator,
+            filterDock (topLeft, bottomLeft, bottomRight, topRight) or grayBars
+        '''
+        start, end = self.layout.names[name]
+        return self.points[start:end]
+
+##
+# The CardLayout compiled from the Settings
+_layout = None
+
+def getCardLayout():
+    ''' Returns the CardLayout, compiling it on first use
+    '''
+    global _layout
+    if _layout is None:
+        _layout = CardLayout()
+
+    return _layout
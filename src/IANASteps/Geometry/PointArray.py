@@ -0,0 +1,152 @@
+'''
+The PointArray Module holds a batch of points in one NumPy array, so that the
+corner arithmetic of the detectors (the QR code, the stage, the gray bars) is
+done for every point at once rather than one Point at a time.
+
+Indexing a PointArray with an int returns a Geometry.Point, iterating over it
+returns Points: code expecting Points is unaffected.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+
+from IANASteps.Geometry.Point import Point
+
+class PointArray:
+    '''
+    An n x d array of points
+    '''
+
+    def __init__(self, points):
+        ''' Constructor
+
+        Keyword Arguments:
+        points -- a list of Points (or tuples), or an n x d numpy array
+        '''
+        if isinstance(points, numpy.ndarray):
+            self.array = numpy.asarray(points, dtype=numpy.float64)
+        else:
+            self.array = numpy.array([tuple(point) for point in points], dtype=numpy.float64)
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __getitem__(self, index):
+        ''' Returns the Point at an int index, or a PointArray of the points
+            at a slice or a list of indices
+        '''
+        if isinstance(index, (int, long)):
+            return Point(*self.array[index].tolist())
+
+        return PointArray(self.array[index])
+
+    def __iter__(self):
+        for row in self.array.tolist():
+            yield Point(*row)
+
+    def __str__(self):
+        return 'PointArray: {0}'.format(self.array.tolist())
+
+    def operand(self, other):
+        ''' Returns other as an array broadcasting against the points: a
+            PointArray or an n x d array point by point, a Point (or tuple) the
+            same for every point, a list or 1d array of n values one per point
+        '''
+        if isinstance(other, PointArray):
+            return other.array
+
+        if isinstance(other, tuple):
+            return numpy.asarray(other, dtype=numpy.float64)
+
+        other = numpy.asarray(other, dtype=numpy.float64)
+        if other.ndim == 1:
+            return other[:, None]
+        return other
+
+    def __add__(self, other):
+        return PointArray(self.array + self.operand(other))
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        return PointArray(self.array - self.operand(other))
+
+    def __rsub__(self, other):
+        return PointArray(self.operand(other) - self.array)
+
+    def __mul__(self, other):
+        return PointArray(self.array * self.operand(other))
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __div__(self, other):
+        return PointArray(self.array / self.operand(other))
+
+    __truediv__ = __div__
+
+    def __neg__(self):
+        return PointArray(-self.array)
+
+    def distance(self, origin=None):
+        ''' Returns the distance of every point to the origin (a Point or PointArray)
+
+        Returns:
+        1d numpy array
+        '''
+        end = self.array
+        if origin is not None:
+            end = end - self.operand(origin)
+
+        return numpy.sqrt((end * end).sum(axis=1))
+
+    def dot(self, other):
+        ''' Returns the dot products of the points with other (a Point or PointArray), point by point
+
+        Returns:
+        1d numpy array
+        '''
+        return (self.array * self.operand(other)).sum(axis=1)
+
+    def affine(self, matrix, offset=None):
+        ''' Returns the points mapped by matrix * point + offset
+
+        Keyword Arguments:
+        matrix -- d x d matrix
+        offset -- d vector, None for a linear map
+        '''
+        array = self.array.dot(numpy.asarray(matrix, dtype=numpy.float64).T)
+        if offset is not None:
+            array += numpy.asarray(offset, dtype=numpy.float64)
+
+        return PointArray(array)
+
+    def project(self, homography):
+        ''' Returns the points (2d) mapped by the 3 x 3 homography
+        '''
+        homography = numpy.asarray(homography, dtype=numpy.float64)
+        array = self.array.dot(homography[:, :2].T) + homography[:, 2]
+
+        return PointArray(array[:, :2] / array[:, 2:3])
+
+    def bilinear(self, coordinates):
+        ''' Interpolates the quadrilateral of these 4 points (topLeft, topRight,
+            bottomLeft, bottomRight): (u, v) = (0, 0) at topLeft, (1, 0) at topRight,
+            (0, 1) at bottomLeft and (1, 1) at bottomRight; coordinates out of
+            [0, 1] extrapolate.
+
+        Keyword Arguments:
+        coordinates -- a list of (u, v)
+
+        Returns:
+        PointArray of the interpolated points
+        '''
+        coordinates = numpy.asarray(coordinates, dtype=numpy.float64).reshape(-1, 2)
+        u, v = coordinates[:, 0], coordinates[:, 1]
+
+        weights = numpy.column_stack(((1 - u) * (1 - v), u * (1 - v), (1 - u) * v, u * v))
+        return PointArray(weights.dot(self.array))
@@ -13,13 +13,15 @@ from IANASettings.Settings import ExitCode
 log = getLog("ImageTransformer")
 log.setLevel(logging.ERROR)
 
-def transform(image, stage, parenttags=None, level=logging.ERROR):
-    ''' Performs the skew correction in the image.
+def transform(image, stage, parenttags=None, level=logging.ERROR, scale=1.0):
+    ''' Performs the skew correction in the image. The image itself is not modified.
         
     Keyword Arguments:
     image -- PIL.Image instance
-    stage -- Absolute coordinates of the stage
+    stage -- Absolute coordinates of the stage, or of any other region of the
+             image (eg. StageDetector.FilterDock) to correct
     parentttags -- tag string of the calling function
+    scale -- Scale of the corrected image, less than 1 to reduce it
     
     Returns:
     PIL.Image, The cropped image containing the stage.    
@@ -33,6 +35,9 @@ def transform(image, stage, parenttags=None, level=logging.ERROR):
                 + (stage.topLeft - stage.bottomLeft).distance()) / 2
     width = ((stage.topRight - stage.topLeft).distance()
                 + (stage.bottomRight - stage.bottomLeft).distance()) / 2
+    
+    height *= scale
+    width *= scale
 
     log.info('Running Image Transformation - Skew Correction', extra=tags)
 
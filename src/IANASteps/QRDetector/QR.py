@@ -6,6 +6,7 @@ Created on Oct 8, 2010
 
 import math
 
+from IANASteps.Geometry.PointArray import PointArray
 from IANASteps.Geometry.Quadrilateral import Quadrilateral
 
 
@@ -35,13 +36,14 @@ class QR(Quadrilateral):
         # The raw QR points
         self.points = points
         
-        v23 = points[2] - points[1]
-        v21 = points[0] - points[1]
+        corners = PointArray(points)
         
-        self.width = v23.distance()
-        self.height = v21.distance()
+        # v23 and v21
+        sides = corners[[2, 0]] - corners[[1, 1]]
+        self.width, self.height = sides.distance().tolist()
+        v23 = sides[0]
         
-        rotation = math.degrees(math.atan2(*reversed(v23 / self.width)))
+        rotation = math.degrees(math.atan2(v23[1], v23[0]))
 
         # bound rotation to 0 to 360
         if rotation < 0 or rotation > 360:
@@ -54,8 +56,21 @@ class QR(Quadrilateral):
         # adjusted for the alignment point (which is offset
         # from the other points)
         #!! this will change if you change the QR code (at least it just did)
-        Quadrilateral.__init__(self, points[1], (points[0] - v21 / 7.4), points[3], (points[2] - v23 / 7.0))    
+        adjusted = corners[[1, 0, 3, 2]] - sides[[1, 1, 0, 0]] * [0, 1 / 7.4, 0, 1 / 7.0]
+        Quadrilateral.__init__(self, *adjusted)    
             
+    def scaled(self, factor):
+        """ Returns this QR code in the image resized by factor
+        
+        Keyword arguments:
+        factor -- the scale of the resized image
+        
+        Returns:
+        QR
+        """
+        
+        return QR(self.aux, [point * factor for point in self.points])
+    
     def __str__(self):
         """ Human readable representation
         
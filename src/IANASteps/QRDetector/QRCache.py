@@ -0,0 +1,244 @@
+'''
+The QRCache Module remembers QR detection results on disk, keyed by a hash of
+the encoded image, of FindQRCode.jar and of the detection mode, so that a
+re-analysis of an identical image does not have to run FindQRCode.jar again.
+The approximate points of the locator and coarse-to-fine modes are never served
+to the full resolution detection.
+
+Every result is stored as a small json file; once the files take more than
+QRDetectorConstants.CacheMaxBytes the least recently used ones are evicted.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import os
+import json
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+import threading
+
+from Logging.Logger import getLog
+from IANASteps.Geometry.Point import Point
+from IANASettings.Settings import QRDetectorConstants
+
+log = getLog("QRCache")
+log.setLevel(logging.ERROR)
+
+##
+# Prefix of the files entries are written to before they are renamed to their key
+TemporaryPrefix = '.tmp'
+
+##
+# Seconds after which a temporary file is considered left behind by a crashed writer
+TemporaryAge = 3600
+
+def isKey(name):
+    ''' Returns True if name is the file name of a cached entry (a sha1 hex digest)
+    '''
+    if len(name) != 40:
+        return False
+    try:
+        int(name, 16)
+    except ValueError:
+        return False
+    return True
+
+class QRCache:
+    '''
+    A bounded, on-disk, least recently used store of QR detection results.
+    '''
+
+    def __init__(self, directory, maxBytes, version):
+        ''' Constructor
+
+        Keyword Arguments:
+        directory -- The directory holding the cached results
+        maxBytes  -- The size the cached results may take on disk
+        version   -- Identifies the detector, part of every key
+        '''
+
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.version = version
+        self.lock = threading.Lock()
+
+        # key -> [last use, size], loaded lazily from the directory
+        self.index = None
+        self.size = 0
+
+    def key(self, data, mode):
+        ''' Returns the key of the encoded image in data, detected in mode
+        '''
+        return hashlib.sha1(self.version + mode + '\0' + data).hexdigest()
+
+    def path(self, key):
+        ''' Returns the file holding the result for key
+        '''
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self):
+        ''' Builds the index from the files already in the directory, the
+            temporary files left behind by crashed writers are removed
+        '''
+        self.index = {}
+        self.size = 0
+
+        if not os.path.isdir(self.directory):
+            return
+
+        for subdirectory in os.listdir(self.directory):
+            subdirectory = os.path.join(self.directory, subdirectory)
+            if not os.path.isdir(subdirectory):
+                continue
+            for key in os.listdir(subdirectory):
+                try:
+                    stat = os.stat(os.path.join(subdirectory, key))
+                    if key.startswith(TemporaryPrefix):
+                        if time.time() - stat.st_mtime > TemporaryAge:
+                            os.remove(os.path.join(subdirectory, key))
+                        continue
+                except OSError:
+                    continue
+                if not isKey(key):
+                    continue
+                self.index[key] = [stat.st_mtime, stat.st_size]
+                self.size += stat.st_size
+
+    def get(self, data, mode):
+        ''' Looks up the result for the encoded image in data, detected in mode
+
+        Returns:
+        (aux, points, exitcode) or None
+        '''
+
+        key = self.key(data, mode)
+        path = self.path(key)
+
+        self.lock.acquire()
+        try:
+            if self.index is None:
+                self.load()
+
+            if key not in self.index:
+                return None
+
+            try:
+                cached = open(path, 'rb')
+                try:
+                    entry = json.load(cached)
+                finally:
+                    cached.close()
+
+                # mark as recently used
+                os.utime(path, None)
+                self.index[key][0] = os.stat(path).st_mtime
+            except (IOError, OSError, ValueError), err:
+                log.error('Dropping unreadable QRCache entry %s: %s', key, str(err))
+                self.remove(key)
+                return None
+        finally:
+            self.lock.release()
+
+        return str(entry['aux']), [Point(point) for point in entry['points']], entry['exitcode']
+
+    def put(self, data, mode, aux, points, exitcode):
+        ''' Stores the result for the encoded image in data, detected in mode
+        '''
+
+        key = self.key(data, mode)
+        path = self.path(key)
+        entry = json.dumps({'aux': aux,
+                            'points': [list(point) for point in points],
+                            'exitcode': exitcode})
+
+        self.lock.acquire()
+        try:
+            if self.index is None:
+                self.load()
+
+            try:
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError, err:
+                    if err.errno != errno.EEXIST:
+                        raise
+
+                # write and rename so other processes never see partial entries
+                fd, temporary = tempfile.mkstemp(prefix=TemporaryPrefix, dir=os.path.dirname(path))
+                try:
+                    try:
+                        os.write(fd, entry)
+                    finally:
+                        os.close(fd)
+                    os.rename(temporary, path)
+                except (IOError, OSError):
+                    try:
+                        os.remove(temporary)
+                    except OSError:
+                        pass
+                    raise
+            except (IOError, OSError), err:
+                log.error('Could not store QRCache entry %s: %s', key, str(err))
+                return
+
+            if key in self.index:
+                self.size -= self.index[key][1]
+            self.index[key] = [os.stat(path).st_mtime, len(entry)]
+            self.size += len(entry)
+
+            self.evict()
+        finally:
+            self.lock.release()
+
+    def remove(self, key):
+        ''' Removes the entry for key
+        '''
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+        if key in self.index:
+            self.size -= self.index.pop(key)[1]
+
+    def evict(self):
+        ''' Removes the least recently used entries until the cache fits in maxBytes
+        '''
+        if self.size <= self.maxBytes:
+            return
+
+        for lastUse, key in sorted([(entry[0], key) for key, entry in self.index.items()]):
+            if self.size <= self.maxBytes:
+                break
+            self.remove(key)
+
+##
+# The QRCache shared by every detectQR call of this process
+_cache = None
+
+def getQRCache():
+    ''' Returns the process wide QRCache, or None when it is disabled
+        through QRDetectorConstants.UseCache.
+    '''
+    global _cache
+
+    if not QRDetectorConstants.UseCache:
+        return None
+
+    if _cache is None:
+        jar = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'FindQRCode.jar'), 'rb')
+        try:
+            version = hashlib.sha1(jar.read()).hexdigest()
+        finally:
+            jar.close()
+
+        _cache = QRCache(QRDetectorConstants.CacheDirectory,
+                         QRDetectorConstants.CacheMaxBytes,
+                         version)
+
+    return _cache
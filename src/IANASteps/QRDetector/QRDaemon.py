@@ -0,0 +1,233 @@
+'''
+The QRDaemon Module keeps a single QRServer JVM alive for the lifetime of the
+process, so that QR detection does not pay JVM startup and class loading for
+every image.
+
+Images are written to the QRServer's stdin and results read back from its stdout
+using a length prefixed framing (refer QRServer.java):
+
+    request  : int32 length, image bytes
+    response : int32 exitcode, int32 length, FindQRCode.jar output
+
+If the JVM crashes, or does not take the image and answer within
+QRDetectorConstants.DaemonTimeout, it is killed and restarted on the next
+request. After QRDetectorConstants.DaemonMaxRestarts failures in a row the
+daemon is left alone for QRDetectorConstants.DaemonRetryInterval seconds.
+Whatever the JVM prints on stderr is logged.
+
+NOTE: QRServer.class has to be compiled next to FindQRCode.jar:
+
+     javac -cp FindQRCode.jar QRServer.java
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import os
+import errno
+import atexit
+import fcntl
+import select
+import struct
+import time
+import logging
+import threading
+
+from subprocess import PIPE, Popen
+from Logging.Logger import getLog
+from IANASettings.Settings import QRDetectorConstants
+from IANAExceptions.QRDaemonError import QRDaemonError
+
+log = getLog("QRDaemon")
+log.setLevel(logging.ERROR)
+
+class QRDaemon:
+    '''
+    Wraps a long-lived QRServer process and the framed stdin/stdout protocol
+    used to talk to it.
+    '''
+
+    def __init__(self, command, timeout, maxRestarts, retryInterval):
+        ''' Constructor
+
+        Keyword Arguments:
+        command       -- The command used to start the QRServer
+        timeout       -- Seconds to wait for an answer before the QRServer is considered hung
+        maxRestarts   -- Consecutive failures after which the daemon is no longer used
+        retryInterval -- Seconds after which the daemon is tried again once it is no longer used
+        '''
+
+        self.command = command
+        self.timeout = timeout
+        self.maxRestarts = maxRestarts
+        self.retryInterval = retryInterval
+        self.process = None
+        self.failures = 0
+        self.lastFailure = 0
+        self.lock = threading.Lock()
+
+    def isAvailable(self):
+        ''' Returns False once the QRServer failed maxRestarts times in a row,
+            until retryInterval seconds have passed since the last failure
+        '''
+        if self.failures < self.maxRestarts:
+            return True
+
+        return time.time() - self.lastFailure >= self.retryInterval
+
+    def start(self):
+        ''' Starts the QRServer process, its stdin is non blocking so that
+            writes can be given up on (refer write)
+        '''
+        log.info('Starting QRServer: ' + ' '.join(self.command))
+        self.process = Popen(self.command, stdin=PIPE, stdout=PIPE, stderr=PIPE, close_fds=True)
+
+        fd = self.process.stdin.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        errors = threading.Thread(target=logErrors, args=(self.process.stderr,))
+        errors.setDaemon(True)
+        errors.start()
+
+    def stop(self):
+        ''' Stops the QRServer process if it is running
+        '''
+        process, self.process = self.process, None
+        if process is None:
+            return
+
+        try:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        except OSError:
+            pass
+
+    def detect(self, data, parenttags=None):
+        ''' Runs QR detection on the encoded image in data
+
+        Keyword Arguments:
+        data       -- The encoded image (str)
+        parenttags -- The tag string of the calling method
+
+        Returns:
+        exitcode, output lines of FindQRCode.jar (with line terminators)
+
+        Raises:
+        QRDaemonError if the QRServer crashed or hung, the process is stopped
+        and restarted on the next call.
+        '''
+
+        self.lock.acquire()
+        try:
+            try:
+                if self.process is None or self.process.poll() is not None:
+                    self.start()
+
+                deadline = time.time() + self.timeout
+                self.write(struct.pack('>i', len(data)) + data, deadline)
+
+                exitcode, length = struct.unpack('>ii', self.read(8, deadline))
+                output = self.read(length, deadline)
+            except Exception, err:
+                self.failures += 1
+                self.lastFailure = time.time()
+                self.stop()
+                log.error('QRServer failed (%d/%d): %s', self.failures, self.maxRestarts, str(err), extra=parenttags)
+                raise QRDaemonError(err)
+
+            self.failures = 0
+            return exitcode, output.splitlines(True)
+        finally:
+            self.lock.release()
+
+    def write(self, data, deadline):
+        ''' Writes data to the QRServer's stdin before the deadline
+
+        Raises:
+        QRDaemonError on timeout or if the QRServer closed its stdin
+        '''
+
+        fd = self.process.stdin.fileno()
+        written = 0
+
+        while written < len(data):
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+                raise QRDaemonError('QRServer did not take the image within %d seconds' % self.timeout)
+
+            try:
+                written += os.write(fd, data[written:])
+            except OSError, err:
+                if err.errno != errno.EAGAIN:
+                    raise QRDaemonError('QRServer exited with %s: %s' % (self.process.poll(), str(err)))
+
+    def read(self, size, deadline):
+        ''' Reads exactly size bytes from the QRServer's stdout before the deadline
+
+        Raises:
+        QRDaemonError on timeout or if the QRServer closed its stdout
+        '''
+
+        fd = self.process.stdout.fileno()
+        chunks = []
+
+        while size > 0:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise QRDaemonError('QRServer did not answer within %d seconds' % self.timeout)
+
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise QRDaemonError('QRServer exited with %s' % self.process.poll())
+
+            chunks.append(chunk)
+            size -= len(chunk)
+
+        return ''.join(chunks)
+
+def logErrors(stderr):
+    ''' Logs the lines the QRServer prints on stderr until it exits
+    '''
+    for line in iter(stderr.readline, ''):
+        log.error('QRServer: ' + line.rstrip('\r\n'))
+    stderr.close()
+
+##
+# The QRDaemon shared by every detectQR call of this process
+_daemon = None
+
+##
+# Whether the missing QRServer.class has been logged
+_missingWarned = False
+
+def getQRDaemon():
+    ''' Returns the process wide QRDaemon, or None when it is disabled
+        through QRDetectorConstants.UseDaemon, QRServer.class has not been
+        built or the daemon has failed too often.
+    '''
+    global _daemon, _missingWarned
+
+    if not QRDetectorConstants.UseDaemon:
+        return None
+
+    if _daemon is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        if not os.path.exists(os.path.join(directory, 'QRServer.class')):
+            if not _missingWarned:
+                log.error('QRServer.class is not built, spawning FindQRCode.jar (refer QRServer.java)')
+                _missingWarned = True
+            return None
+
+        classpath = os.pathsep.join([os.path.join(directory, 'FindQRCode.jar'), directory])
+        _daemon = QRDaemon(['java', '-cp', classpath, 'QRServer', QRDetectorConstants.Message],
+                           QRDetectorConstants.DaemonTimeout,
+                           QRDetectorConstants.DaemonMaxRestarts,
+                           QRDetectorConstants.DaemonRetryInterval)
+        atexit.register(_daemon.stop)
+
+    if not _daemon.isAvailable():
+        return None
+
+    return _daemon
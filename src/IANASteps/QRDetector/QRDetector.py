@@ -9,6 +9,20 @@ uses Popen to spawn a new sub-process to execute:
    
 And parses out a the aux_id and a set of QR coordinates from the output pipe.
 
+When QRDetectorConstants.UseDaemon is set the image is instead handed to the
+process wide QRDaemon (refer QRDaemon.py), which keeps one JVM running, and
+FindQRCode.jar is only spawned if the daemon is unavailable.
+
+When QRDetectorConstants.UseLocator is set the QR code is located in-process
+(refer QRLocator.py) and FindQRCode.jar only decodes a tight crop around it.
+
+When QRDetectorConstants.UseCache is set results are remembered per image
+(refer QRCache.py), so detecting the QR code of an identical image again
+does not run FindQRCode.jar at all.
+
+When QRDetectorConstants.CoarseToFine is set large images are first decoded
+on a thumbnail, and the points refined at full resolution around each corner.
+
 
 Created on Oct 8, 2010
 
@@ -16,24 +30,212 @@ Created on Oct 8, 2010
 '''
 
 import os
+import StringIO
 import logging
+import PIL.Image as Image
 
 from subprocess import PIPE, Popen
 from Logging.Logger import getLog
 from IANASteps.Geometry.Point import Point
+from IANAUtil.Metrics import getMetrics
+from IANAUtil.ImageContext import ImageContext
 from QR import QR
-from IANASettings.Settings import ExitCode
+from QRDaemon import getQRDaemon
+from QRCache import getQRCache
+from QRLocator import locateQR, refinePattern
+from IANASettings.Settings import ExitCode, QRDetectorConstants
+from IANAExceptions.QRDaemonError import QRDaemonError
 
     
 log = getLog("QRFilter")
 log.setLevel(logging.ERROR)    
+
+metrics = getMetrics()
         
     
+@metrics.timed('qr_jvm')
+def runFindQRCode(file_, data, parenttags=None):
+    ''' Runs FindQRCode.jar on the given image, through the process wide
+        QRDaemon when it is available and by spawning the jar otherwise.
+
+    Keyword arguments:
+    file_      -- The full file name toward the image file, or None.
+    data       -- The encoded image.
+    parenttags -- The tag string of the calling method.
+
+    Returns:
+    exitcode, output lines of FindQRCode.jar
+    '''
+
+    daemon = getQRDaemon()
+    if daemon is not None:
+        try:
+            return daemon.detect(data, parenttags)
+        except QRDaemonError, err:
+            log.error("QRDaemon failed, spawning FindQRCode.jar: %s", str(err), extra=parenttags)
+
+    if isinstance(file_, str):
+        qrCommand = ['java', '-jar', os.path.join(os.path.dirname(__file__), 'FindQRCode.jar'),
+                         QRDetectorConstants.Message, file_]
+            
+            
+        QRFinder = Popen(qrCommand, stdout=PIPE, close_fds=True)
+        QRFinder_out = QRFinder.stdout.readlines()
+    else:
+        qrCommand = ['java', '-jar', os.path.join(os.path.dirname(__file__), 'FindQRCode.jar'),
+                         QRDetectorConstants.Message]
+            
+        QRFinder = Popen(qrCommand, stdout=PIPE, stdin=PIPE, close_fds=True)
+        QRFinder_out = QRFinder.communicate(input=data)[0].splitlines()
+    
+    exitcode = QRFinder.wait()
+    QRFinder.stdout.close()
+
+    return exitcode, QRFinder_out
+
+def parseFindQRCode(QRFinder_out, parenttags=None):
+    ''' Parses the aux_id and the QR points out of the output of FindQRCode.jar
+
+    Keyword arguments:
+    QRFinder_out -- output lines of FindQRCode.jar, with or without line terminators
+    parenttags   -- The tag string of the calling method.
+
+    Returns:
+    aux, list of Geometry.Point objects (empty if no QR code was found)
+    '''
+
+    tags = parenttags
+
+    #Extracting QR code
+    points = []
+        
+    qrLine = None
+    for line in QRFinder_out:
+        if qrLine is None:
+            qrLine = line.rstrip('\r\n')
+            log.info("Finding QRCode: " + str(qrLine), extra=tags)
+            continue
+        x, y = line.rstrip('\r\n').split(',')
+        points.append(Point((float(x), float(y))))
+        log.info("QR point (x, y): {0:s}, {1:s}".format(x, y), extra=tags)
+        # eg. Points: [(653.0, 412.0), (653.5, 282.5), (782.5, 283.5), (763.5, 395.5)]
+
+    aux = ""
+    if qrLine:
+        aux = str(qrLine)
+        try:
+            aux = aux[aux.rindex("v=")+2:]
+        except Exception, err:
+            log.error('Error %s' % str(err), extra=tags)
+
+    return aux, points
+
+def cropQR(image, points):
+    ''' Crops the located QR code (and its quiet zone) out of the image
+
+    Keyword arguments:
+    image  -- a PIL.Image object
+    points -- the QR points as returned by QRLocator.locateQR
+
+    Returns:
+    the offset of the crop in the image, the crop encoded as PNG
+    '''
+
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    margin = QRDetectorConstants.LocatorCropMargin * max(max(xs) - min(xs), max(ys) - min(ys))
+
+    width, height = image.size
+    box = (max(int(min(xs) - margin), 0), max(int(min(ys) - margin), 0),
+           min(int(max(xs) + margin), width), min(int(max(ys) + margin), height))
+
+    data = StringIO.StringIO()
+    image.crop(box).save(data, 'PNG')
+
+    return Point(box[:2]), data.getvalue()
+
+def detectCoarseToFine(image, parenttags=None):
+    ''' Decodes the QR code on a thumbnail of the image, scales the points back
+        to full resolution and refines every point within a small window.
+
+    Keyword arguments:
+    image      -- a PIL.Image object
+    parenttags -- The tag string of the calling method.
+
+    Returns:
+    aux, points, exitcode or None if the QR code could not be found or the refined
+    QR geometry is not within tolerance of the thumbnail's.
+    '''
+
+    tags = parenttags
+
+    scale = max(image.size) / float(QRDetectorConstants.CoarseSide)
+    thumbnail = image.resize((int(image.size[0] / scale), int(image.size[1] / scale)), Image.ANTIALIAS)
+    data = StringIO.StringIO()
+    thumbnail.save(data, 'PNG')
+
+    exitcode, QRFinder_out = runFindQRCode(None, data.getvalue(), tags)
+    aux, points = parseFindQRCode(QRFinder_out, tags)
+    if len(points) != 4:
+        log.info("Could not find the QR code in the thumbnail", extra=tags)
+        return None
+
+    coarse = QR(aux, [point * scale for point in points])
+    halfWindow = QRDetectorConstants.CoarseRefineWindow * max(coarse.width, coarse.height)
+
+    refined = []
+    for index, point in enumerate(coarse.points):
+        if index < 3:
+            center = refinePattern(image, point, halfWindow, (1, 1, 3, 1, 1))
+        else:
+            center = refinePattern(image, point, halfWindow, (1, 1, 1), False)
+
+        if center is None:
+            log.info("Could not refine QR point {0}, keeping {1}".format(index, point), extra=tags)
+            center = point
+        refined.append(center)
+
+    fine = QR(aux, refined)
+
+    rotation = abs(fine.rotation - coarse.rotation) % 360
+    rotation = min(rotation, 360 - rotation)
+    if (rotation > QRDetectorConstants.CoarseRotationTolerance or
+        abs(fine.width / coarse.width - 1) > QRDetectorConstants.CoarseSizeTolerance or
+        abs(fine.height / coarse.height - 1) > QRDetectorConstants.CoarseSizeTolerance):
+        log.info("Refined QR {0} is not within tolerance of the thumbnail QR {1}".format(fine, coarse), extra=tags)
+        return None
+
+    return aux, refined, exitcode
+
+def detectionMode():
+    ''' Returns the detection mode of detectQR, part of the QRCache keys: the
+        points located or found coarse-to-fine are approximate and must not be
+        served once those modes are switched off.
+    '''
+    mode = []
+    if QRDetectorConstants.UseLocator:
+        mode.append('locator')
+    if QRDetectorConstants.CoarseToFine:
+        mode.append('coarse' + str(QRDetectorConstants.CoarseSide))
+    if not mode:
+        mode.append('full')
+
+    return ','.join(mode)
+
 def detectQR(file_, parenttags=None, level=logging.ERROR):
     '''Call FindQRCode.jar to see whether QR code is correct.
 
+    When QRDetectorConstants.UseLocator is set the QR code is first located
+    in-process (refer QRLocator.py), FindQRCode.jar then only decodes a tight
+    crop of it.
+    
+    When QRDetectorConstants.CoarseToFine is set images larger than
+    QRDetectorConstants.CoarseSide are decoded on a thumbnail first
+    (refer detectCoarseToFine).
+
     Keyword arguments:
-    file_      -- The full file name toward the image file to be processed.
+    file_      -- The full file name toward the image file to be processed,
+                  a file object or an IANAUtil.ImageContext.
     parenttags -- The tag string of the calling method.
     level      -- The logging level.
 
@@ -50,51 +252,61 @@ def detectQR(file_, parenttags=None, level=logging.ERROR):
         
         log.info("Running QR Detection", extra=tags)
         
-        if isinstance(file_, str):
-            qrCommand = ['java', '-jar', os.path.join(os.path.dirname(__file__), 'FindQRCode.jar'),
-                             'http://www.projectsurya.org/', file_]
-                
-                
-            QRFinder = Popen(qrCommand, stdout=PIPE, close_fds=True)
-            QRFinder_out = QRFinder.stdout
-        else:
-            qrCommand = ['java', '-jar', os.path.join(os.path.dirname(__file__), 'FindQRCode.jar'),
-                             'http://www.projectsurya.org/']
-                
-            QRFinder = Popen(qrCommand, stdout=PIPE, stdin=PIPE, close_fds=True)
-            QRFinder_out = QRFinder.communicate(input=file_.read())[0].splitlines()
+        context = ImageContext.open(file_)
+        data = context.data
+        if not isinstance(file_, str):
+            file_ = None
         
-        exitcode = QRFinder.wait()
-        #Extracting QR code
-        points = []
-            
-        qrLine = None
-        for line in QRFinder_out:
-            if qrLine is None:
-                qrLine = line[:-1]
-                log.info("Finding QRCode: " + str(qrLine), extra=tags)
-                continue
-            x, y = line[:-1].split(',')
-            points.append(Point((float(x), float(y))))
-            log.info("QR point (x, y): {0:s}, {1:s}".format(x, y), extra=tags)
-            # eg. Points: [(653.0, 412.0), (653.5, 282.5), (782.5, 283.5), (763.5, 395.5)]
-    
-        QRFinder.stdout.close()
+        cache = getQRCache()
+        mode = detectionMode()
+        if cache is not None:
+            cached = cache.get(data, mode)
+            if cached is not None:
+                aux, points, exitcode = cached
+                log.info("Found QR code in the QRCache, aux_id " + aux, extra=tags)
+                return QR(aux, points), exitcode
+        
+        if QRDetectorConstants.UseLocator or QRDetectorConstants.CoarseToFine:
+            image = context.image()
+        
+        if QRDetectorConstants.UseLocator:
+            located = locateQR(image)
+            if located is None:
+                log.info("Could not locate QR code, decoding the whole image", extra=tags)
+            else:
+                offset, crop = cropQR(image, located)
+                exitcode, QRFinder_out = runFindQRCode(None, crop, tags)
+                qrAux, points = parseFindQRCode(QRFinder_out, tags)
+                if points:
+                    points = [point + offset for point in points]
+                    if cache is not None:
+                        cache.put(data, mode, qrAux, points, exitcode)
+                    log.info("Done Running QR Detection on the located QR code", extra=tags)
+                    return QR(qrAux, points), exitcode
+                log.info("Could not decode the located QR code, decoding the whole image", extra=tags)
+        
+        points = None
+        if QRDetectorConstants.CoarseToFine and max(image.size) > QRDetectorConstants.CoarseSide:
+            found = detectCoarseToFine(image, tags)
+            if found is not None:
+                aux, points, exitcode = found
+                log.info("Found QR code coarse-to-fine", extra=tags)
+            else:
+                log.info("Coarse-to-fine QR detection failed, decoding the whole image", extra=tags)
+        
+        if points is None:
+            exitcode, QRFinder_out = runFindQRCode(file_, data, tags)
+            aux, points = parseFindQRCode(QRFinder_out, tags)
     
         if not points:
             log.error("Cannot extract QR info, check FindQRCode.jar, " + 
                       "exitcode of FindQRCode.jar is " + str(exitcode), extra=tags)
             return None, ExitCode.QRDetectionError
                 
-        aux = ""
-        if qrLine:
-            aux = str(qrLine)
-            try:
-                aux = aux[aux.rindex("v=")+2:]
-            except Exception, err:
-                log.error('Error %s' % str(err), extra=tags)
-                
         log.info("QR Aux info. (aux_id) " + aux, extra=tags)
+        
+        if cache is not None:
+            cache.put(data, mode, aux, points, exitcode)
             
         log.info("Done Running QR Detection", extra=tags)
         
@@ -0,0 +1,331 @@
+'''
+The QRLocator Module finds the QR code in an image in-process, without FindQRCode.jar.
+
+It binarizes a thumbnail of the image and scans it for the three finder patterns
+using the same 1:1:3:1:1 (dark:light:dark:light:dark) run-length test as zxing,
+cross-checks every candidate vertically, and then estimates and refines the
+alignment pattern from the geometry of the three finder patterns.
+
+The located points are returned in the order FindQRCode.jar reports them, and
+QR.__init__ expects them:
+
+     [bottomLeft finder, topLeft finder, topRight finder, alignment pattern]
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import math
+import numpy
+import PIL.Image as Image
+
+from IANASteps.Geometry.Point import Point
+from IANASettings.Settings import QRDetectorConstants
+
+def binarize(gray, blockSize):
+    ''' Binarizes a grayscale array against its local mean
+
+    Keyword Arguments:
+    gray      -- 2d numpy array of luminance values
+    blockSize -- side of the neighbourhood used for the local mean
+
+    Returns:
+    2d boolean numpy array, True for dark pixels
+    '''
+
+    height, width = gray.shape
+    half = max(blockSize // 2, 1)
+
+    # summed area table with a zero row/column in front
+    table = numpy.zeros((height + 1, width + 1))
+    table[1:, 1:] = gray.cumsum(0).cumsum(1)
+
+    ys = numpy.arange(height)
+    xs = numpy.arange(width)
+    top = numpy.clip(ys - half, 0, height)[:, None]
+    bottom = numpy.clip(ys + half + 1, 0, height)[:, None]
+    left = numpy.clip(xs - half, 0, width)[None, :]
+    right = numpy.clip(xs + half + 1, 0, width)[None, :]
+
+    area = (bottom - top) * (right - left)
+    mean = (table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]) / area
+
+    return gray < mean * QRDetectorConstants.LocatorThreshold
+
+def runs(line):
+    ''' Splits a line of booleans into runs
+
+    Returns:
+    starts, lengths and colors (True for dark) of the runs
+    '''
+
+    changes = numpy.nonzero(line[1:] != line[:-1])[0] + 1
+    bounds = numpy.concatenate(([0], changes, [len(line)]))
+
+    return bounds[:-1], numpy.diff(bounds), line[bounds[:-1]]
+
+def findPatterns(line, ratios, dark=True):
+    ''' Finds the runs in the line matching the given ratios
+
+    Keyword Arguments:
+    line   -- 1d numpy array of booleans
+    ratios -- the expected relative length of the runs, eg (1, 1, 3, 1, 1)
+    dark   -- whether the first run of the pattern is dark
+
+    Returns:
+    centers of the middle runs, module sizes
+    '''
+
+    starts, lengths, colors = runs(line)
+    count = len(ratios)
+    if len(lengths) < count:
+        return numpy.zeros(0), numpy.zeros(0)
+
+    first = len(lengths) - count + 1
+    window = numpy.array([lengths[i:i + first] for i in range(count)], dtype=float)
+    module = window.sum(0) / float(sum(ratios))
+
+    match = (colors[:first] == dark) & (module >= 1)
+    for i, ratio in enumerate(ratios):
+        match &= numpy.abs(window[i] - ratio * module) < ratio * module / 2.0
+
+    middle = count // 2
+    index = numpy.nonzero(match)[0]
+    centers = starts[index + middle] + lengths[index + middle] / 2.0
+
+    return centers, module[index]
+
+def cluster(candidates, distance):
+    ''' Groups (x, y, module) candidates of similar module size that lie within
+        distance modules of each other
+
+    Returns:
+    list of [x, y, module, count] sorted by count, most hits first
+    '''
+
+    clusters = []
+    for x, y, module in candidates:
+        for group in clusters:
+            if (abs(group[0] - x) < distance * group[2] and abs(group[1] - y) < distance * group[2] and
+                abs(group[2] - module) < group[2] / 2.0):
+                n = group[3]
+                group[0] = (group[0] * n + x) / (n + 1)
+                group[1] = (group[1] * n + y) / (n + 1)
+                group[2] = (group[2] * n + module) / (n + 1)
+                group[3] = n + 1
+                break
+        else:
+            clusters.append([x, y, module, 1])
+
+    clusters.sort(key=lambda group: -group[3])
+    return clusters
+
+def crossCheck(line, center, module, ratios, dark=True):
+    ''' Checks that the pattern is also found in the perpendicular direction
+
+    Returns:
+    the center along the line, or None
+    '''
+
+    centers, modules = findPatterns(line, ratios, dark)
+    for c, m in zip(centers, modules):
+        if abs(c - center) < module * 1.5 and abs(m - module) < module / 2.0:
+            return c
+
+    return None
+
+def findFinderPatterns(dark):
+    ''' Returns the verified finder pattern centers as [x, y, module] lists
+    '''
+
+    candidates = []
+    for y in range(dark.shape[0]):
+        centers, modules = findPatterns(dark[y], (1, 1, 3, 1, 1))
+        candidates.extend(zip(centers, [y] * len(centers), modules))
+
+    finderPatterns = []
+    for x, y, module, count in cluster(candidates, 3):
+        if count < 2:
+            continue
+        column = int(round(x))
+        cy = crossCheck(dark[:, column], y, module, (1, 1, 3, 1, 1))
+        if cy is None:
+            continue
+        cx = crossCheck(dark[int(round(cy))], x, module, (1, 1, 3, 1, 1))
+        if cx is None:
+            continue
+        finderPatterns.append([cx, cy, module])
+
+    return finderPatterns[:QRDetectorConstants.LocatorCandidates]
+
+def orderFinderPatterns(finderPatterns):
+    ''' Picks the three finder patterns forming the most plausible QR code corner
+
+    Returns:
+    bottomLeft, topLeft, topRight as Points and the mean module size, or None
+    '''
+
+    best = None
+    count = len(finderPatterns)
+    for i in range(count):
+        for j in range(i + 1, count):
+            for k in range(j + 1, count):
+                triple = [finderPatterns[i], finderPatterns[j], finderPatterns[k]]
+                modules = [p[2] for p in triple]
+                if max(modules) > 1.5 * min(modules):
+                    continue
+
+                # try each of the patterns as the topLeft corner
+                for corner in range(3):
+                    a = Point(triple[corner][:2])
+                    b = Point(triple[(corner + 1) % 3][:2])
+                    c = Point(triple[(corner + 2) % 3][:2])
+                    ab, ac = b - a, c - a
+                    lengthB, lengthC = ab.distance(), ac.distance()
+                    if lengthB == 0 or lengthC == 0:
+                        continue
+
+                    # legs of equal length at a right angle
+                    score = abs(ab.dot(ac)) / (lengthB * lengthC) + abs(lengthB - lengthC) / max(lengthB, lengthC)
+                    if best is None or score < best[0]:
+                        best = (score, a, b, c, sum(modules) / 3.0)
+
+    if best is None or best[0] > QRDetectorConstants.LocatorTolerance:
+        return None
+
+    score, topLeft, b, c, module = best
+
+    # with y pointing down topRight lies clockwise of bottomLeft
+    ab, ac = b - topLeft, c - topLeft
+    if ab[0] * ac[1] - ab[1] * ac[0] > 0:
+        topRight, bottomLeft = b, c
+    else:
+        topRight, bottomLeft = c, b
+
+    return bottomLeft, topLeft, topRight, module
+
+def findAlignmentPattern(dark, bottomLeft, topLeft, topRight, module):
+    ''' Estimates the alignment pattern position the way zxing does and refines
+        it by looking for a 1:1:1 (light:dark:light) pattern around the estimate.
+
+    Returns:
+    the alignment pattern center as a Point
+    '''
+
+    modules = ((topRight - topLeft).distance() + (bottomLeft - topLeft).distance()) / (2 * module)
+    dimension = int(round(modules)) + 7
+    if dimension % 4 == 0:
+        dimension += 1
+    elif dimension % 4 == 2:
+        dimension -= 1
+
+    bottomRight = topRight - topLeft + bottomLeft
+    if dimension > 21:
+        correction = 1.0 - 3.0 / (dimension - 7)
+        estimate = topLeft + (bottomRight - topLeft) * correction
+    else:
+        estimate = bottomRight
+
+    # search a few modules around the estimate
+    height, width = dark.shape
+    allowance = int(math.ceil(4 * module))
+    left = max(int(estimate[0]) - allowance, 0)
+    right = min(int(estimate[0]) + allowance + 1, width)
+    top = max(int(estimate[1]) - allowance, 0)
+    bottom = min(int(estimate[1]) + allowance + 1, height)
+
+    candidates = []
+    for y in range(top, bottom):
+        centers, modules = findPatterns(dark[y, left:right], (1, 1, 1), False)
+        for x, m in zip(centers, modules):
+            if abs(m - module) < module / 2.0:
+                candidates.append((left + x, y, m))
+
+    for x, y, m, count in cluster(candidates, 1):
+        cy = crossCheck(dark[:, int(round(x))], y, m, (1, 1, 1), False)
+        if cy is not None:
+            return Point(x, cy)
+
+    return estimate
+
+def refinePattern(image, point, halfWindow, ratios, dark=True):
+    ''' Refines the center of a finder (1:1:3:1:1) or alignment (1:1:1) pattern
+        at full resolution, only looking at the window around the estimate.
+
+    Keyword Arguments:
+    image      -- a PIL.Image object
+    point      -- the estimated center of the pattern
+    halfWindow -- half the side of the window searched around point
+    ratios     -- the run-length ratios of the pattern
+    dark       -- whether the first run of the pattern is dark
+
+    Returns:
+    the refined center as a Point, or None if the pattern is not in the window
+    '''
+
+    width, height = image.size
+    left = max(int(point[0] - halfWindow), 0)
+    top = max(int(point[1] - halfWindow), 0)
+    right = min(int(point[0] + halfWindow) + 1, width)
+    bottom = min(int(point[1] + halfWindow) + 1, height)
+    if right - left < 2 * len(ratios) or bottom - top < 2 * len(ratios):
+        return None
+
+    pixels = numpy.asarray(image.crop((left, top, right, bottom)).convert('L'), dtype=float)
+    mask = binarize(pixels, max(pixels.shape))
+
+    candidates = []
+    for y in range(mask.shape[0]):
+        centers, modules = findPatterns(mask[y], ratios, dark)
+        candidates.extend(zip(centers, [y] * len(centers), modules))
+
+    best = None
+    for x, y, module, count in cluster(candidates, 1):
+        cy = crossCheck(mask[:, int(round(x))], y, module, ratios, dark)
+        if cy is None:
+            continue
+        cx = crossCheck(mask[int(round(cy))], x, module, ratios, dark)
+        if cx is None:
+            continue
+
+        center = Point(left + float(cx), top + float(cy))
+        if best is None or center.distance(point) < best.distance(point):
+            best = center
+
+    return best
+
+def locateQR(image):
+    ''' Locates the QR code in the image
+
+    Keyword Arguments:
+    image -- a PIL.Image object
+
+    Returns:
+    [bottomLeft, topLeft, topRight, alignment] Points in image coordinates,
+    or None if no QR code could be located
+    '''
+
+    gray = image.convert('L')
+    side = QRDetectorConstants.LocatorThumbnailSide
+    scale = 1.0
+    if max(gray.size) > side:
+        scale = max(gray.size) / float(side)
+        gray = gray.resize((int(gray.size[0] / scale), int(gray.size[1] / scale)), Image.ANTIALIAS)
+
+    pixels = numpy.asarray(gray, dtype=float)
+    dark = binarize(pixels, max(pixels.shape) // 8)
+
+    finderPatterns = findFinderPatterns(dark)
+    if len(finderPatterns) < 3:
+        return None
+
+    ordered = orderFinderPatterns(finderPatterns)
+    if ordered is None:
+        return None
+
+    bottomLeft, topLeft, topRight, module = ordered
+    alignment = findAlignmentPattern(dark, bottomLeft, topLeft, topRight, module)
+
+    return [Point(float(point[0]) * scale, float(point[1]) * scale)
+                for point in (bottomLeft, topLeft, topRight, alignment)]
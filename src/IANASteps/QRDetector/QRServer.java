@@ -0,0 +1,127 @@
+/*
+ * Long-lived counterpart of FindQRCode.jar used by QRDetector.QRDaemon.
+ *
+ * Reads framed requests from stdin and writes framed responses to stdout
+ * so that a single JVM can serve every image of an IANAFramework process.
+ *
+ *   request  : int32 length, <length> bytes of encoded image
+ *   response : int32 exitcode, int32 length, <length> bytes of output
+ *
+ * The output is identical to what FindQRCode.jar prints: the text of the
+ * QR code on the first line followed by one "x,y" line per result point.
+ * All integers are big-endian. A zero length request shuts the server down.
+ *
+ * Build (once, next to FindQRCode.jar):
+ *
+ *     javac -cp FindQRCode.jar QRServer.java
+ *
+ * Created on Oct 18, 2026
+ *
+ * @author: surya
+ */
+
+import java.awt.image.BufferedImage;
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayInputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.util.Hashtable;
+
+import javax.imageio.ImageIO;
+
+import com.google.zxing.BinaryBitmap;
+import com.google.zxing.DecodeHintType;
+import com.google.zxing.LuminanceSource;
+import com.google.zxing.ReaderException;
+import com.google.zxing.Result;
+import com.google.zxing.ResultPoint;
+import com.google.zxing.client.j2se.BufferedImageLuminanceSource;
+import com.google.zxing.common.HybridBinarizer;
+import com.google.zxing.multi.qrcode.QRCodeMultiReader;
+
+public class QRServer {
+
+    // Mirrors FindQRCode.ExitCode
+    static final int Success = 0;
+    static final int IncorrectUsage = 1;
+    static final int BadFile = 2;
+    static final int NoQRFound = 3;
+    static final int WrongQR = 4;
+
+    public static void main(String[] args) throws IOException {
+        if (args.length != 1) {
+            System.err.println("Usage: java -cp FindQRCode.jar:. QRServer message");
+            System.exit(IncorrectUsage);
+        }
+
+        String message = args[0].toLowerCase();
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(System.out));
+
+        QRCodeMultiReader reader = new QRCodeMultiReader();
+        Hashtable<DecodeHintType, Object> hints = new Hashtable<DecodeHintType, Object>();
+        hints.put(DecodeHintType.TRY_HARDER, Boolean.TRUE);
+
+        while (true) {
+            int length;
+            try {
+                length = in.readInt();
+            } catch (EOFException e) {
+                break;
+            }
+            if (length <= 0) {
+                break;
+            }
+
+            byte[] image = new byte[length];
+            in.readFully(image);
+
+            StringBuilder output = new StringBuilder();
+            int exitcode = find(reader, hints, message, image, output);
+            byte[] payload = output.toString().getBytes("UTF-8");
+
+            out.writeInt(exitcode);
+            out.writeInt(payload.length);
+            out.write(payload);
+            out.flush();
+        }
+    }
+
+    static int find(QRCodeMultiReader reader, Hashtable<DecodeHintType, Object> hints,
+                    String message, byte[] data, StringBuilder output) {
+        BufferedImage image;
+        try {
+            image = ImageIO.read(new ByteArrayInputStream(data));
+        } catch (IOException e) {
+            return BadFile;
+        }
+        if (image == null) {
+            return BadFile;
+        }
+
+        LuminanceSource source = new BufferedImageLuminanceSource(image);
+        BinaryBitmap bitmap = new BinaryBitmap(new HybridBinarizer(source));
+
+        Result[] results;
+        try {
+            results = reader.decodeMultiple(bitmap, hints);
+        } catch (ReaderException e) {
+            return NoQRFound;
+        }
+
+        for (Result result : results) {
+            if (!result.getText().toLowerCase().startsWith(message)) {
+                continue;
+            }
+            output.append(result.getText()).append('\n');
+            for (ResultPoint point : result.getResultPoints()) {
+                output.append(String.format("%f,%f", point.getX(), point.getY())).append('\n');
+            }
+            return Success;
+        }
+        return WrongQR;
+    }
+}
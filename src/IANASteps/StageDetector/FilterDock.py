@@ -0,0 +1,36 @@
+'''
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+from IANASteps.Geometry.Quadrilateral import Quadrilateral
+
+class FilterDock(Quadrilateral):
+    """
+    Represents the Filter Dock, the part of the Stage below the Calibrator
+    that holds the filter.
+    """
+    
+    def __init__(self, topLeft, bottomLeft, bottomRight, topRight):
+        """ Constructor
+        
+        Sets the topLeft, bottomLeft, bottomRight, topRight fields of this class
+        
+        Keyword Arguments:
+        topLeft     -- topLeft coordinate of the Filter Dock(the absolute topLeft)
+        bottomLeft  -- bottomLeft coordinate of the Filter Dock(the absolute bottomLeft)
+        bottomRight -- bottomRight coordinate of the Filter Dock(the absolute bottomRight)
+        topRight    -- topRight coordinate of the Filter Dock(the absolute topRight)
+        """
+        
+        Quadrilateral.__init__(self, topLeft, bottomLeft, bottomRight, topRight)
+    
+    def __str__(self):
+        """ Human readable representation
+        
+        Returns:
+        str -- all the information regarding the Filter Dock
+        """
+
+        return 'FilterDock: {0}'.format(Quadrilateral.__str__(self))
@@ -12,7 +12,9 @@ import logging
 
 from Stage import Stage
 from Calibrator import Calibrator
+from FilterDock import FilterDock
 from Logging.Logger import getLog
+from IANASteps.Geometry.PointArray import PointArray
 from IANASettings.Settings import ExitCode, StageDetectorConstants
 
 log = getLog("StageDetector")
@@ -33,26 +35,15 @@ def computeBoxFromQR(qr, left, right, top, bottom, parenttags=None):
     (topLeft, bottomLeft, bottomRight, topRight) coordinates
     """
 
-    qrTopLeft = qr.topLeft  
-    qrTopRight = qr.topRight 
-    qrBottomLeft = qr.bottomLeft 
-    qrBottomRight = qr.bottomRight 
+    qrCorners = PointArray([qr.topLeft, qr.topRight, qr.bottomLeft, qr.bottomRight])
 
-    # The dimensions for each side (in the worst case this is
-    # a generic quadrilateral, but in the best case it's a square)
-    qrTopL2R = qrTopRight - qrTopLeft
-    qrBottomL2R = qrBottomRight - qrBottomLeft
-    qrLeftT2B = qrBottomLeft - qrTopLeft
-    qrRightT2B = qrBottomRight - qrTopRight
-    qrDeltaL2R_T2B = qrRightT2B - qrLeftT2B
-    
-    leftT2B = qrLeftT2B + qrDeltaL2R_T2B * left
-    topLeft = qrTopLeft + qrTopL2R * left + leftT2B * top
-    bottomLeft = qrBottomLeft + qrBottomL2R * left + leftT2B * bottom
-
-    rightT2B = qrLeftT2B + qrDeltaL2R_T2B * right
-    topRight = qrTopLeft + qrTopL2R * right + rightT2B * top
-    bottomRight = qrBottomLeft + qrBottomL2R * right + rightT2B * bottom
+    # In the worst case the QR code is a generic quadrilateral, the box extends
+    # it bilinearly: top is measured from the top of the QR code and bottom
+    # from its bottom, in QR heights
+    topLeft, bottomLeft, bottomRight, topRight = qrCorners.bilinear([(left, top),
+                                                                     (left, 1 + bottom),
+                                                                     (right, 1 + bottom),
+                                                                     (right, top)])
 
     log.info("Coordinates: topLeft:{0}, bottomLeft:{1}, bottomRight:{2}, topRight:{3} ".format(topLeft, bottomLeft, bottomRight, topRight), extra=parenttags)
     return topLeft, bottomLeft, bottomRight, topRight
@@ -117,3 +108,36 @@ def detectCalibrator(qr, parenttags=None, level=logging.ERROR):
         
     log.info("Done Running Calibrator Detection", extra=tags)
     return Calibrator(topLeft, bottomLeft, bottomRight, topRight), ExitCode.Success
+
+def detectFilterDock(qr, parenttags=None, level=logging.ERROR):
+    """ Returns the coordinates of the Filter Dock, the part of the Stage
+        below the Calibrator (refer StageDetectorConstants)
+    
+    Keyword Arguments:
+    qr         -- a QRFilter_.QR object
+    parenttags -- The tag string of the calling method
+    level      -- The logging level
+    
+    Returns:
+    (topLeft, bottomLeft, bottomRight, topRight) coordinates of the Filter Dock
+    """
+    # Set the logging level
+    log.setLevel(level)
+    tags = parenttags + " FILTERDOCK"
+    
+    log.info("Running Filter Dock Detection", extra=tags)
+    try:
+        # the calibrator bottom is measured from the bottom of the QR code, 
+        # the top of a box from the top of the QR code
+        topLeft, bottomLeft, bottomRight, topRight = computeBoxFromQR(qr,
+                                                                      StageDetectorConstants.sleft, 
+                                                                      StageDetectorConstants.sright, 
+                                                                      1 + StageDetectorConstants.cbottom,
+                                                                      StageDetectorConstants.sbottom,
+                                                                      tags)
+    except Exception, err:
+        log.error('Error %s' % str(err), extra=tags)
+        return None, ExitCode.StageDetectionError
+        
+    log.info("Done Running Filter Dock Detection", extra=tags)
+    return FilterDock(topLeft, bottomLeft, bottomRight, topRight), ExitCode.Success
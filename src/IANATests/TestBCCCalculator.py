@@ -0,0 +1,64 @@
+'''
+Tests of the batched fits of BCCCalculator.rateFilterBatch
+
+Run from src: python -m unittest IANATests.TestBCCCalculator
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+import unittest
+
+from IANASteps.BCCCalculator.BCCCalculator import rateFilterBatch
+from IANASteps.BCCCalculator.ExpmodFit import fitExpmodRows
+from IANASettings.Settings import ExitCode
+
+##
+# The bcgradient of IANAMain.Main
+BCGradient = [0.53805296, 0.77764056, 1.10252548, 1.54307503, 2.14046781,
+              2.9505427, 4.04901822, 5.53856995, 7.55842775, 10.29738974]
+
+def synthesizeGradient(random, noise=1.0):
+    ''' Returns a gradient (white, the 10 gray bars, black) whose bands follow
+        random expmod curves through BCGradient
+    '''
+    bcgradient = numpy.array(BCGradient)
+    bands = []
+    for band in range(3):
+        a = random.uniform(-1.0, 0.0)
+        c = random.uniform(-0.03, -0.01)
+        b = (bcgradient[0] - a) / numpy.exp(c * 220)
+        bands.append(numpy.log((bcgradient - a) / b) / c + random.normal(0, noise, bcgradient.shape))
+
+    return [(255.0, 255.0, 255.0)] + zip(*[band.tolist() for band in bands]) + [(0.0, 0.0, 0.0)]
+
+class TestRateFilterBatch(unittest.TestCase):
+    '''
+    Items whose gradients do not determine the fit fail, the others are rated
+    '''
+
+    def testFlatGradient(self):
+        random = numpy.random.RandomState(7)
+        flat = [(255.0, 255.0, 255.0)] + [(128.0, 128.0, 128.0)] * 10 + [(0.0, 0.0, 0.0)]
+        gradients = [synthesizeGradient(random), flat, synthesizeGradient(random)]
+
+        results = rateFilterBatch([(120.0, 120.0, 120.0)] * 3, [1.0] * 3, [60.0] * 3, [1.5] * 3,
+                                  [BCGradient] * 3, gradients, '')
+
+        self.assertEqual([exitcode for bccResult, exitcode in results],
+                         [ExitCode.Success, ExitCode.BCCComputationError, ExitCode.Success])
+        self.assertTrue(results[1][0] is None)
+
+    def testDegenerateRows(self):
+        x = numpy.array([[128.0] * 10,
+                         numpy.linspace(50, 200, 10).tolist()])
+
+        fitted, chi, converged = fitExpmodRows(x, BCGradient)
+
+        # a flat gradient, and a gradient lightening as the loading grows (c > 0)
+        self.assertFalse(converged.any())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+'''
+Tests of the window the bcFilter is searched in, predicted from the card
+layout (refer BCFilterDetector.predictWindow), and of the measurement of the
+layout of a detected bcFilter (refer BCFilterDetector.measureLayout), on
+synthesized cards.
+
+Run from src: python -m unittest IANATests.TestBCFilterDetector
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import math
+import numpy
+import unittest
+import PIL.Image as Image
+import PIL.ImageDraw as ImageDraw
+
+from IANASteps.Geometry.Point import Point
+from IANASteps.Geometry.PointArray import PointArray
+from IANASteps.QRDetector.QR import QR
+from IANASteps.StageDetector.StageDetector import detectStage, detectFilterDock
+from IANASteps.ImageTransformer.ImageTransformer import transform
+from IANASteps.BCFilterDetector.BCFilterDetector import predictWindow, measureLayout
+from IANASettings.Settings import ExitCode, FilterLayoutConstants
+
+def synthesizeCard(size, origin, side, rotation, layout):
+    ''' Draws a card with its QR code at origin, side pixels wide and rotated by
+        rotation degrees, and the filter at layout
+
+    Keyword Arguments:
+    layout -- (CenterU, CenterV, Radius) of the filter in QR units, refer FilterLayoutConstants
+
+    Returns:
+    the card as a PIL.Image, its QR
+    '''
+    angle = math.radians(rotation)
+    across = Point((side * math.cos(angle), side * math.sin(angle)))
+    down = Point((-side * math.sin(angle), side * math.cos(angle)))
+    topLeft = Point(origin)
+
+    # bottomLeft, topLeft, topRight finder patterns and the alignment pattern, as FindQRCode.jar reports them
+    qr = QR('1', [topLeft + down, topLeft, topLeft + across, topLeft + across * 0.85 + down * 0.85])
+
+    # QR units are the sides of the QR code's corners, not the distances of its finder patterns
+    corners = PointArray([qr.topLeft, qr.topRight, qr.bottomLeft, qr.bottomRight])
+    center = corners.bilinear([layout[:2]])[0]
+    radius = layout[2] * ((qr.topRight - qr.topLeft).distance() + (qr.bottomLeft - qr.topLeft).distance()) / 2.0
+
+    card = Image.new('RGB', size, (0, 0, 0))
+    ImageDraw.Draw(card).ellipse((center[0] - radius, center[1] - radius,
+                                  center[0] + radius, center[1] + radius), fill=(255, 255, 255))
+    return card, qr
+
+def expectedLayout():
+    ''' Returns the layout of the filter FilterLayoutConstants expects
+    '''
+    return (FilterLayoutConstants.CenterU, FilterLayoutConstants.CenterV, FilterLayoutConstants.Radius)
+
+def offsetLayouts(fraction):
+    ''' Returns the layouts of filters off the expected layout by fraction of
+        FilterLayoutConstants.CenterTolerance and RadiusTolerance, in every direction
+    '''
+    u, v, radius = expectedLayout()
+    offset = fraction * FilterLayoutConstants.CenterTolerance / math.sqrt(2)
+
+    layouts = []
+    for du in (-offset, offset):
+        for dv in (-offset, offset):
+            for scale in (1 - fraction * FilterLayoutConstants.RadiusTolerance,
+                          1 + fraction * FilterLayoutConstants.RadiusTolerance):
+                layouts.append((u + du, v + dv, radius * scale))
+    return layouts
+
+def filterBox(corrected):
+    ''' Returns the bounding box of the (white) filter in the corrected image
+    '''
+    rows, columns = numpy.nonzero(numpy.asarray(corrected.convert('L')) > 128)
+    return columns.min(), rows.min(), columns.max() + 1, rows.max() + 1
+
+def correct(card, qr, filterDock):
+    ''' Returns the region of the card the filter is detected in, and the card
+        corrected with it
+    '''
+    if filterDock:
+        region, exitcode = detectFilterDock(qr, '')
+    else:
+        region, exitcode = detectStage(qr, '')
+    if exitcode is not ExitCode.Success:
+        return None, None
+
+    corrected, exitcode = transform(card, region, '')
+    if exitcode is not ExitCode.Success:
+        return None, None
+
+    return region, corrected
+
+class TestPredictWindow(unittest.TestCase):
+    '''
+    The predicted window holds every filter within the tolerances of the expected
+    layout, with the radius of the filter in the predicted range
+    '''
+
+    def windowHoldsFilter(self, layout, rotation, filterDock):
+        card, qr = synthesizeCard((1400, 1800), (700, 200), 300, rotation, layout)
+        region, corrected = correct(card, qr, filterDock)
+        self.assertTrue(region is not None)
+
+        window = predictWindow(region, corrected.size)
+        self.assertTrue(window is not None)
+
+        left, top, right, bottom = filterBox(corrected)
+        radius = (right - left + bottom - top) / 4.0
+
+        return (window.box[0] <= left and window.box[1] <= top and
+                right <= window.box[2] and bottom <= window.box[3] and
+                window.minimumRadius <= radius <= window.maximumRadius)
+
+    def testStage(self):
+        for rotation in (0, 4, -4):
+            for layout in offsetLayouts(0.8):
+                self.assertTrue(self.windowHoldsFilter(layout, rotation, False),
+                                'filter at {0} rotated by {1}'.format(layout, rotation))
+
+    def testFilterDock(self):
+        for rotation in (0, 4, -4):
+            for layout in offsetLayouts(0.8):
+                self.assertTrue(self.windowHoldsFilter(layout, rotation, True),
+                                'filter at {0} rotated by {1}'.format(layout, rotation))
+
+    def testOutsideTolerance(self):
+        # filters well off the expected layout are not predicted, the window is not the whole image
+        for layout in offsetLayouts(2.0):
+            self.assertFalse(self.windowHoldsFilter(layout, 0, False), 'filter at {0}'.format(layout))
+
+class TestMeasureLayout(unittest.TestCase):
+    '''
+    measureLayout recovers the layout of filters drawn anywhere on the filter dock,
+    independently of FilterLayoutConstants
+    '''
+
+    def testMeasureLayout(self):
+        for layout in ((0.0, 3.0, 0.5), (0.6, 3.4, 0.9), (-0.5, 3.2, 0.7)):
+            for rotation in (0, 4, -4):
+                for filterDock in (False, True):
+                    card, qr = synthesizeCard((1400, 1800), (700, 200), 300, rotation, layout)
+                    region, corrected = correct(card, qr, filterDock)
+
+                    left, top, right, bottom = filterBox(corrected)
+                    measured = measureLayout(region, corrected.size, ((left + right) / 2.0, (top + bottom) / 2.0),
+                                             (right - left + bottom - top) / 4.0)
+
+                    for value, expected in zip(measured, layout):
+                        self.assertAlmostEqual(value, expected, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+'''
+Tests of IANA.FeatureExtractor run the way IANAFramework.preProcessDataItem
+runs it: with a debug image whose rendering is deferred and a seeded state.
+
+Run from src: python -m unittest IANATests.TestFeatureExtractor
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import logging
+import StringIO
+import unittest
+import PIL.Image as Image
+
+from IANA import Pipeline
+from IANA.Pipeline import pipeline, DebugOutputs
+from IANA.FeatureExtractor import featureExtractor
+from IANAUtil.DebugImage import DebugImage
+from IANAUtil.ImageContext import ImageContext
+from IANASteps.Geometry.Point import Point
+from IANASteps.QRDetector.QR import QR
+from IANASteps.Calibrator.GrayBar import GrayBar
+from IANASteps.StageDetector.Stage import Stage
+from IANASteps.BCFilterDetector.BCFilter import BCFilter
+from IANASettings.Settings import ExitCode, BCFilterDetectorConstants, DebugImageConstants
+
+class TestLazyBands(unittest.TestCase):
+    '''
+    The bcFilters are detected lazily, band by band, even when the debug
+    overlays are recorded
+    '''
+
+    def setUp(self):
+        self.detectBand = Pipeline.detectBand
+        self.lazyBands = BCFilterDetectorConstants.LazyBands
+        self.policy = DebugImageConstants.Policy
+
+        # every band holds a bcFilter, so only the first band evaluated is needed
+        self.detected = []
+        def detectBand(band, configuration, window, parenttags=None, level=logging.ERROR):
+            self.detected.append(band)
+            return [BCFilter(200, 200, 50)], ExitCode.Success
+
+        Pipeline.detectBand = detectBand
+        BCFilterDetectorConstants.LazyBands = True
+        DebugImageConstants.Policy = 'failures'
+
+    def tearDown(self):
+        Pipeline.detectBand = self.detectBand
+        BCFilterDetectorConstants.LazyBands = self.lazyBands
+        DebugImageConstants.Policy = self.policy
+
+    def testPlan(self):
+        seeded = {'context': None, 'configuration': None, 'debugImage': None}
+        steps = [step.name for step in pipeline.plan(['sampledRGB', 'qr', 'gradient'] + DebugOutputs, seeded)]
+
+        self.assertTrue('select_band' in steps)
+        self.assertTrue(steps.index('select_band') < steps.index('draw_bcfilters'))
+
+    def testFeatureExtractor(self):
+        image = Image.new('RGB', (400, 400), (128, 128, 128))
+        data = StringIO.StringIO()
+        image.save(data, 'PNG')
+
+        # the values before the bcFilter detection, as they would be detected in the image
+        state = {'qr': QR('1', [Point((100, 300)), Point((100, 100)), Point((300, 100)), Point((280, 280))]),
+                 'gradient': [(128.0, 128.0, 128.0)] * 12,
+                 'grayBars': [GrayBar(Point((20 + 10 * i, 20))) for i in range(12)],
+                 'region': Stage(Point((0, 0)), Point((0, 400)), Point((400, 400)), Point((400, 0))),
+                 'patched': image,
+                 'transformed': image,
+                 'houghImage': image,
+                 'houghWindow': None}
+
+        created = []
+        def newDebugImage():
+            created.append(True)
+
+        debugImage = DebugImage()
+        features, exitcode = featureExtractor(ImageContext(data.getvalue()), 1, newDebugImage, None, '', logging.ERROR, debugImage, state)
+
+        self.assertEqual(exitcode, ExitCode.Success)
+        self.assertEqual(len(self.detected), 1)
+        self.assertEqual([len(bcFilters) for bcFilters in state['bcFiltersPerBand']], [0, 0, 1])
+        self.assertTrue(state['drawnBCFilters'])
+        # deferred by the policy, only the overlays are recorded
+        self.assertFalse(created)
+        self.assertFalse(debugImage.rendered)
+
+if __name__ == '__main__':
+    unittest.main()
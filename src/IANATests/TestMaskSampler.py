@@ -0,0 +1,111 @@
+'''
+Tests of the circular and annular masks (refer IANAUtil.MaskSampler) against
+the distances of the pixels to the center, and of the statistics sampled
+through them.
+
+Run from src: python -m unittest IANATests.TestMaskSampler
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+import unittest
+import PIL.Image as Image
+
+from IANAUtil.MaskSampler import getMask, maskedPixels, sampleCircle
+
+def synthesizeImage(size, seed):
+    ''' Returns an RGB image of random pixels
+    '''
+    pixels = numpy.random.RandomState(seed).randint(0, 256, (size[1], size[0], 3)).astype(numpy.uint8)
+    return Image.fromarray(pixels, 'RGB')
+
+def insidePixels(image, center, radius, innerRadius=0):
+    ''' Returns the pixels of the image whose distance to center is within
+        radius and not within innerRadius, one by one
+    '''
+    pixels = numpy.asarray(image)
+    inside = []
+    for y in range(pixels.shape[0]):
+        for x in range(pixels.shape[1]):
+            distance = (x - center[0]) ** 2 + (y - center[1]) ** 2
+            if distance <= radius * radius and not (innerRadius > 0 and distance <= innerRadius * innerRadius):
+                inside.append(pixels[y, x])
+
+    return numpy.array(inside, dtype=numpy.float64)
+
+class TestMask(unittest.TestCase):
+    '''
+    The masks hold the pixels within radius, and not within innerRadius, of
+    their center
+    '''
+
+    def testDisc(self):
+        for radius in (0, 1, 4, 9):
+            mask = getMask(radius)
+            self.assertEqual(mask.shape, (2 * radius + 1, 2 * radius + 1))
+            for y in range(-radius, radius + 1):
+                for x in range(-radius, radius + 1):
+                    self.assertEqual(mask[y + radius, x + radius], x * x + y * y <= radius * radius)
+
+    def testAnnulus(self):
+        for radius, innerRadius in ((4, 2), (9, 8), (9, 1)):
+            mask = getMask(radius, innerRadius)
+            for y in range(-radius, radius + 1):
+                for x in range(-radius, radius + 1):
+                    distance = x * x + y * y
+                    self.assertEqual(mask[y + radius, x + radius],
+                                     distance <= radius * radius and distance > innerRadius * innerRadius)
+
+    def testEmptyAnnulus(self):
+        self.assertFalse(getMask(5, 5).any())
+
+class TestSampleCircle(unittest.TestCase):
+    '''
+    The statistics of sampleCircle are those of the pixels inside the circle
+    (or annulus), the parts of it outside the image left out
+    '''
+
+    def setUp(self):
+        self.image = synthesizeImage((40, 30), 1)
+
+    def assertClose(self, first, second):
+        self.assertEqual(len(first), len(second))
+        for a, b in zip(first, second):
+            self.assertTrue(abs(a - b) < 1e-6, '{0} and {1} differ'.format(first, second))
+
+    def testStatistics(self):
+        for center, radius, innerRadius in (((20, 15), 6, 0),
+                                            ((20, 15), 9, 4),
+                                            ((2, 3), 7, 0),
+                                            ((38, 28), 8, 3)):
+            expected = insidePixels(self.image, center, radius, innerRadius)
+            sample = sampleCircle(self.image, center, radius, innerRadius)
+
+            self.assertEqual(sample.count, len(expected))
+            self.assertClose(sample.mean, expected.mean(axis=0).tolist())
+            self.assertClose(sample.median(), numpy.median(expected, axis=0).tolist())
+            self.assertClose(sample.spread(), expected.std(axis=0).tolist())
+
+    def testTrimmedMean(self):
+        sample = sampleCircle(self.image, (20, 15), 9, 4)
+        self.assertEqual(sample.trimmedMean(0), sample.mean)
+
+        expected = numpy.sort(insidePixels(self.image, (20, 15), 9, 4), axis=0)
+        trim = int(len(expected) * 0.1)
+        self.assertClose(sample.trimmedMean(0.1), expected[trim:len(expected) - trim].mean(axis=0).tolist())
+
+    def testClipped(self):
+        pixels, mask = maskedPixels(self.image, (0, 0), 5)
+        self.assertEqual(pixels.shape[:2], (6, 6))
+        self.assertEqual(mask.shape, (6, 6))
+
+    def testNoPixels(self):
+        self.assertRaises(ValueError, sampleCircle, self.image, (20, 15), 5, 5)
+        self.assertRaises(ValueError, sampleCircle, self.image, (20, 15), 5.2, 4.9)
+        self.assertRaises(ValueError, sampleCircle, self.image, (60, 50), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+'''
+Tests of the coarse-to-fine QR detection (refer QRDetector.detectCoarseToFine)
+against the full resolution detection, on synthesized QR symbols.
+
+FindQRCode.jar is stood in for by QRLocator.locateQR at full resolution, which
+reports the points the jar does (bottomLeft, topLeft, topRight, alignment) from
+the pixels of the image it is handed, so neither a JVM nor a decodable payload
+is needed.
+
+Run from src: python -m unittest IANATests.TestQRDetector
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+import unittest
+import StringIO
+import PIL.Image as Image
+
+import IANASteps.QRDetector.QRDetector as QRDetector
+from IANAUtil.ImageContext import ImageContext
+from IANASteps.QRDetector.QR import QR
+from IANASettings.Settings import ExitCode, QRDetectorConstants
+
+##
+# Modules per side of a version 2 QR symbol
+Modules = 25
+
+def synthesizeSymbol(seed):
+    ''' Returns the modules of a version 2 QR symbol, with random data modules,
+        as a 2d boolean numpy array (True for dark)
+    '''
+    modules = numpy.random.RandomState(seed).rand(Modules, Modules) > 0.5
+
+    # finder patterns and their separators
+    for left, top in ((0, 0), (Modules - 7, 0), (0, Modules - 7)):
+        modules[max(top - 1, 0):top + 8, max(left - 1, 0):left + 8] = False
+        modules[top:top + 7, left:left + 7] = True
+        modules[top + 1:top + 6, left + 1:left + 6] = False
+        modules[top + 2:top + 5, left + 2:left + 5] = True
+
+    # timing patterns
+    modules[6, 8:Modules - 8] = numpy.arange(8, Modules - 8) % 2 == 0
+    modules[8:Modules - 8, 6] = numpy.arange(8, Modules - 8) % 2 == 0
+
+    # alignment pattern, centered on module 18
+    modules[16:21, 16:21] = True
+    modules[17:20, 17:20] = False
+    modules[18, 18] = True
+
+    return modules
+
+def synthesizeCard(size, module, rotation, seed):
+    ''' Draws the symbol, module pixels per module and rotated by rotation degrees,
+        in the middle of a gray card
+
+    Returns:
+    the card as a PIL.Image
+    '''
+    modules = synthesizeSymbol(seed)
+
+    # a quiet zone of 4 modules
+    side = (Modules + 8) * module
+    symbol = numpy.ones((side, side), dtype=numpy.uint8) * 255
+    symbol[4 * module:(Modules + 4) * module, 4 * module:(Modules + 4) * module] = \
+        numpy.where(numpy.kron(modules, numpy.ones((module, module))) > 0, 0, 255)
+
+    symbol = Image.fromarray(symbol).convert('RGB').rotate(rotation, Image.BICUBIC, True)
+    mask = Image.new('L', (side, side), 255).rotate(rotation, Image.BICUBIC, True)
+
+    card = Image.new('RGB', size, (170, 165, 160))
+    card.paste(symbol, ((size[0] - symbol.size[0]) // 2, (size[1] - symbol.size[1]) // 2), mask)
+    return card
+
+def findQRCode(file_, data, parenttags=None):
+    ''' Stands in for QRDetector.runFindQRCode, refer the module documentation
+    '''
+    points = QRDetector.locateQR(Image.open(StringIO.StringIO(data)))
+    if points is None:
+        return 1, []
+
+    return 0, ['QR-Code: v=1'] + ['{0},{1}'.format(point[0], point[1]) for point in points]
+
+class TestCoarseToFine(unittest.TestCase):
+    '''
+    The QR refined from the thumbnail is within CoarseRotationTolerance and
+    CoarseSizeTolerance of the QR of the full resolution detection
+    '''
+
+    Constants = ('UseDaemon', 'UseCache', 'UseLocator', 'CoarseToFine', 'LocatorThumbnailSide')
+
+    def setUp(self):
+        self.constants = [getattr(QRDetectorConstants, name) for name in self.Constants]
+        self.runFindQRCode = QRDetector.runFindQRCode
+
+        QRDetectorConstants.UseDaemon = False
+        QRDetectorConstants.UseCache = False
+        QRDetectorConstants.UseLocator = False
+        QRDetectorConstants.CoarseToFine = False
+        # the stand-in for FindQRCode.jar works on every pixel it is handed
+        QRDetectorConstants.LocatorThumbnailSide = 1 << 16
+        QRDetector.runFindQRCode = findQRCode
+
+    def tearDown(self):
+        for name, value in zip(self.Constants, self.constants):
+            setattr(QRDetectorConstants, name, value)
+        QRDetector.runFindQRCode = self.runFindQRCode
+
+    def assertAgree(self, fine, full):
+        rotation = abs(fine.rotation - full.rotation) % 360
+        rotation = min(rotation, 360 - rotation)
+        self.assertTrue(rotation <= QRDetectorConstants.CoarseRotationTolerance,
+                        '{0} and {1} differ by {2} degrees'.format(fine, full, rotation))
+        self.assertTrue(abs(fine.width / full.width - 1) <= QRDetectorConstants.CoarseSizeTolerance,
+                        '{0} and {1} differ in width'.format(fine, full))
+        self.assertTrue(abs(fine.height / full.height - 1) <= QRDetectorConstants.CoarseSizeTolerance,
+                        '{0} and {1} differ in height'.format(fine, full))
+
+    def testAgreesWithFullResolution(self):
+        for seed, rotation in enumerate((0, 3, -7, 20)):
+            card = synthesizeCard((2600, 1900), 16, rotation, seed)
+            self.assertTrue(max(card.size) > QRDetectorConstants.CoarseSide)
+
+            data = StringIO.StringIO()
+            card.save(data, 'PNG')
+
+            full, exitcode = QRDetector.detectQR(ImageContext(data.getvalue()), '')
+            self.assertEqual(exitcode, ExitCode.Success)
+
+            # not through detectQR, which falls back to the full resolution detection
+            found = QRDetector.detectCoarseToFine(card, '')
+            self.assertTrue(found is not None, 'no coarse-to-fine QR at {0} degrees'.format(rotation))
+            aux, points, exitcode = found
+
+            self.assertEqual(aux, full.aux)
+            self.assertAgree(QR(aux, points), full)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+Tests of the statistics of boxes of an image (refer IANAUtil.RegionStatistics)
+against PIL.ImageStat.Stat of the crop of each box, for boxes inside, partly
+outside and wholly outside the image.
+
+Run from src: python -m unittest IANATests.TestRegionStatistics
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+import unittest
+import PIL.Image as Image
+import PIL.ImageStat as ImageStat
+
+from IANAUtil.RegionStatistics import RegionStatistics, trimmedMean, boundingBox
+
+##
+# Boxes of the 40x30 test image, the last ones partly or wholly outside it
+Boxes = [(0, 0, 40, 30),
+         (5, 7, 18, 21),
+         (39, 29, 40, 30),
+         (-6, -4, 10, 8),
+         (30, 20, 52, 41),
+         (-3, 10, 45, 12),
+         (50, 40, 60, 44)]
+
+def synthesizeImage(mode, seed):
+    ''' Returns a 40x30 image of random pixels
+    '''
+    bands = len(mode)
+    pixels = numpy.random.RandomState(seed).randint(0, 256, (30, 40, bands)).astype(numpy.uint8)
+    if bands == 1:
+        pixels = pixels[:, :, 0]
+
+    return Image.fromarray(pixels, mode)
+
+class TestMeans(unittest.TestCase):
+    '''
+    The means are those of PIL.ImageStat.Stat of the crop of the box, the parts
+    of the box outside the image counting as black pixels
+    '''
+
+    def assertClose(self, first, second, box):
+        self.assertEqual(len(first), len(second))
+        for a, b in zip(first, second):
+            self.assertTrue(abs(a - b) < 1e-6, '{0} and {1} differ for {2}'.format(first, second, box))
+
+    def testMeans(self):
+        for mode in ('RGB', 'L'):
+            image = synthesizeImage(mode, 1)
+
+            # one query over every box, and a query bounded by each box alone
+            means = RegionStatistics(image, boundingBox(Boxes)).means(Boxes)
+            for box, mean in zip(Boxes, means):
+                expected = ImageStat.Stat(image.crop(box)).mean
+                self.assertClose(mean, expected, box)
+                self.assertClose(RegionStatistics(image, box).mean(box), expected, box)
+
+    def testVariances(self):
+        image = synthesizeImage('RGB', 2)
+
+        variances = RegionStatistics(image, boundingBox(Boxes)).variances(Boxes)
+        for box, variance in zip(Boxes, variances):
+            self.assertClose(variance, ImageStat.Stat(image.crop(box)).var, box)
+
+    def testTrimmedMean(self):
+        image = synthesizeImage('RGB', 3)
+
+        for box in Boxes:
+            # nothing trimmed is the mean
+            self.assertClose(trimmedMean(image, box, 0), ImageStat.Stat(image.crop(box)).mean, box)
+
+            pixels = numpy.sort(numpy.asarray(image.crop(box)).reshape(-1, 3), axis=0)
+            trim = int(len(pixels) * 0.1)
+            expected = pixels[trim:len(pixels) - trim].mean(axis=0).tolist()
+            self.assertClose(trimmedMean(image, box, 0.1), expected, box)
+
+    def testEmptyBox(self):
+        image = synthesizeImage('RGB', 4)
+
+        for box in ((5, 5, 5, 10), (5, 5, 10, 5), (10, 10, 5, 20)):
+            self.assertRaises(ValueError, RegionStatistics(image, (0, 0, 40, 30)).mean, box)
+            self.assertRaises(ValueError, trimmedMean, image, box, 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+'''
+The ChartWorker Module renders the charts of the BCC results away from the
+computation of the results: the inputs of a chart (the fits, the gradients,
+the sample and the configuration) are stored with the result as json, and the
+PNG is rendered later, in batches by a pool of low priority processes or on
+demand when the chart is first requested.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import os
+import json
+import StringIO
+import threading
+import multiprocessing
+
+from IANAUtil.Chart import plotChart
+from IANASteps.BCCCalculator.BCCResult import BCCResult
+from IANASettings.Settings import ChartConstants
+
+class ChartInputs:
+    '''
+    Everything IANAUtil.Chart.plotChart draws, in a form that can be stored
+    as json and sent to another process
+    '''
+
+    def __init__(self, filterRadius, exposedTime, airFlowRate, bcGradient, gradient, bccResult, sampledRGB):
+        ''' Constructor, refer IANAUtil.Chart.plotChart for the arguments
+
+        Keyword Arguments:
+        bccResult -- a BCCCalculator.BCCResult or a dict of its fitted values
+        '''
+        self.filterRadius = filterRadius
+        self.exposedTime = exposedTime
+        self.airFlowRate = airFlowRate
+        self.bcGradient = [float(value) for value in bcGradient]
+        self.gradient = [[float(value) for value in color] for color in gradient]
+        self.sampledRGB = [float(value) for value in sampledRGB]
+
+        if isinstance(bccResult, dict):
+            self.fits = bccResult
+        else:
+            self.fits = {}
+            for band in ('Red', 'Green', 'Blue'):
+                self.fits['fit' + band] = [float(value) for value in getattr(bccResult, 'fit' + band)]
+                self.fits['BCArea' + band] = float(getattr(bccResult, 'BCArea' + band))
+                self.fits['BCVol' + band] = float(getattr(bccResult, 'BCVol' + band))
+
+    def bccResult(self):
+        ''' Returns a BCCResult with the fitted values plotChart reads
+        '''
+        bccResult = BCCResult()
+        for name, value in self.fits.items():
+            setattr(bccResult, str(name), value)
+
+        return bccResult
+
+    def render(self):
+        ''' Renders the chart
+
+        Returns:
+        str -- the PNG
+        '''
+        png = StringIO.StringIO()
+        plotChart(self.filterRadius, self.exposedTime, self.airFlowRate, self.bcGradient,
+                  self.gradient, self.bccResult(), self.sampledRGB, png)
+
+        return png.getvalue()
+
+    def toJSON(self):
+        ''' Returns the inputs as a json string
+        '''
+        return json.dumps({'filterRadius': self.filterRadius,
+                           'exposedTime': self.exposedTime,
+                           'airFlowRate': self.airFlowRate,
+                           'bcGradient': self.bcGradient,
+                           'gradient': self.gradient,
+                           'sampledRGB': self.sampledRGB,
+                           'fits': self.fits})
+
+    @classmethod
+    def fromJSON(cls, string):
+        ''' Returns the ChartInputs stored in the json string
+        '''
+        inputs = json.loads(string)
+
+        return cls(inputs['filterRadius'], inputs['exposedTime'], inputs['airFlowRate'],
+                   inputs['bcGradient'], inputs['gradient'], inputs['fits'], inputs['sampledRGB'])
+
+def lowerPriority():
+    ''' Initializes a worker process of the pool, so that rendering charts does
+        not take the cpu from the analysis of the images
+    '''
+    try:
+        os.nice(ChartConstants.Niceness)
+    except OSError:
+        pass
+
+def renderJSON(string):
+    ''' Renders the chart of the ChartInputs json string in a worker process
+
+    Returns:
+    (PNG str, None) or (None, the error message) if the chart could not be rendered
+    '''
+    try:
+        return ChartInputs.fromJSON(string).render(), None
+    except Exception, err:
+        return None, str(err)
+
+class ChartWorker:
+    '''
+    A pool of ChartConstants.Workers low priority processes rendering charts
+    ChartConstants.BatchSize at a time. The pool is only started with the
+    first batch.
+    '''
+
+    def __init__(self, workers=None):
+        ''' Constructor
+
+        Keyword Arguments:
+        workers -- the number of processes, ChartConstants.Workers if None
+        '''
+        self.workers = workers or ChartConstants.Workers
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        ''' Returns the pool, starting it if needed
+        '''
+        with self.lock:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.workers, lowerPriority)
+            return self.pool
+
+    def render(self, inputs):
+        ''' Renders the charts of a list of ChartInputs json strings
+
+        Keyword Arguments:
+        inputs -- a list of json strings, refer ChartInputs.toJSON
+
+        Returns:
+        a list of (PNG str, None) or (None, the error message), in the order of inputs
+        '''
+        pool = self.start()
+
+        rendered = []
+        for start in range(0, len(inputs), ChartConstants.BatchSize):
+            batch = inputs[start:start + ChartConstants.BatchSize]
+            rendered.extend(pool.map(renderJSON, batch))
+
+        return rendered
+
+    def close(self):
+        ''' Stops the processes of the pool once the pending charts are rendered
+        '''
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+##
+# The ChartWorker shared by every item of this process
+_chartWorker = ChartWorker()
+
+def getChartWorker():
+    ''' Returns the process wide ChartWorker
+    '''
+    return _chartWorker
@@ -0,0 +1,185 @@
+'''
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import json
+import random
+import logging
+import PIL.ImageDraw as ImageDraw
+import PIL.ImageFont as ImageFont
+
+from Logging.Logger import getLog
+from IANASteps.Geometry.Point import Point
+from IANASteps.StageDetector.Stage import Stage
+from IANASteps.ImageTransformer.ImageTransformer import transform
+from IANASettings.Settings import ExitCode, MainConstants, DebugImageConstants
+
+log = getLog("DebugImage")
+log.setLevel(logging.ERROR)
+
+class DrawingRecorder:
+    '''
+    Stands in for a PIL.ImageDraw.Draw instance: records the line, rectangle,
+    ellipse, polygon and text calls made on it so that they can be replayed
+    on a real drawing later, if the debug image is ever rendered.
+    '''
+
+    def __init__(self, operations=None):
+        ''' Constructor
+
+        Keyword Arguments:
+        operations -- previously recorded operations
+        '''
+        self.operations = operations or []
+
+    def record(self, name, xy, **options):
+        ''' Records a drawing operation, flattening the coordinates
+        '''
+        coordinates = []
+        for item in xy:
+            if hasattr(item, '__getitem__'):
+                coordinates.extend([float(c) for c in item])
+            else:
+                coordinates.append(float(item))
+
+        self.operations.append([name, coordinates, options])
+
+    def line(self, xy, fill=None):
+        self.record('line', xy, fill=fill)
+
+    def rectangle(self, xy, fill=None, outline=None):
+        self.record('rectangle', xy, fill=fill, outline=outline)
+
+    def ellipse(self, xy, fill=None, outline=None):
+        self.record('ellipse', xy, fill=fill, outline=outline)
+
+    def polygon(self, xy, fill=None, outline=None):
+        self.record('polygon', xy, fill=fill, outline=outline)
+
+    def text(self, xy, text, fill=None, font=None):
+        self.record('text', xy, text=text, fill=fill)
+
+    def replay(self, drawing, font):
+        ''' Replays the recorded operations
+
+        Keyword Arguments:
+        drawing -- a PIL.ImageDraw.Draw instance
+        font    -- the font for text operations
+        '''
+        for name, coordinates, options in self.operations:
+            options = dict([(str(key), value) for key, value in options.items()])
+            if name == 'text':
+                drawing.text(tuple(coordinates), options.pop('text'), font=font, **options)
+            else:
+                getattr(drawing, name)(coordinates, **options)
+
+class DebugImage:
+    '''
+    The overlays (QR quad, gray bars, circles, labels) of a debug image, recorded
+    while the image is analyzed and only rendered when someone asks for it or
+    when DebugImageConstants.Policy says so.
+
+    Overlays are recorded in two layers: source is drawn on the uploaded image,
+    transformed on the image after the skew correction using stage.
+    '''
+
+    def __init__(self):
+        ''' Constructor
+        '''
+        self.source = DrawingRecorder()
+        self.transformed = DrawingRecorder()
+        self.stage = None
+        self.failed = False
+        self.rendered = False
+        # the error the rendering failed with, if it did
+        self.renderError = None
+
+    def transform(self, stage):
+        ''' Records the skew correction, later overlays are drawn on the transformed image
+
+        Keyword Arguments:
+        stage -- the StageDetector.Stage (or FilterDock) the image is transformed with
+
+        Returns:
+        the DrawingRecorder of the transformed layer
+        '''
+        self.stage = stage
+        return self.transformed
+
+    def shouldRender(self):
+        ''' Applies DebugImageConstants.Policy
+
+        Returns:
+        True if the debug image should be rendered now
+        '''
+        policy = DebugImageConstants.Policy
+        if policy == 'always':
+            return True
+        if policy == 'failures':
+            return self.failed
+        if policy == 'sampled':
+            return self.failed or random.random() < DebugImageConstants.SampleRate
+        return False
+
+    def render(self, image, parenttags=None, level=logging.ERROR):
+        ''' Renders the debug image. A rendering that fails is logged and not
+            attempted again from the recorded overlays (refer renderError)
+
+        Keyword Arguments:
+        image      -- the uploaded PIL.Image, it is not modified
+        parenttags -- tag string of the calling function
+        level      -- the logging level
+
+        Returns:
+        PIL.Image, with the overlays drawn before the failure if the rendering failed
+        '''
+        debugImage = image.copy()
+        try:
+            try:
+                font = ImageFont.truetype(MainConstants.fontfile, 45)
+                self.source.replay(ImageDraw.Draw(debugImage), font)
+
+                if self.stage is not None:
+                    transformed, exitcode = transform(debugImage, self.stage, parenttags, level)
+                    if exitcode is not ExitCode.Success:
+                        return debugImage
+
+                    debugImage = transformed
+                    self.transformed.replay(ImageDraw.Draw(debugImage), font)
+            except Exception, err:
+                self.renderError = str(err)
+                log.error('Could not render the debug image: ' + self.renderError, extra=parenttags)
+        finally:
+            self.rendered = True
+
+        return debugImage
+
+    def toJSON(self):
+        ''' Returns the recorded overlays as a json string
+        '''
+        stage = None
+        if self.stage is not None:
+            stage = [list(self.stage.topLeft), list(self.stage.bottomLeft),
+                     list(self.stage.bottomRight), list(self.stage.topRight)]
+
+        return json.dumps({'source': self.source.operations,
+                           'transformed': self.transformed.operations,
+                           'stage': stage,
+                           'failed': self.failed})
+
+    @classmethod
+    def fromJSON(cls, string):
+        ''' Returns the DebugImage recorded in the json string
+        '''
+        overlays = json.loads(string)
+
+        debugImage = cls()
+        debugImage.source = DrawingRecorder(overlays['source'])
+        debugImage.transformed = DrawingRecorder(overlays['transformed'])
+        debugImage.failed = overlays['failed']
+        if overlays['stage'] is not None:
+            debugImage.stage = Stage(*[Point(point) for point in overlays['stage']])
+
+        return debugImage
@@ -0,0 +1,82 @@
+'''
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import StringIO
+import PIL.Image as Image
+
+class ImageContext:
+    '''
+    Holds an uploaded image for the duration of its analysis: the encoded
+    bytes are read once (from a file name, a file or a GridFS file) and kept
+    as an immutable buffer, and the image is decoded lazily, at most once.
+
+    Every step of the analysis shares the same ImageContext instead of
+    re-reading the upload or decoding it again.
+
+    NOTE: The decoded image is shared, steps that draw on it must copy it first.
+    '''
+
+    def __init__(self, data):
+        ''' Constructor
+
+        Keyword Arguments:
+        data -- The encoded image (str)
+        '''
+
+        self.data = data
+        self.decoded = None
+        self.header = None
+
+    @classmethod
+    def open(cls, imagefile):
+        ''' Reads imagefile into an ImageContext
+
+        Keyword Arguments:
+        imagefile -- A file name, a file object or an ImageContext
+
+        Returns:
+        ImageContext
+        '''
+
+        if isinstance(imagefile, ImageContext):
+            return imagefile
+
+        if isinstance(imagefile, str):
+            imagefile_ = open(imagefile, 'rb')
+            try:
+                return cls(imagefile_.read())
+            finally:
+                imagefile_.close()
+
+        return cls(imagefile.read())
+
+    def file(self):
+        ''' Returns a new file object reading the encoded image
+        '''
+        return StringIO.StringIO(self.data)
+
+    def size(self):
+        ''' Returns the (width, height) of the image, read from the
+            header without decoding the image.
+        '''
+        if self.decoded is not None:
+            return self.decoded.size
+
+        if self.header is None:
+            self.header = Image.open(self.file())
+
+        return self.header.size
+
+    def image(self):
+        ''' Returns the decoded PIL.Image, decoding it on first use
+        '''
+        if self.decoded is None:
+            image = Image.open(self.file())
+            image.load()
+            self.decoded = image
+            self.header = None
+
+        return self.decoded
@@ -0,0 +1,61 @@
+'''
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import threading
+
+class LRUCache:
+    '''
+    A thread safe mapping holding at most capacity entries, the least recently
+    used entry is dropped to make room for a new one.
+    '''
+
+    def __init__(self, capacity):
+        ''' Constructor
+
+        Keyword Arguments:
+        capacity -- the largest number of entries kept
+        '''
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.entries = {}
+        # keys, least recently used first
+        self.order = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        ''' Returns the entry of key, default if there is none
+        '''
+        self.lock.acquire()
+        try:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self.order.remove(key)
+            self.order.append(key)
+            return self.entries[key]
+        finally:
+            self.lock.release()
+
+    def put(self, key, value):
+        ''' Sets the entry of key, dropping the least recently used entry if the cache is full
+        '''
+        self.lock.acquire()
+        try:
+            if key in self.entries:
+                self.order.remove(key)
+            elif len(self.entries) >= self.capacity:
+                del self.entries[self.order.pop(0)]
+
+            self.entries[key] = value
+            self.order.append(key)
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.entries)
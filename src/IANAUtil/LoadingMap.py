@@ -0,0 +1,152 @@
+'''
+The LoadingMap Module converts every pixel of the filter spot to black carbon
+loading (ug/cm^2) with the fitted curves of a BCCResult (refer
+BCCResult.lookupTables) and summarizes it: the mean, median and percentiles of
+the loading, how unevenly it is spread over the filter, and a downsampled
+heatmap.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import json
+import numpy
+
+from IANASettings.Settings import LoadingMapConstants, MainConstants
+
+class FilterPixels:
+    '''
+    The pixels of the filter spot, kept in memory from the preprocessing to the
+    computation of the result of an item
+    '''
+
+    def __init__(self, pixels, mask):
+        ''' Constructor
+
+        Keyword Arguments:
+        pixels -- h x w x 3 uint8 array of the square bounding the filter
+        mask   -- h x w boolean array, True inside the filter
+        '''
+        self.pixels = pixels
+        self.mask = mask
+
+class LoadingMap:
+    '''
+    The statistics of the per pixel loading of a filter, per band.
+
+    The loading of a pixel only depends on its (8 bit) intensity, so the mean,
+    median and percentiles are computed from the histogram of the intensities
+    and the lookup tables of the fits, rather than from every pixel; the
+    median and percentiles are nearest rank.
+    '''
+
+    def __init__(self, tables, pixels, mask):
+        ''' Constructor
+
+        Keyword Arguments:
+        tables -- 3 x 256 lookup tables of the loading of each intensity, refer BCCResult.lookupTables
+        pixels -- h x w x 3 uint8 array
+        mask   -- h x w boolean array of the pixels of the filter
+        '''
+        self.count = int(mask.sum())
+        if self.count == 0:
+            raise ValueError('No pixels in the filter')
+
+        self.mean = []
+        self.median = []
+        self.percentiles = {}
+        for percentile in LoadingMapConstants.Percentiles:
+            self.percentiles[str(percentile)] = []
+
+        for band in range(3):
+            histogram = numpy.bincount(pixels[:, :, band][mask], minlength=256)
+            table = tables[band]
+
+            # the intensities by increasing loading
+            order = numpy.argsort(table, kind='mergesort')
+            values = table[order]
+            cumulative = histogram[order].cumsum()
+
+            def quantile(fraction):
+                rank = int(round(fraction * (self.count - 1)))
+                return float(values[numpy.searchsorted(cumulative, rank, side='right')])
+
+            self.mean.append(float((histogram * table).sum() / self.count))
+            self.median.append(quantile(0.5))
+            for percentile in LoadingMapConstants.Percentiles:
+                self.percentiles[str(percentile)].append(quantile(percentile / 100.0))
+
+        self.heatmap = heatmap(tables, pixels, mask, LoadingMapConstants.HeatmapSide)
+
+        # the coefficient of variation of the cells of the heatmap: 0 for an evenly
+        # loaded filter, regardless of the noise of single pixels
+        self.nonUniformity = []
+        for band in range(3):
+            cells = self.heatmap[:, :, band]
+            cells = cells[numpy.isfinite(cells)]
+            mean = cells.mean() if cells.size else 0.0
+            if cells.size < 2 or mean == 0:
+                self.nonUniformity.append(0.0)
+            else:
+                self.nonUniformity.append(float(cells.std() / abs(mean)))
+
+    def toDict(self):
+        ''' Returns the statistics and the heatmap (bands x rows x columns, None
+            outside the filter) as a dict
+        '''
+        heatmap = []
+        for band in range(self.heatmap.shape[2]):
+            heatmap.append([[value if numpy.isfinite(value) else None for value in row]
+                            for row in self.heatmap[:, :, band].tolist()])
+
+        return {'bands': MainConstants.bandnames,
+                'count': self.count,
+                'mean': self.mean,
+                'median': self.median,
+                'percentiles': self.percentiles,
+                'nonUniformity': self.nonUniformity,
+                'heatmap': heatmap}
+
+    def toJSON(self):
+        return json.dumps(self.toDict())
+
+def heatmap(tables, pixels, mask, side):
+    ''' Returns the mean loading of the filter pixels in the cells of a grid of
+        at most side x side cells over the filter
+
+    Returns:
+    rows x columns x 3 array, NaN for the cells outside the filter
+    '''
+    height, width = mask.shape
+    cell = max(int(numpy.ceil(max(height, width) / float(side))), 1)
+    rows, columns = -(-height // cell), -(-width // cell)
+
+    # pad to whole cells, the padding is outside the mask
+    paddedMask = numpy.zeros((rows * cell, columns * cell))
+    paddedMask[:height, :width] = mask
+    counts = paddedMask.reshape(rows, cell, columns, cell).sum(axis=3).sum(axis=1)
+    inside = counts > 0
+
+    cells = numpy.empty((rows, columns, 3))
+    cells.fill(numpy.nan)
+    padded = numpy.zeros((rows * cell, columns * cell))
+    for band in range(3):
+        padded[:height, :width] = tables[band][pixels[:, :, band]]
+        padded *= paddedMask
+        sums = padded.reshape(rows, cell, columns, cell).sum(axis=3).sum(axis=1)
+        cells[:, :, band][inside] = sums[inside] / counts[inside]
+
+    return cells
+
+def computeLoadingMap(bccResult, filterPixels):
+    ''' Converts the filter pixels to loading with the fits of the bccResult
+
+    Keyword Arguments:
+    bccResult    -- BCCCalculator.BCCResult with its fits
+    filterPixels -- FilterPixels of the filter
+
+    Returns:
+    LoadingMap
+    '''
+    return LoadingMap(bccResult.lookupTables(), filterPixels.pixels, filterPixels.mask)
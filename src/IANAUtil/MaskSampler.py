@@ -0,0 +1,133 @@
+'''
+The MaskSampler Module samples the pixels of an image inside a circle (or an
+annulus), rather than inside the square bounding it.
+
+The boolean masks are built once per integer radius and kept in an LRU cache,
+so images analyzed at the same scale reuse them.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+
+from IANAUtil.LRUCache import LRUCache
+from IANAUtil.RegionStatistics import trimmedPixelMean
+from IANASettings.Settings import MainConstants
+
+##
+# (radius, innerRadius) -> mask, shared by every sampler of this process
+_masks = LRUCache(MainConstants.maskcachesize)
+
+def getMask(radius, innerRadius=0):
+    ''' Returns the mask of the pixels of a (2 * radius + 1) square whose center
+        is within radius, and not within innerRadius, of the center of the square
+
+    Keyword Arguments:
+    radius      -- the outer radius (int)
+    innerRadius -- the inner radius of an annulus (int), 0 for a disc
+
+    Returns:
+    2d boolean numpy array
+    '''
+    key = (radius, innerRadius)
+    mask = _masks.get(key)
+    if mask is None:
+        offsets = numpy.arange(-radius, radius + 1)
+        distances = offsets[:, None] ** 2 + offsets[None, :] ** 2
+        mask = distances <= radius * radius
+        if innerRadius > 0:
+            mask &= distances > innerRadius * innerRadius
+        _masks.put(key, mask)
+
+    return mask
+
+class MaskSample:
+    '''
+    The per band statistics of the pixels sampled through a mask; only the mean
+    is computed up front, the others (which sort the pixels) when asked for
+    '''
+
+    def __init__(self, pixels):
+        ''' Constructor
+
+        Keyword Arguments:
+        pixels -- n x bands numpy array of the sampled pixels, n > 0
+        '''
+        self.pixels = pixels
+        self.count = pixels.shape[0]
+        self.mean = pixels.mean(axis=0).tolist()
+
+    def median(self):
+        ''' Returns the per band median (list)
+        '''
+        return numpy.median(self.pixels, axis=0).tolist()
+
+    def spread(self):
+        ''' Returns the per band standard deviation (list)
+        '''
+        return self.pixels.std(axis=0).tolist()
+
+    def trimmedMean(self, fraction):
+        ''' Returns the per band mean (list) without the fraction of the darkest
+            and of the brightest pixels of each band, the mean if fraction is 0
+        '''
+        if not fraction:
+            return self.mean
+
+        return trimmedPixelMean(self.pixels, fraction)
+
+    def __str__(self):
+        return 'MaskSample: count:{0}, mean:{1}, median:{2}, spread:{3}'.format(self.count,
+                                                                                  self.mean,
+                                                                                  self.median(),
+                                                                                  self.spread())
+
+def maskedPixels(image, center, radius, innerRadius=0):
+    ''' Returns the pixels of the image in the square bounding the circle (or
+        annulus), and the mask of the ones inside it; the parts of the circle
+        outside the image are left out
+
+    Keyword Arguments:
+    image       -- a PIL.Image object
+    center      -- (x, y) of the circle
+    radius      -- the radius of the circle, rounded to the nearest pixel
+    innerRadius -- the inner radius of the annulus, 0 for the whole circle
+
+    Returns:
+    h x w x bands numpy array of the pixels, h x w boolean mask
+    '''
+    radius = int(round(radius))
+    innerRadius = int(round(innerRadius))
+    mask = getMask(radius, innerRadius)
+
+    x, y = int(round(center[0])), int(round(center[1]))
+    width, height = image.size
+
+    # the square of the mask, clipped to the image
+    left, top = max(x - radius, 0), max(y - radius, 0)
+    right, bottom = min(x + radius + 1, width), min(y + radius + 1, height)
+    if left >= right or top >= bottom:
+        raise ValueError('The circle at {0} is outside the image'.format(center))
+
+    pixels = numpy.asarray(image.crop((left, top, right, bottom)))
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+
+    mask = mask[top - (y - radius):bottom - (y - radius), left - (x - radius):right - (x - radius)]
+    return pixels, mask
+
+def sampleCircle(image, center, radius, innerRadius=0):
+    ''' Samples the pixels of the image inside the circle (or annulus), refer maskedPixels
+
+    Returns:
+    MaskSample
+    '''
+    pixels, mask = maskedPixels(image, center, radius, innerRadius)
+    if not mask.any():
+        raise ValueError('The circle at {0} of radius {1} (inner radius {2}) holds no pixels of the image'.format(center,
+                                                                                                             radius,
+                                                                                                             innerRadius))
+
+    return MaskSample(pixels[mask].astype(numpy.float64))
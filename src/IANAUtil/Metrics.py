@@ -0,0 +1,218 @@
+'''
+The Metrics Module keeps in-process counters and latency histograms for the
+stages of the image analysis (QR detection, Hough transform, rateFilter,
+plotChart, GridFS I/O, the IANAFramework phases, ...).
+
+Stages are timed with a context manager or a decorator:
+
+    with getMetrics().timer('qr'):
+        qr, exitcode = detectQR(...)
+
+    @getMetrics().timed('PPROC')
+    def preProcessDataItem(...):
+
+The metrics can be queried at runtime through Metrics.snapshot() and dumped to
+a local file in the Prometheus text format through Metrics.dump().
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from IANAUtil.Profile import getProfile, memoryUsage
+from IANASettings.Settings import MetricsConstants
+
+class Histogram:
+    '''
+    A cumulative latency histogram, in the Prometheus sense: counts[i] is the
+    number of observations less than or equal to buckets[i].
+    '''
+
+    def __init__(self, buckets):
+        ''' Constructor
+
+        Keyword Arguments:
+        buckets -- sorted upper bounds of the buckets in seconds
+        '''
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        ''' Adds an observation to the histogram
+        '''
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+class Timer:
+    '''
+    Context manager timing a stage, refer Metrics.timer. The time and the
+    memory are also recorded in the current IANAUtil.Profile, if any.
+    '''
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+        self.memory = None
+
+    def __enter__(self):
+        self.memory = memoryUsage()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        seconds = time.time() - self.start
+        self.metrics.observe(self.name, seconds)
+
+        profile = getProfile()
+        if profile is not None:
+            profile.record(self.name, seconds, self.memory)
+
+        if type is not None:
+            self.metrics.increment(self.name + '_errors')
+        return False
+
+class Metrics:
+    '''
+    A thread safe registry of counters and latency histograms
+    '''
+
+    def __init__(self, buckets):
+        ''' Constructor
+
+        Keyword Arguments:
+        buckets -- the upper bounds (seconds) of the histogram buckets
+        '''
+        self.buckets = sorted(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        ''' Drops all the recorded metrics
+        '''
+        self.lock.acquire()
+        try:
+            self.counters = {}
+            self.histograms = {}
+        finally:
+            self.lock.release()
+
+    def increment(self, name, value=1):
+        ''' Increments the counter name by value
+        '''
+        self.lock.acquire()
+        try:
+            self.counters[name] = self.counters.get(name, 0) + value
+        finally:
+            self.lock.release()
+
+    def observe(self, name, seconds):
+        ''' Records that the stage name took seconds
+        '''
+        self.lock.acquire()
+        try:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(self.buckets)
+            self.histograms[name].observe(seconds)
+        finally:
+            self.lock.release()
+
+    def timer(self, name):
+        ''' Returns a context manager recording the time spent in its block
+            in the histogram name; exceptions are counted in name_errors.
+        '''
+        return Timer(self, name)
+
+    def timed(self, name):
+        ''' Returns a decorator recording the time spent in the decorated
+            function in the histogram name.
+        '''
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                timer = self.timer(name)
+                timer.__enter__()
+                try:
+                    result = function(*args, **kwargs)
+                except:
+                    timer.__exit__(*sys.exc_info())
+                    raise
+                timer.__exit__(None, None, None)
+                return result
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        ''' Returns a copy of the recorded metrics
+
+        Returns:
+        dict - {'counters': {name: value},
+                'histograms': {name: {'buckets': [(bound, count)], 'count': n, 'sum': seconds}}}
+        '''
+        self.lock.acquire()
+        try:
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                histograms[name] = {'buckets': zip(histogram.buckets, histogram.counts),
+                                    'count': histogram.count,
+                                    'sum': histogram.sum}
+            return {'counters': dict(self.counters), 'histograms': histograms}
+        finally:
+            self.lock.release()
+
+    def toPrometheus(self):
+        ''' Returns the recorded metrics in the Prometheus text exposition format
+        '''
+        snapshot = self.snapshot()
+        prefix = MetricsConstants.Prefix
+        lines = []
+
+        lines.append('# HELP {0}_stage_seconds Time spent in each stage of the image analysis'.format(prefix))
+        lines.append('# TYPE {0}_stage_seconds histogram'.format(prefix))
+        for name in sorted(snapshot['histograms']):
+            histogram = snapshot['histograms'][name]
+            for bound, count in histogram['buckets']:
+                lines.append('{0}_stage_seconds_bucket{{stage="{1}",le="{2}"}} {3}'.format(prefix, name, bound, count))
+            lines.append('{0}_stage_seconds_bucket{{stage="{1}",le="+Inf"}} {2}'.format(prefix, name, histogram['count']))
+            lines.append('{0}_stage_seconds_sum{{stage="{1}"}} {2!r}'.format(prefix, name, histogram['sum']))
+            lines.append('{0}_stage_seconds_count{{stage="{1}"}} {2}'.format(prefix, name, histogram['count']))
+
+        lines.append('# HELP {0}_events_total Number of times each event occurred'.format(prefix))
+        lines.append('# TYPE {0}_events_total counter'.format(prefix))
+        for name in sorted(snapshot['counters']):
+            lines.append('{0}_events_total{{event="{1}"}} {2}'.format(prefix, name, snapshot['counters'][name]))
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, filename):
+        ''' Writes the metrics to filename in the Prometheus text format, the file
+            is replaced atomically so that it can be scraped at any time.
+        '''
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            os.write(fd, self.toPrometheus())
+        finally:
+            os.close(fd)
+        os.rename(temporary, filename)
+
+##
+# The Metrics shared by every stage of this process
+_metrics = Metrics(MetricsConstants.Buckets)
+
+def getMetrics():
+    ''' Returns the process wide Metrics
+    '''
+    return _metrics
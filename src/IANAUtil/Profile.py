@@ -0,0 +1,158 @@
+'''
+The Profile Module records how long each stage of the analysis of one item
+took and how much memory the process used at its start and end, and by how
+much it raised the peak memory of the process, so that the record can be
+stored with the item's SuryaIANAResult/SuryaIANAFailedResult.
+
+The peak of a stage itself cannot be read back (ru_maxrss only grows): a
+stage that raised the process peak peaked at ru_maxrss, one that did not
+stayed below the peak the process had before it.
+
+A Profile is started per item and is current for the thread analyzing it;
+every stage timed through IANAUtil.Metrics is also recorded in the current
+Profile. Worker threads running a part of the analysis for that thread (eg.
+the HoughPool) make its Profile current while they do, refer setProfile.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import os
+import time
+import resource
+import threading
+
+class Profile:
+    '''
+    The wall time and memory of the stages of the analysis of one item
+    '''
+
+    def __init__(self, item):
+        ''' Constructor
+
+        Keyword Arguments:
+        item -- the name of the item being analyzed
+        '''
+        self.item = item
+        self.start = time.time()
+        # name -> [seconds, calls, largest rss at the start of a call, largest rss at
+        #          the end of a call, largest growth of the peak rss in a call], in kB
+        self.stages = {}
+        self.attributes = {}
+        # stages may be recorded from worker threads
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, start):
+        ''' Records that the stage name took seconds
+
+        Keyword Arguments:
+        start -- the memoryUsage() at the start of the stage
+        '''
+        rss, maxrss = memoryUsage()
+
+        self.lock.acquire()
+        try:
+            if name not in self.stages:
+                self.stages[name] = [0.0, 0, 0, 0, 0]
+
+            stage = self.stages[name]
+            stage[0] += seconds
+            stage[1] += 1
+            stage[2] = max(stage[2], start[0])
+            stage[3] = max(stage[3], rss)
+            stage[4] = max(stage[4], maxrss - start[1])
+        finally:
+            self.lock.release()
+
+    def set(self, name, value):
+        ''' Records an attribute of the item, eg. the image size
+        '''
+        self.attributes[name] = value
+
+    def toDict(self):
+        ''' Returns the compact record stored with the result
+
+        Returns:
+        dict - {'wall': seconds, 'rss': kB, 'maxrss': kB (peak of the process so far),
+                'jvm': seconds, 'stages': {name: {'seconds':, 'calls':, 'rssStart': kB,
+                'rssEnd': kB, 'peakGrowth': kB}}, ...attributes}
+        '''
+        stages = {}
+        self.lock.acquire()
+        try:
+            for name, (seconds, calls, rssStart, rssEnd, peakGrowth) in self.stages.items():
+                stages[name] = {'seconds': round(seconds, 4), 'calls': calls,
+                                'rssStart': rssStart, 'rssEnd': rssEnd, 'peakGrowth': peakGrowth}
+        finally:
+            self.lock.release()
+
+        profile = dict(self.attributes)
+        profile['wall'] = round(time.time() - self.start, 4)
+        profile['rss'], profile['maxrss'] = memoryUsage()
+        profile['jvm'] = round(self.stages.get('qr_jvm', [0.0])[0], 4)
+        profile['stages'] = stages
+
+        return profile
+
+def memoryUsage():
+    ''' Returns the current resident set size of the process in kB, from
+        /proc/self/statm (the peak so far where there is no /proc), and the
+        peak resident set size of the process so far in kB
+    '''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        statm = open('/proc/self/statm')
+        try:
+            pages = int(statm.read().split()[1])
+        finally:
+            statm.close()
+        return pages * (os.sysconf('SC_PAGE_SIZE') // 1024), maxrss
+    except (IOError, OSError, ValueError, IndexError):
+        return maxrss, maxrss
+
+##
+# The Profile of the item analyzed by each thread
+_current = threading.local()
+
+def startProfile(item):
+    ''' Starts a new Profile for item, current for the calling thread
+
+    Returns:
+    Profile
+    '''
+    _current.profile = Profile(item)
+    return _current.profile
+
+def getProfile(item=None):
+    ''' Returns the current Profile of the calling thread, or None.
+
+    Keyword Arguments:
+    item -- if given a new Profile is started unless the current one is for item
+    '''
+    profile = getattr(_current, 'profile', None)
+    if item is not None and (profile is None or profile.item != item):
+        profile = startProfile(item)
+
+    return profile
+
+def setProfile(profile):
+    ''' Makes profile (or None) current for the calling thread, eg. a worker
+        thread running a part of the analysis of another thread's item
+
+    Returns:
+    the Profile that was current before, or None
+    '''
+    previous = getattr(_current, 'profile', None)
+    _current.profile = profile
+    return previous
+
+def stopProfile():
+    ''' Ends the current Profile of the calling thread
+
+    Returns:
+    the ended Profile, or None
+    '''
+    profile = getattr(_current, 'profile', None)
+    _current.profile = None
+    return profile
@@ -0,0 +1,165 @@
+'''
+The RegionStatistics Module answers the mean and variance of any axis-aligned
+box of an image in constant time from per-band summed area tables (integral
+images), so that the gray bars, color bars and the bcFilter are sampled from
+one conversion of the image rather than a crop and a PIL.ImageStat.Stat each.
+
+Boxes are (left, top, right, bottom) as for PIL.Image.crop: right and bottom
+are exclusive, and the parts of a box outside the image count as black pixels,
+so the statistics are those PIL.ImageStat.Stat gives for the crop of the box.
+Empty boxes have no statistics, a ValueError is raised for them.
+
+trimmedMean, which needs the pixels themselves, sorts the crop of the box.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import numpy
+
+class RegionStatistics:
+    '''
+    Summed area tables of the bands of (a part of) an image
+    '''
+
+    def __init__(self, image, bounds=None):
+        ''' Constructor
+
+        Keyword Arguments:
+        image  -- a PIL.Image object
+        bounds -- (left, top, right, bottom) of the part of the image the boxes are
+                  in, the tables are only built for this part; the whole image if None
+        '''
+        width, height = image.size
+        if bounds is None:
+            bounds = (0, 0, width, height)
+
+        left, top, right, bottom = [int(x) for x in bounds]
+        self.left = min(max(left, 0), width)
+        self.top = min(max(top, 0), height)
+        self.right = min(max(right, self.left), width)
+        self.bottom = min(max(bottom, self.top), height)
+
+        pixels = numpy.asarray(image.crop((self.left, self.top, self.right, self.bottom)), dtype=numpy.int64)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+
+        # summed area tables with a zero row/column in front
+        rows, columns, bands = pixels.shape
+        self.sums = numpy.zeros((rows + 1, columns + 1, bands), dtype=numpy.int64)
+        self.sums[1:, 1:] = pixels.cumsum(0).cumsum(1)
+        self.squares = numpy.zeros((rows + 1, columns + 1, bands), dtype=numpy.int64)
+        self.squares[1:, 1:] = (pixels * pixels).cumsum(0).cumsum(1)
+
+    def index(self, boxes):
+        ''' Returns the rows and columns of the tables bounding the boxes, and their areas
+
+        Keyword Arguments:
+        boxes -- n x 4 array of (left, top, right, bottom)
+        '''
+        boxes = numpy.asarray(boxes, dtype=numpy.int64).reshape(-1, 4)
+        rows, columns = self.sums.shape[0] - 1, self.sums.shape[1] - 1
+
+        left = numpy.clip(boxes[:, 0] - self.left, 0, columns)
+        top = numpy.clip(boxes[:, 1] - self.top, 0, rows)
+        right = numpy.clip(boxes[:, 2] - self.left, 0, columns)
+        bottom = numpy.clip(boxes[:, 3] - self.top, 0, rows)
+        area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        if ((boxes[:, 2] <= boxes[:, 0]) | (boxes[:, 3] <= boxes[:, 1])).any():
+            raise ValueError('empty box in ' + str(boxes.tolist()))
+
+        return left, top, right, bottom, area
+
+    def total(self, table, left, top, right, bottom):
+        ''' Returns the per band sums of the table over the boxes
+        '''
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+    def means(self, boxes):
+        ''' Returns the per band means of every box, in one query
+
+        Keyword Arguments:
+        boxes -- a list of (left, top, right, bottom)
+
+        Returns:
+        a list of the per band means (list) of each box
+        '''
+        left, top, right, bottom, area = self.index(boxes)
+        sums = self.total(self.sums, left, top, right, bottom)
+
+        return (sums / area[:, None].astype(numpy.float64)).tolist()
+
+    def mean(self, box):
+        ''' Returns the per band mean (list) of the box
+        '''
+        return self.means([box])[0]
+
+    def variances(self, boxes):
+        ''' Returns the per band variances of every box, in one query
+
+        Keyword Arguments:
+        boxes -- a list of (left, top, right, bottom)
+
+        Returns:
+        a list of the per band variances (list) of each box
+        '''
+        left, top, right, bottom, area = self.index(boxes)
+        area = area[:, None].astype(numpy.float64)
+        means = self.total(self.sums, left, top, right, bottom) / area
+        squares = self.total(self.squares, left, top, right, bottom) / area
+
+        return numpy.maximum(squares - means * means, 0).tolist()
+
+    def variance(self, box):
+        ''' Returns the per band variance (list) of the box
+        '''
+        return self.variances([box])[0]
+
+def trimmedMean(image, box, fraction):
+    ''' Returns the per band mean of the box without its darkest and brightest
+        pixels, eg. to reject the glare on a bcFilter
+
+    Keyword Arguments:
+    image    -- a PIL.Image object
+    box      -- (left, top, right, bottom)
+    fraction -- the fraction of the pixels dropped at each end, per band
+
+    Returns:
+    the per band trimmed means (list), the parts of the box outside the image
+    count as black pixels as they do for RegionStatistics.means
+    '''
+    box = [int(x) for x in box]
+    if box[2] <= box[0] or box[3] <= box[1]:
+        raise ValueError('empty box ' + str(box))
+
+    pixels = numpy.asarray(image.crop(box))
+    return trimmedPixelMean(pixels.reshape(pixels.shape[0] * pixels.shape[1], -1), fraction)
+
+def trimmedPixelMean(pixels, fraction):
+    ''' Returns the per band mean of the pixels without the fraction of the
+        darkest and of the brightest of each band, refer trimmedMean
+
+    Keyword Arguments:
+    pixels   -- n x bands numpy array, n > 0
+    fraction -- the fraction of the pixels dropped at each end, per band
+
+    Returns:
+    the per band trimmed means (list)
+    '''
+    pixels = numpy.sort(pixels, axis=0)
+
+    count = pixels.shape[0]
+    trim = int(count * fraction)
+    if count - 2 * trim <= 0:
+        trim = (count - 1) // 2
+
+    return pixels[trim:count - trim].mean(axis=0).tolist()
+
+def boundingBox(boxes):
+    ''' Returns the (left, top, right, bottom) bounding all the boxes
+    '''
+    return (min([box[0] for box in boxes]),
+            min([box[1] for box in boxes]),
+            max([box[2] for box in boxes]),
+            max([box[3] for box in boxes]))
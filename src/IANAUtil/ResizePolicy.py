@@ -0,0 +1,98 @@
+'''
+The ResizePolicy Module picks the resolution an uploaded image is analyzed at
+before the featureExtractor first runs on it, so that images too large to be
+analyzed are resized up front rather than after a failed run.
+
+The resolution is picked from the image header dimensions, and optionally from
+the success rates of the images analyzed so far at each resolution.
+
+Created on Oct 18, 2026
+
+@author: surya
+'''
+
+import threading
+
+from IANASettings.Settings import ResizeImageConstants
+
+class ResizePolicy:
+    '''
+    Decides whether to resize an image to ResizeImageConstants.LargestSide
+    before analyzing it, and keeps the success rates per resolution.
+    '''
+
+    def __init__(self):
+        ''' Constructor
+        '''
+        self.lock = threading.Lock()
+        # resolution bucket -> [successes, attempts]
+        self.history = {}
+
+    def bucket(self, largestSide):
+        ''' Returns the resolution bucket of an image with the given largest side
+        '''
+        return int(largestSide) // ResizeImageConstants.HistoryBucket * ResizeImageConstants.HistoryBucket
+
+    def record(self, size, success):
+        ''' Records the outcome of the analysis of an image of size
+
+        Keyword Arguments:
+        size    -- (width, height) the image was analyzed at
+        success -- True if the featureExtractor succeeded
+        '''
+        bucket = self.bucket(max(size))
+
+        self.lock.acquire()
+        try:
+            if bucket not in self.history:
+                self.history[bucket] = [0, 0]
+            if success:
+                self.history[bucket][0] += 1
+            self.history[bucket][1] += 1
+        finally:
+            self.lock.release()
+
+    def successRate(self, largestSide):
+        ''' Returns the success rate of the images analyzed at largestSide, or
+            None if too few were analyzed, refer ResizeImageConstants.HistorySamples
+        '''
+        self.lock.acquire()
+        try:
+            successes, attempts = self.history.get(self.bucket(largestSide), (0, 0))
+        finally:
+            self.lock.release()
+
+        if attempts < ResizeImageConstants.HistorySamples:
+            return None
+        return successes / float(attempts)
+
+    def shouldResize(self, size):
+        ''' Returns True if an image of size should be resized to
+            ResizeImageConstants.LargestSide before it is analyzed
+
+        Keyword Arguments:
+        size -- (width, height) of the image, refer IANAUtil.ImageContext.size
+        '''
+        largestSide = max(size)
+        if largestSide <= ResizeImageConstants.LargestSide:
+            return False
+
+        if ResizeImageConstants.MaximumSide and largestSide > ResizeImageConstants.MaximumSide:
+            return True
+
+        if ResizeImageConstants.UseHistory:
+            uploaded = self.successRate(largestSide)
+            resized = self.successRate(ResizeImageConstants.LargestSide)
+            if uploaded is not None and resized is not None:
+                return resized > uploaded
+
+        return False
+
+##
+# The ResizePolicy shared by every item analyzed by this process
+_policy = ResizePolicy()
+
+def getResizePolicy():
+    ''' Returns the process wide ResizePolicy
+    '''
+    return _policy